@@ -0,0 +1,105 @@
+# administracion/contadores.py
+"""
+Contadores globales del sitio (página de inicio) mantenidos en caché.
+
+Cada contador se define por un modelo y un filtro simple (campo=valor). Las
+señales de administracion/signals.py suman o restan 1 con cache.incr() al
+confirmarse cada alta, baja o cambio, así leer los contadores no cuenta
+nada en la base de datos. Si falta alguna clave (caché vacía o reiniciada)
+se recalculan todos; `manage.py reconciliar_contadores` (p. ej. cada hora
+por cron) corrige desvíos de escrituras que no disparan señales
+(QuerySet.update(), bulk_create, SQL directo).
+
+Para que varios procesos compartan los contadores la caché debe ser común
+(CACHE_TIPO = 'redis' o 'file' en settings); con 'file' los incrementos no
+son atómicos y la reconciliación periódica es imprescindible.
+"""
+from functools import lru_cache
+
+from django.apps import apps
+from django.core.cache import cache
+
+PREFIJO = 'contadores:'
+
+# nombre → (modelo, filtro)
+CONTADORES = {
+    'usuarios': ('usuarios.Usuario', {}),
+    'negocios': ('usuarios.Negocio', {'activo': True}),
+    'productos': ('productos.Producto', {'activo': True}),
+    'categorias': ('productos.Categoria', {'activo': True}),
+    'pedidos_totales': ('pedidos.Pedido', {}),
+    'pedidos_pendientes': ('pedidos.Pedido', {'estado': 'pendiente'}),
+    'pedidos_confirmados': ('pedidos.Pedido', {'estado': 'confirmado'}),
+    'pedidos_completados': ('pedidos.Pedido', {'estado': 'completado'}),
+    'pagos_aprobados': ('pagos.Pago', {'estado': 'aprobado'}),
+}
+
+
+def clave(nombre):
+    return f'{PREFIJO}{nombre}'
+
+
+@lru_cache(maxsize=None)
+def modelos():
+    """{modelo: [(nombre, filtro), ...]} para conectar las señales"""
+    por_modelo = {}
+    for nombre, (etiqueta, filtro) in CONTADORES.items():
+        por_modelo.setdefault(apps.get_model(etiqueta), []).append((nombre, filtro))
+    return por_modelo
+
+
+def campos_observados(modelo):
+    """Campos cuyo cambio puede mover algún contador del modelo"""
+    return {campo for _, filtro in modelos()[modelo] for campo in filtro}
+
+
+def cumple(filtro, valores):
+    return all(valores.get(campo) == valor for campo, valor in filtro.items())
+
+
+def contar_todos():
+    """Cuenta en la base de datos (una query por contador)"""
+    return {
+        nombre: apps.get_model(etiqueta).objects.filter(**filtro).count()
+        for nombre, (etiqueta, filtro) in CONTADORES.items()
+    }
+
+
+def reconciliar():
+    """Recalcula todos los contadores y los guarda sin vencimiento. Retorna los valores."""
+    valores = contar_todos()
+    cache.set_many({clave(nombre): valor for nombre, valor in valores.items()}, timeout=None)
+    return valores
+
+
+def obtener():
+    """Todos los contadores desde caché; si falta alguno, los recalcula."""
+    guardados = cache.get_many([clave(nombre) for nombre in CONTADORES])
+    if len(guardados) < len(CONTADORES):
+        return reconciliar()
+    return {nombre: guardados[clave(nombre)] for nombre in CONTADORES}
+
+
+def ajustar(deltas):
+    """Aplica {nombre: delta}; si una clave no existe se deja para el próximo recálculo."""
+    for nombre, delta in deltas.items():
+        if not delta:
+            continue
+        try:
+            cache.incr(clave(nombre), delta)
+        except ValueError:
+            pass
+
+
+def deltas(modelo, antes, despues):
+    """
+    Diferencia en cada contador del modelo entre dos estados de una fila
+    (dicts campo → valor; None si la fila no existía / ya no existe).
+    """
+    resultado = {}
+    for nombre, filtro in modelos()[modelo]:
+        resultado[nombre] = (
+            (1 if despues is not None and cumple(filtro, despues) else 0)
+            - (1 if antes is not None and cumple(filtro, antes) else 0)
+        )
+    return resultado
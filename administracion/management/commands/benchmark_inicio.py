@@ -0,0 +1,86 @@
+# administracion/management/commands/benchmark_inicio.py
+import time
+import uuid
+from statistics import median
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from administracion import contadores
+from pedidos.models import Pedido
+from pickup_rural.views import home
+from usuarios.models import Usuario, Negocio
+
+TAMANO_LOTE = 5000
+ESTADOS = [estado for estado, _ in Pedido.ESTADO_CHOICES]
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide la página de inicio con los contadores en caché contra contar en '
+        'la base de datos, sobre pedidos sintéticos. Todo corre dentro de una '
+        'transacción que se revierte.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pedidos', type=int, default=1_000_000)
+        parser.add_argument('--repeticiones', type=int, default=20)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._poblar(options['pedidos'])
+                self._medir(options['repeticiones'])
+                raise _Revertir()
+        except _Revertir:
+            pass
+        # Los contadores en caché vieron los datos sintéticos: volver a los reales
+        contadores.reconciliar()
+
+    def _poblar(self, cantidad):
+        self.stdout.write(f'🛠️  Generando {cantidad} pedidos sintéticos...')
+        cliente = Usuario.objects.create(username='benchmark_inicio')
+        negocio = Negocio.objects.create(
+            propietario=cliente, nombre='Almacén Benchmark', direccion='-',
+            telefono='-', email='bench@example.com', horario_apertura='08:00',
+            horario_cierre='20:00', dias_atencion='Lunes a Domingo',
+        )
+        lote = uuid.uuid4().hex[:6].upper()
+        for inicio in range(0, cantidad, TAMANO_LOTE):
+            # bulk_create no dispara señales: los contadores se reconcilian después
+            Pedido.objects.bulk_create([
+                Pedido(
+                    numero_pedido=f'B{lote}{i:09d}', cliente=cliente, negocio=negocio,
+                    estado=ESTADOS[i % len(ESTADOS)], metodo_entrega='pickup',
+                    telefono_contacto='-', total=1000,
+                )
+                for i in range(inicio, min(inicio + TAMANO_LOTE, cantidad))
+            ])
+        contadores.reconciliar()
+
+    def _medir(self, repeticiones):
+        peticion = RequestFactory().get('/')
+
+        def muestras(funcion):
+            tiempos = []
+            for _ in range(repeticiones):
+                inicio = time.perf_counter()
+                funcion()
+                tiempos.append((time.perf_counter() - inicio) * 1000)
+            return median(tiempos)
+
+        with CaptureQueriesContext(connection) as consultas:
+            home(peticion)
+        en_cache = muestras(lambda: home(peticion))
+        contando = muestras(contadores.contar_todos)
+
+        self.stdout.write(f'{"":<34}{"mediana (ms)":>14}')
+        self.stdout.write(f'{"inicio con contadores en caché":<34}{en_cache:>14.1f}')
+        self.stdout.write(f'{"solo los 9 COUNT anteriores":<34}{contando:>14.1f}')
+        self.stdout.write(f'queries por visita anónima a /: {len(consultas)}')
+
+
+class _Revertir(Exception):
+    """Fuerza el rollback de los datos sintéticos"""
@@ -0,0 +1,18 @@
+# administracion/management/commands/reconciliar_contadores.py
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from administracion import contadores
+
+
+class Command(BaseCommand):
+    help = 'Recalcula los contadores de la página de inicio y corrige los valores en caché (ejecutar periódicamente)'
+
+    def handle(self, *args, **options):
+        anteriores = cache.get_many([contadores.clave(nombre) for nombre in contadores.CONTADORES])
+        valores = contadores.reconciliar()
+
+        for nombre, valor in valores.items():
+            anterior = anteriores.get(contadores.clave(nombre))
+            if anterior is not None and anterior != valor:
+                self.stdout.write(f'⚠️  {nombre}: {anterior} → {valor}')
+        self.stdout.write(self.style.SUCCESS(f'✅ {len(valores)} contadores reconciliados'))
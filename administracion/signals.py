@@ -0,0 +1,57 @@
+# administracion/signals.py
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from . import contadores
+
+# Marca para saves que no tocan ningún campo observado
+_SIN_CAMBIOS = object()
+
+
+def _valores(modelo, instance):
+    return {campo: getattr(instance, campo) for campo in contadores.campos_observados(modelo)}
+
+
+def _aplicar(deltas):
+    if any(deltas.values()):
+        transaction.on_commit(lambda: contadores.ajustar(deltas))
+
+
+def guardar_valores_anteriores(sender, instance, update_fields=None, **kwargs):
+    """
+    Toma los campos observados antes de un UPDATE de lo leído en from_db()
+    (_<campo>_guardado); solo consulta la BD si la instancia no viene de
+    una query o el campo estaba diferido.
+    """
+    if instance._state.adding:
+        instance._contadores_antes = None
+        return
+
+    campos = contadores.campos_observados(sender)
+    if not campos or (update_fields is not None and not campos & set(update_fields)):
+        instance._contadores_antes = _SIN_CAMBIOS
+        return
+    antes = {campo: getattr(instance, f'_{campo}_guardado', None) for campo in campos}
+    if None in antes.values():
+        antes = sender.objects.filter(pk=instance.pk).values(*campos).first()
+    instance._contadores_antes = antes
+
+
+def actualizar_contadores(sender, instance, created, update_fields=None, **kwargs):
+    antes = None if created else getattr(instance, '_contadores_antes', _SIN_CAMBIOS)
+    # Lo recién guardado pasa a ser el estado en la BD para el próximo save()
+    for campo in contadores.campos_observados(sender):
+        if update_fields is None or campo in update_fields:
+            setattr(instance, f'_{campo}_guardado', getattr(instance, campo))
+    if antes is _SIN_CAMBIOS:
+        return
+    _aplicar(contadores.deltas(sender, antes, _valores(sender, instance)))
+
+
+def descontar_contadores(sender, instance, **kwargs):
+    _aplicar(contadores.deltas(sender, _valores(sender, instance), None))
+
+
+for modelo in contadores.modelos():
+    pre_save.connect(guardar_valores_anteriores, sender=modelo, dispatch_uid=f'contadores_pre_{modelo._meta.label}')
+    post_save.connect(actualizar_contadores, sender=modelo, dispatch_uid=f'contadores_post_{modelo._meta.label}')
+    post_delete.connect(descontar_contadores, sender=modelo, dispatch_uid=f'contadores_del_{modelo._meta.label}')
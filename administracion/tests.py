@@ -1,3 +1,79 @@
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from administracion import contadores
+from pedidos.models import Pedido
+from productos.models import Producto
+from usuarios.models import Usuario, Negocio
+
+
+class ContadoresInicioTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.cliente = Usuario.objects.create(username='cliente')
+        self.negocio = Negocio.objects.create(
+            propietario=self.cliente,
+            nombre='Almacén Test',
+            direccion='Camino Rural Km 5',
+            telefono='+56912345678',
+            email='almacen@test.cl',
+            horario_apertura='08:00',
+            horario_cierre='20:00',
+            dias_atencion='Lunes a Sábado',
+        )
+
+    def crear_pedido(self):
+        return Pedido.objects.create(
+            cliente=self.cliente, negocio=self.negocio, metodo_entrega='pickup',
+            telefono_contacto='+56987654321', total=Decimal('1000'),
+        )
+
+    def test_senales_mantienen_los_contadores(self):
+        self.assertEqual(contadores.obtener()['pedidos_pendientes'], 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            pedido = self.crear_pedido()
+        with self.captureOnCommitCallbacks(execute=True):
+            pedido.estado = 'confirmado'
+            pedido.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.negocio.activo = False
+            self.negocio.save()
+
+        valores = contadores.obtener()
+        self.assertEqual(valores, contadores.contar_todos())
+        self.assertEqual(
+            (valores['pedidos_totales'], valores['pedidos_pendientes'], valores['pedidos_confirmados'], valores['negocios']),
+            (1, 0, 1, 0),
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            pedido.delete()
+        self.assertEqual(contadores.obtener(), contadores.contar_todos())
+
+    def test_guardar_no_relee_los_campos_observados(self):
+        Producto.objects.create(negocio=self.negocio, codigo='P1', nombre='Pan', precio=Decimal('1000'), stock=5)
+        contadores.reconciliar()
+        producto = Producto.objects.get()
+
+        for activo in (False, True, False):
+            with self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as consultas:
+                producto.activo = activo
+                producto.save()
+            lecturas = [q for q in consultas.captured_queries if q['sql'].startswith('SELECT') and 'productos_producto' in q['sql']]
+            self.assertFalse(lecturas)
+
+        self.assertEqual(contadores.obtener(), contadores.contar_todos())
+
+    def test_inicio_no_cuenta(self):
+        contadores.reconciliar()
+
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get('/')
 
-# Create your tests here.
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertFalse([q for q in consultas.captured_queries if 'COUNT(' in q['sql'].upper()])
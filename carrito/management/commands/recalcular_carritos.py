@@ -0,0 +1,36 @@
+# carrito/management/commands/recalcular_carritos.py
+from django.core.management.base import BaseCommand
+from django.db.models import DecimalField, F, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from carrito.models import Carrito, ItemCarrito
+
+
+class Command(BaseCommand):
+    help = 'Recalcula cantidad_items y subtotal de los carritos desde sus items y corrige desvíos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--todos', action='store_true', help='Incluir carritos inactivos')
+        parser.add_argument('--dry-run', action='store_true', help='Solo informar, sin corregir')
+
+    def handle(self, *args, **options):
+        items = ItemCarrito.objects.filter(carrito=OuterRef('pk')).order_by().values('carrito')
+        cantidad_real = Coalesce(Subquery(items.annotate(t=Sum('cantidad')).values('t')), Value(0))
+        subtotal_real = Coalesce(
+            Subquery(items.annotate(t=Sum(F('cantidad') * F('precio_unitario'))).values('t')),
+            Value(0),
+            output_field=DecimalField(max_digits=12, decimal_places=2)
+        )
+
+        carritos = Carrito.objects.all() if options['todos'] else Carrito.objects.filter(activo=True)
+        desviados = list(
+            carritos.annotate(cantidad_real=cantidad_real, subtotal_real=subtotal_real)
+            .filter(~Q(cantidad_items=F('cantidad_real')) | ~Q(subtotal=F('subtotal_real')))
+            .values_list('pk', flat=True)
+        )
+
+        if options['dry_run']:
+            self.stdout.write(f'🔎 {len(desviados)} carritos con totales desviados')
+            return
+
+        Carrito.objects.filter(pk__in=desviados).update(cantidad_items=cantidad_real, subtotal=subtotal_real)
+        self.stdout.write(self.style.SUCCESS(f'✅ {len(desviados)} carritos corregidos'))
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.7 on 2026-10-18 10:17
+
+from django.db import migrations, models
+
+
+def calcular_totales(apps, schema_editor):
+    Carrito = apps.get_model('carrito', 'Carrito')
+    ItemCarrito = apps.get_model('carrito', 'ItemCarrito')
+
+    totales = ItemCarrito.objects.values('carrito_id').annotate(
+        total_cantidad=models.Sum('cantidad'),
+        total_subtotal=models.Sum(models.F('cantidad') * models.F('precio_unitario'))
+    ).order_by()
+    for fila in totales:
+        Carrito.objects.filter(pk=fila['carrito_id']).update(
+            cantidad_items=fila['total_cantidad'], subtotal=fila['total_subtotal']
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('carrito', '0004_remove_carrito_unique_carrito_activo_por_usuario_negocio_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='carrito',
+            name='cantidad_items',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='carrito',
+            name='subtotal',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.RunPython(calcular_totales, migrations.RunPython.noop),
+    ]
@@ -2,6 +2,7 @@ from django.db import models
 from django.core.validators import MinValueValidator
 from usuarios.models import Usuario, Negocio
 from productos.models import Producto
+from productos import reservas
 from productos.services import ServicioPerecederos, ValidadorPerecederos   # 👈 NUEVO
 
 class Carrito(models.Model):
@@ -12,6 +13,15 @@ class Carrito(models.Model):
     fecha_actualizacion = models.DateTimeField(auto_now=True)
     activo = models.BooleanField(default=True)
     
+    # Totales desnormalizados: los mantienen ItemCarrito.save()/delete(),
+    # aplicar_operaciones() vía ajustar_totales() y, al borrar un Producto, la
+    # señal productos.signals.descontar_de_carritos. Escrituras que no pasan
+    # por ahí (QuerySet.update()/delete() sobre ItemCarrito, SQL directo) los
+    # desvían hasta correr `manage.py recalcular_carritos`. Borrar el carrito
+    # (o su negocio/usuario) se lleva los totales con él.
+    cantidad_items = models.PositiveIntegerField(default=0)
+    subtotal = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    
     class Meta:
         verbose_name = 'Carrito'
         verbose_name_plural = 'Carritos'
@@ -20,39 +30,246 @@ class Carrito(models.Model):
     def __str__(self):
         return f"Carrito de {self.usuario.username} - {self.negocio.nombre}"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Estado guardado de `activo`, para saber si un save() lo cambia
+        instance._activo_guardado = instance.__dict__.get('activo')
+        return instance
+
     def save(self, *args, **kwargs):
-        # Si este carrito está activo, desactivar otros carritos activos del mismo usuario-negocio
-        if self.activo and self.pk:
+        # Si este carrito pasa a activo, desactivar otros carritos activos del mismo usuario-negocio.
+        # Un save() que no cambia `activo` (o no lo incluye en update_fields) no toca a los demás.
+        update_fields = kwargs.get('update_fields')
+        se_activa = (
+            self.activo
+            and self.pk
+            and getattr(self, '_activo_guardado', None) is not True
+            and (update_fields is None or 'activo' in update_fields)
+        )
+        if se_activa:
             Carrito.objects.filter(
-                usuario=self.usuario, 
-                negocio=self.negocio, 
+                usuario_id=self.usuario_id,
+                negocio_id=self.negocio_id,
                 activo=True
             ).exclude(pk=self.pk).update(activo=False)
         super().save(*args, **kwargs)
-    
-    @property
-    def cantidad_items(self):
-        return self.items.aggregate(total=models.Sum('cantidad'))['total'] or 0
-    
-    @property
-    def subtotal(self):
-        return sum(item.subtotal for item in self.items.all())
+        self._activo_guardado = self.activo
     
     @property
     def total(self):
         return self.subtotal
     
+    @classmethod
+    def ajustar_totales(cls, carrito_id, cantidad, subtotal):
+        """Suma (o resta) a los totales con un UPDATE atómico; también marca la actualización"""
+        from django.utils import timezone
+        cls.objects.filter(pk=carrito_id).update(
+            cantidad_items=models.F('cantidad_items') + cantidad,
+            subtotal=models.F('subtotal') + subtotal,
+            fecha_actualizacion=timezone.now()
+        )
+    
+    def refrescar_totales(self):
+        self.refresh_from_db(fields=['cantidad_items', 'subtotal', 'fecha_actualizacion'])
+    
+    def recalcular_totales(self):
+        """Recalcula los totales desde los items (reparación de desvíos)"""
+        totales = self.items.aggregate(
+            total_cantidad=models.Sum('cantidad'),
+            total_subtotal=models.Sum(models.F('cantidad') * models.F('precio_unitario'))
+        )
+        self.cantidad_items = totales['total_cantidad'] or 0
+        self.subtotal = totales['total_subtotal'] or 0
+        Carrito.objects.filter(pk=self.pk).update(cantidad_items=self.cantidad_items, subtotal=self.subtotal)
+    
     def vaciar(self):
         self.items.all().delete()
+        reservas.liberar(self)
+        self.cantidad_items = 0
+        self.subtotal = 0
+        Carrito.objects.filter(pk=self.pk).update(cantidad_items=0, subtotal=0)
+
+    def aplicar_operaciones(self, operaciones):
+        """Aplica varias operaciones sobre los items en una sola transacción.
+
+        `operaciones` es una lista de dicts:
+        - {'accion': 'agregar', 'producto_id': X, 'cantidad': n}  (suma n unidades)
+        - {'accion': 'actualizar', 'item_id': X, 'cantidad': n}   (fija la cantidad)
+        - {'accion': 'eliminar', 'item_id': X}
+
+        Las operaciones se resuelven primero en memoria y luego se escribe solo
+        el resultado neto: un INSERT, un UPDATE y un DELETE como máximo para los
+        items, una reserva por producto modificado y un único UPDATE de los
+        totales (que es también el único que toca fecha_actualizacion).
+        Lanza ValueError ante cualquier operación inválida y no aplica ninguna.
+        """
+        from django.db import transaction
+
+        with transaction.atomic():
+            items = {item.producto_id: item for item in self.items.select_related('producto')}
+            por_item_id = {item.pk: item for item in items.values()}
+            originales = {producto_id: item.cantidad for producto_id, item in items.items()}
+            cantidades = dict(originales)
+
+            ids_agregados = set()
+            for op in operaciones:
+                if isinstance(op, dict) and op.get('accion') == 'agregar' and str(op.get('producto_id')).isdigit():
+                    ids_agregados.add(int(op['producto_id']))
+            productos = {producto_id: item.producto for producto_id, item in items.items()}
+            if ids_agregados - set(items):
+                productos.update(
+                    (producto.pk, producto)
+                    for producto in Producto.objects.filter(
+                        pk__in=ids_agregados - set(items), negocio_id=self.negocio_id, activo=True
+                    )
+                )
+
+            for op in operaciones:
+                if not isinstance(op, dict):
+                    raise ValueError('Operación inválida')
+                accion = op.get('accion')
+
+                if accion == 'agregar':
+                    try:
+                        producto_id = int(op.get('producto_id'))
+                        cantidad = int(op.get('cantidad', 1))
+                    except (TypeError, ValueError):
+                        raise ValueError('producto_id y cantidad deben ser números')
+                    if producto_id not in productos:
+                        raise ValueError(f'Producto {producto_id} no disponible')
+                    if cantidad < 1:
+                        raise ValueError('La cantidad debe ser al menos 1')
+                    cantidades[producto_id] = (cantidades.get(producto_id) or 0) + cantidad
+
+                elif accion in ('actualizar', 'eliminar'):
+                    try:
+                        item = por_item_id[int(op.get('item_id'))]
+                    except (KeyError, TypeError, ValueError):
+                        raise ValueError(f"Item {op.get('item_id')} no está en el carrito")
+                    if accion == 'eliminar':
+                        cantidades[item.producto_id] = None
+                        continue
+                    try:
+                        cantidad = int(op.get('cantidad'))
+                    except (TypeError, ValueError):
+                        raise ValueError('La cantidad debe ser un número')
+                    if cantidad < 1:
+                        raise ValueError('La cantidad debe ser al menos 1')
+                    cantidades[item.producto_id] = cantidad
+
+                else:
+                    raise ValueError(f'Acción desconocida: {accion}')
+
+            # Resultado neto por producto, en orden de producto_id (mismo orden
+            # de bloqueo que el checkout)
+            nuevos, modificados, eliminados = [], [], []
+            delta_cantidad, delta_subtotal = 0, 0
+            for producto_id in sorted(cantidades):
+                cantidad = cantidades[producto_id]
+                if cantidad == originales.get(producto_id):
+                    continue
+                producto = productos[producto_id]
+
+                if cantidad is None:
+                    if producto_id in items:
+                        item = items[producto_id]
+                        eliminados.append(item.pk)
+                        delta_cantidad -= item.cantidad
+                        delta_subtotal -= item.subtotal
+                        reservas.liberar(self, producto)
+                    continue
+
+                try:
+                    reservas.reservar(self, producto, cantidad)
+                except ValueError as e:
+                    raise ValueError(f'{producto.nombre}: {e}')
+
+                item = items.get(producto_id)
+                if item is None:
+                    item = ItemCarrito(
+                        carrito=self, producto=producto, cantidad=cantidad,
+                        precio_unitario=producto.precio_actual
+                    )
+                    nuevos.append(item)
+                    delta_cantidad += cantidad
+                else:
+                    delta_cantidad += cantidad - item.cantidad
+                    delta_subtotal -= item.subtotal
+                    item.cantidad = cantidad
+                    modificados.append(item)
+                delta_subtotal += item.subtotal
+
+            # Escrituras por lote: no pasan por ItemCarrito.save()/delete(), los
+            # totales se ajustan una sola vez al final
+            if eliminados:
+                ItemCarrito.objects.filter(pk__in=eliminados).delete()
+            if modificados:
+                ItemCarrito.objects.bulk_update(modificados, ['cantidad'])
+            if nuevos:
+                ItemCarrito.objects.bulk_create(nuevos)
+
+            if nuevos or modificados or eliminados:
+                Carrito.ajustar_totales(self.pk, delta_cantidad, delta_subtotal)
+            reservas.renovar(self)
+            self.refrescar_totales()
+
+        return self.items.all()
 
     # 📌 NUEVA VERSIÓN COMPLETA DEL MÉTODO
     def convertir_a_pedido(self, metodo_entrega, direccion_entrega='', telefono_contacto='', notas=''):
-        """Convierte el carrito en un pedido real con validación de perecederos"""
+        """Convierte el carrito en un pedido real con validación de perecederos.
+
+        Una sola pasada dentro de la transacción: el stock se descuenta con un
+        UPDATE condicional por producto (bloquea la fila hasta el commit, así
+        dos checkouts simultáneos no pueden vender la misma unidad), las líneas
+        se insertan con bulk_create y los totales se calculan en memoria.
+        """
         from pedidos.models import Pedido, DetallePedido
+        from pedidos import prioridad, resumenes
         from django.db import transaction
+        from django.utils import timezone
         
         with transaction.atomic():
-            # Crear pedido
+            # Bloquear el carrito: un doble envío del mismo checkout espera aquí
+            # y luego encuentra el carrito ya cerrado
+            if not Carrito.objects.select_for_update().filter(pk=self.pk, activo=True).exists():
+                raise ValueError("El carrito ya fue procesado")
+            
+            items = list(self.items.select_related('producto'))
+            if not items:
+                raise ValueError("El carrito está vacío")
+            
+            # Descontar stock: UPDATE ... SET stock = stock - n
+            #                  WHERE id = X AND stock >= n + reservas vigentes de otros carritos
+            # Orden por producto_id para que checkouts concurrentes bloqueen en el mismo orden
+            ahora = timezone.now()
+            for item in sorted(items, key=lambda i: i.producto_id):
+                actualizados = Producto.objects.filter(
+                    pk=item.producto_id,
+                    stock__gte=item.cantidad + reservas.reservado_vigente(excluir_carrito=self, ahora=ahora)
+                ).update(stock=models.F('stock') - item.cantidad, fecha_actualizacion=ahora)
+                
+                if not actualizados:
+                    raise ValueError(f"Stock insuficiente para {item.producto.nombre}")
+            
+            # 🔥 Validación de productos perecederos (sobre los productos ya cargados)
+            productos_perecederos = ServicioPerecederos.condiciones_de_productos(
+                item.producto for item in items
+            )
+            
+            notas_internas = ''
+            if productos_perecederos:
+                notas_internas = "⚠️ PRODUCTOS PERECEDEROS: " + ', '.join(
+                    f"{prod['producto']} ({prod['tipo_almacenamiento']})" for prod in productos_perecederos
+                )
+            
+            # 🔥 Clase de perecedero y límite de preparación (cola del comerciante)
+            prioridad_pedido = prioridad.campos_pedido((item.producto for item in items), ahora)
+            
+            # Totales calculados en memoria (mismo criterio que Pedido.calcular_total)
+            subtotal = sum(item.subtotal for item in items)
+            
             pedido = Pedido.objects.create(
                 cliente=self.usuario,
                 negocio=self.negocio,
@@ -60,47 +277,33 @@ class Carrito(models.Model):
                 metodo_entrega=metodo_entrega,
                 direccion_entrega=direccion_entrega,
                 telefono_contacto=telefono_contacto or self.usuario.telefono,
-                notas_cliente=notas
+                notas_cliente=notas,
+                notas_internas=notas_internas,
+                subtotal=subtotal,
+                total=subtotal,
+                **prioridad_pedido,
             )
             
-            # Crear detalles del pedido
-            for item in self.items.all():
-                if item.producto.stock < item.cantidad:
-                    raise ValueError(f"Stock insuficiente para {item.producto.nombre}")
-                
-                DetallePedido.objects.create(
+            # bulk_create no llama a DetallePedido.save() ni a sus signals: el
+            # subtotal se fija aquí y los resúmenes diarios se actualizan aparte
+            detalles = DetallePedido.objects.bulk_create([
+                DetallePedido(
                     pedido=pedido,
                     producto=item.producto,
                     cantidad=item.cantidad,
-                    precio_unitario=item.precio_unitario
+                    precio_unitario=item.precio_unitario,
+                    subtotal=item.subtotal
                 )
-                
-                # Actualizar stock
-                item.producto.stock -= item.cantidad
-                item.producto.save()
-            
-            # 🔥 NUEVO: Validación de productos perecederos
-            productos_perecederos = ServicioPerecederos.verificar_condiciones_pedido(pedido)
-            
-            if productos_perecederos:
-                notas_perecederos = "⚠️ PRODUCTOS PERECEDEROS: "
-                for prod in productos_perecederos:
-                    notas_perecederos += f"{prod['producto']} ({prod['tipo_almacenamiento']}), "
-                
-                pedido.notas_internas = notas_perecederos.rstrip(', ')
-                pedido.save()
-
-                # 🔥 Priorizar pedido si requiere frío
-                if any(prod['tipo_almacenamiento'] in ['Refrigerado', 'Congelado'] for prod in productos_perecederos):
-                    # Aquí puedes cambiar estado, encolar, enviar alerta, etc.
-                    pass
-            
-            # Calcular totales
-            pedido.calcular_total()
+                for item in items
+            ])
+            resumenes.registrar_detalles(pedido, detalles)
             
-            # Finalizar carrito
+            # Finalizar carrito: las unidades reservadas ya se descontaron del stock
             self.items.all().delete()
+            reservas.liberar(self)
             self.activo = False
+            self.cantidad_items = 0
+            self.subtotal = 0
             self.save()
             
             return pedido
@@ -126,8 +329,43 @@ class ItemCarrito(models.Model):
     def subtotal(self):
         return self.cantidad * self.precio_unitario
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Lo guardado en BD, para aplicar solo la diferencia a los totales del carrito
+        instance._guardado = (instance.cantidad, instance.precio_unitario) if not instance.get_deferred_fields() else None
+        return instance
+    
+    def _aportes_guardados(self):
+        guardado = getattr(self, '_guardado', None)
+        if self._state.adding:
+            return 0, 0
+        if guardado is None:
+            guardado = ItemCarrito.objects.filter(pk=self.pk).values_list('cantidad', 'precio_unitario').get()
+        return guardado[0], guardado[0] * guardado[1]
+    
+    def _refrescar_carrito(self):
+        # Si el carrito ya está cargado (p. ej. carrito.items...), dejarlo al día
+        if ItemCarrito.carrito.is_cached(self):
+            self.carrito.refrescar_totales()
+    
     def save(self, *args, **kwargs):
         if not self.precio_unitario:
             self.precio_unitario = self.producto.precio_actual
+        cantidad_anterior, subtotal_anterior = self._aportes_guardados()
         super().save(*args, **kwargs)
-        self.carrito.save()
+        self._guardado = (self.cantidad, self.precio_unitario)
+        
+        Carrito.ajustar_totales(
+            self.carrito_id,
+            self.cantidad - cantidad_anterior,
+            self.subtotal - subtotal_anterior
+        )
+        self._refrescar_carrito()
+    
+    def delete(self, *args, **kwargs):
+        cantidad, subtotal = self._aportes_guardados()
+        resultado = super().delete(*args, **kwargs)
+        Carrito.ajustar_totales(self.carrito_id, -cantidad, -subtotal)
+        self._refrescar_carrito()
+        return resultado
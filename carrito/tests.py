@@ -0,0 +1,175 @@
+import io
+import json
+from decimal import Decimal
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from carrito.models import Carrito, ItemCarrito
+from productos.models import Producto, ReservaStock
+from usuarios.models import Usuario, Negocio
+
+
+class CarritoTestCase(TestCase):
+    def setUp(self):
+        comerciante = Usuario.objects.create(username='comerciante', tipo_usuario='comerciante')
+        self.negocio = Negocio.objects.create(
+            propietario=comerciante,
+            nombre='Almacén Test',
+            direccion='Camino Rural Km 5',
+            telefono='+56912345678',
+            email='almacen@test.cl',
+            horario_apertura='08:00',
+            horario_cierre='20:00',
+            dias_atencion='Lunes a Sábado',
+        )
+        self.cliente = Usuario.objects.create_user(username='cliente', password='x')
+        self.pan = Producto.objects.create(
+            negocio=self.negocio, codigo='PAN-1', nombre='Pan', precio=Decimal('500'), stock=5,
+        )
+        self.leche = Producto.objects.create(
+            negocio=self.negocio, codigo='LEC-1', nombre='Leche', precio=Decimal('1000'), stock=10,
+        )
+        self.client.force_login(self.cliente)
+
+
+class AgregarAlCarritoTest(CarritoTestCase):
+    def agregar(self, producto, cantidad):
+        return self.client.post('/api/carrito/agregar/', {
+            'producto_id': producto.pk, 'negocio_id': self.negocio.pk, 'cantidad': cantidad,
+        })
+
+    def test_acumula_cantidad_y_reserva(self):
+        self.assertEqual(self.agregar(self.pan, 2).status_code, 200)
+        respuesta = self.agregar(self.pan, 1)
+
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.json()['carrito']['cantidad_items'], 3)
+        self.assertEqual(ItemCarrito.objects.get(producto=self.pan).cantidad, 3)
+        self.assertEqual(ReservaStock.objects.get(producto=self.pan).cantidad, 3)
+
+    def test_no_supera_el_stock_disponible(self):
+        self.agregar(self.pan, 4)
+        # Otro cliente reservó la última unidad
+        otro = Carrito.objects.create(usuario=Usuario.objects.create(username='otro'), negocio=self.negocio)
+        ReservaStock.objects.create(
+            carrito=otro, producto=self.pan, cantidad=1, expira=ReservaStock.objects.get().expira,
+        )
+
+        respuesta = self.agregar(self.pan, 1)
+
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertIn('Ya tienes 4', respuesta.json()['error'])
+        self.assertEqual(ItemCarrito.objects.get(producto=self.pan).cantidad, 4)
+
+
+class TotalesCarritoTest(CarritoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.carrito = Carrito.objects.create(usuario=self.cliente, negocio=self.negocio)
+
+    def totales(self):
+        carrito = Carrito.objects.get(pk=self.carrito.pk)
+        return carrito.cantidad_items, carrito.subtotal
+
+    def test_agregar_cambiar_y_borrar_items(self):
+        pan = ItemCarrito.objects.create(carrito=self.carrito, producto=self.pan, cantidad=2)
+        ItemCarrito.objects.create(carrito=self.carrito, producto=self.leche, cantidad=1)
+        self.assertEqual(self.totales(), (3, Decimal('2000')))
+
+        pan = ItemCarrito.objects.get(pk=pan.pk)
+        pan.cantidad = 5
+        pan.save()
+        self.assertEqual(self.totales(), (6, Decimal('3500')))
+
+        pan.delete()
+        self.assertEqual(self.totales(), (1, Decimal('1000')))
+
+    def test_carrito_cargado_queda_al_dia(self):
+        self.carrito.items.create(producto=self.pan, cantidad=2)
+        self.assertEqual((self.carrito.cantidad_items, self.carrito.subtotal), (2, Decimal('1000')))
+
+    def test_borrar_producto_descuenta_en_cascada(self):
+        ItemCarrito.objects.create(carrito=self.carrito, producto=self.pan, cantidad=2)
+        ItemCarrito.objects.create(carrito=self.carrito, producto=self.leche, cantidad=1)
+
+        self.pan.delete()
+
+        self.assertEqual(self.totales(), (1, Decimal('1000')))
+
+    def test_recalcular_corrige_desvios(self):
+        ItemCarrito.objects.create(carrito=self.carrito, producto=self.pan, cantidad=2)
+        # QuerySet.update() no pasa por ItemCarrito.save()
+        ItemCarrito.objects.update(cantidad=4)
+        self.assertEqual(self.totales(), (2, Decimal('1000')))
+
+        salida = io.StringIO()
+        call_command('recalcular_carritos', stdout=salida)
+
+        self.assertIn('1 carritos corregidos', salida.getvalue())
+        self.assertEqual(self.totales(), (4, Decimal('2000')))
+
+
+class OperacionesCarritoTest(CarritoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.carrito = Carrito.objects.create(usuario=self.cliente, negocio=self.negocio)
+        self.item_pan = ItemCarrito.objects.create(carrito=self.carrito, producto=self.pan, cantidad=1)
+        self.item_leche = ItemCarrito.objects.create(carrito=self.carrito, producto=self.leche, cantidad=1)
+        self.queso = Producto.objects.create(
+            negocio=self.negocio, codigo='QUE-1', nombre='Queso', precio=Decimal('3000'), stock=2,
+        )
+
+    def operar(self, operaciones):
+        return self.client.post(
+            '/api/carrito/batch/',
+            json.dumps({'negocio_id': self.negocio.pk, 'operaciones': operaciones}),
+            content_type='application/json',
+        )
+
+    def estado(self):
+        carrito = Carrito.objects.get(pk=self.carrito.pk)
+        items = dict(carrito.items.values_list('producto_id', 'cantidad'))
+        return items, carrito.cantidad_items, carrito.subtotal
+
+    def test_operaciones_mixtas(self):
+        respuesta = self.operar([
+            {'accion': 'agregar', 'producto_id': self.queso.pk, 'cantidad': 1},
+            {'accion': 'agregar', 'producto_id': self.queso.pk, 'cantidad': 1},
+            {'accion': 'actualizar', 'item_id': self.item_pan.pk, 'cantidad': 3},
+            {'accion': 'eliminar', 'item_id': self.item_leche.pk},
+        ])
+
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.json()['carrito']['cantidad_items'], 5)
+        self.assertEqual(self.estado(), ({self.pan.pk: 3, self.queso.pk: 2}, 5, Decimal('7500')))
+        self.assertEqual(
+            dict(ReservaStock.objects.values_list('producto_id', 'cantidad')), {self.pan.pk: 3, self.queso.pk: 2}
+        )
+
+    def test_operacion_invalida_no_aplica_ninguna(self):
+        antes = self.estado()
+        for invalida in (
+            {'accion': 'actualizar', 'item_id': 999999, 'cantidad': 2},
+            {'accion': 'agregar', 'producto_id': self.queso.pk, 'cantidad': 0},
+            {'accion': 'vender'},
+            'eliminar',
+        ):
+            respuesta = self.operar([
+                {'accion': 'actualizar', 'item_id': self.item_pan.pk, 'cantidad': 2},
+                invalida,
+            ])
+            self.assertEqual(respuesta.status_code, 400, invalida)
+            self.assertEqual(self.estado(), antes)
+
+    def test_respeta_el_stock(self):
+        antes = self.estado()
+        respuesta = self.operar([
+            {'accion': 'eliminar', 'item_id': self.item_leche.pk},
+            {'accion': 'agregar', 'producto_id': self.queso.pk, 'cantidad': 3},
+        ])
+
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertIn('Queso', respuesta.json()['error'])
+        self.assertEqual(self.estado(), antes)
+        self.assertFalse(ReservaStock.objects.filter(producto=self.queso).exists())
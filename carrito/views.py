@@ -3,8 +3,10 @@ from django.http import JsonResponse
 from django.views.decorators.http import require_http_methods
 from django.contrib.auth.decorators import login_required
 from django.db import transaction
+import json
 from .models import Carrito, ItemCarrito
 from productos.models import Producto
+from productos import reservas
 from usuarios.models import Negocio
 
 @login_required
@@ -22,12 +24,6 @@ def agregar_al_carrito(request):
         producto = get_object_or_404(Producto, id=producto_id, activo=True)
         negocio = get_object_or_404(Negocio, id=negocio_id, activo=True)
         
-        # Verificar stock disponible
-        if producto.stock < cantidad:
-            return JsonResponse({
-                'error': f'Stock insuficiente. Solo hay {producto.stock} disponibles'
-            }, status=400)
-        
         # Obtener o crear carrito activo
         carrito, created = Carrito.objects.get_or_create(
             usuario=request.user,
@@ -35,22 +31,35 @@ def agregar_al_carrito(request):
             activo=True
         )
         
-        # Verificar si el producto ya está en el carrito
-        item, item_created = ItemCarrito.objects.get_or_create(
-            carrito=carrito,
-            producto=producto,
-            defaults={'cantidad': cantidad, 'precio_unitario': producto.precio_actual}
-        )
-        
-        if not item_created:
-            # Si ya existe, actualizar cantidad
-            nueva_cantidad = item.cantidad + cantidad
-            if producto.stock < nueva_cantidad:
-                return JsonResponse({
-                    'error': f'Stock insuficiente. Solo puedes agregar {producto.stock - item.cantidad} más'
-                }, status=400)
-            item.cantidad = nueva_cantidad
-            item.save()
+        with transaction.atomic():
+            # Bloquear el carrito antes de leer la cantidad: dos "agregar"
+            # simultáneos sobre el mismo item no pierden unidades
+            Carrito.objects.select_for_update().filter(pk=carrito.pk).values_list('pk', flat=True).get()
+            # Vía carrito.items para que item.carrito sea este mismo objeto (totales al día)
+            item = carrito.items.filter(producto=producto).first()
+            nueva_cantidad = cantidad + (item.cantidad if item else 0)
+            
+            # Reservar las unidades (valida contra el stock disponible)
+            try:
+                reservas.reservar(carrito, producto, nueva_cantidad)
+            except ValueError as e:
+                if item:
+                    return JsonResponse({
+                        'error': f'{e}. Ya tienes {item.cantidad} en tu carrito'
+                    }, status=400)
+                return JsonResponse({'error': str(e)}, status=400)
+            
+            if item:
+                item.cantidad = nueva_cantidad
+                item.save()
+            else:
+                ItemCarrito.objects.create(
+                    carrito=carrito,
+                    producto=producto,
+                    cantidad=cantidad,
+                    precio_unitario=producto.precio_actual
+                )
+            reservas.renovar(carrito)
         
         return JsonResponse({
             'success': True,
@@ -78,14 +87,16 @@ def actualizar_cantidad(request):
         
         item = get_object_or_404(ItemCarrito, id=item_id, carrito__usuario=request.user)
         
-        # Verificar stock
-        if item.producto.stock < cantidad:
-            return JsonResponse({
-                'error': f'Stock insuficiente. Solo hay {item.producto.stock} disponibles'
-            }, status=400)
-        
-        item.cantidad = cantidad
-        item.save()
+        with transaction.atomic():
+            # Ajustar la reserva (valida contra el stock disponible)
+            try:
+                reservas.reservar(item.carrito, item.producto, cantidad)
+            except ValueError as e:
+                return JsonResponse({'error': str(e)}, status=400)
+            
+            item.cantidad = cantidad
+            item.save()
+            reservas.renovar(item.carrito)
         
         return JsonResponse({
             'success': True,
@@ -113,7 +124,9 @@ def eliminar_del_carrito(request):
         item = get_object_or_404(ItemCarrito, id=item_id, carrito__usuario=request.user)
         
         carrito = item.carrito
-        item.delete()
+        with transaction.atomic():
+            reservas.liberar(carrito, item.producto)
+            item.delete()
         
         return JsonResponse({
             'success': True,
@@ -128,6 +141,69 @@ def eliminar_del_carrito(request):
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
+@login_required
+@require_http_methods(["POST"])
+def operaciones_carrito(request):
+    """
+    Aplicar varias operaciones al carrito en una sola transacción.
+
+    Body JSON:
+    {
+        "negocio_id": 1,
+        "operaciones": [
+            {"accion": "agregar", "producto_id": 5, "cantidad": 2},
+            {"accion": "actualizar", "item_id": 10, "cantidad": 3},
+            {"accion": "eliminar", "item_id": 11}
+        ]
+    }
+    Si una operación falla no se aplica ninguna.
+    """
+    try:
+        try:
+            data = json.loads(request.body)
+        except ValueError:
+            return JsonResponse({'error': 'JSON inválido'}, status=400)
+        
+        negocio_id = data.get('negocio_id') if isinstance(data, dict) else None
+        operaciones = data.get('operaciones') if isinstance(data, dict) else None
+        
+        if not negocio_id or not isinstance(operaciones, list) or not operaciones:
+            return JsonResponse({'error': 'Faltan datos requeridos'}, status=400)
+        
+        negocio = get_object_or_404(Negocio, id=negocio_id, activo=True)
+        
+        with transaction.atomic():
+            carrito, created = Carrito.objects.get_or_create(
+                usuario=request.user,
+                negocio=negocio,
+                activo=True
+            )
+            items = carrito.aplicar_operaciones(operaciones)
+        
+        return JsonResponse({
+            'success': True,
+            'message': f'{len(operaciones)} operaciones aplicadas',
+            'items': [
+                {
+                    'id': item.id,
+                    'producto_id': item.producto_id,
+                    'cantidad': item.cantidad,
+                    'subtotal': float(item.subtotal)
+                }
+                for item in items
+            ],
+            'carrito': {
+                'cantidad_items': carrito.cantidad_items,
+                'subtotal': float(carrito.subtotal),
+                'total': float(carrito.total)
+            }
+        })
+        
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
 @login_required
 @require_http_methods(["GET"])
 def ver_carrito(request):
@@ -155,6 +231,13 @@ def ver_carrito(request):
             'total': 0
         })
     
+    # Stock disponible para este carrito: descuenta solo reservas de otros carritos
+    disponibles = dict(
+        reservas.con_disponible(
+            Producto.objects.filter(itemcarrito__carrito=carrito), excluir_carrito=carrito
+        ).values_list('id', 'stock_disponible')
+    )
+    
     items = []
     for item in carrito.items.select_related('producto', 'producto__categoria'):
         items.append({
@@ -164,7 +247,7 @@ def ver_carrito(request):
                 'codigo': item.producto.codigo,
                 'nombre': item.producto.nombre,
                 'imagen': item.producto.imagen.url if item.producto.imagen else None,
-                'stock': item.producto.stock
+                'stock': disponibles.get(item.producto.id, item.producto.stock)
             },
             'cantidad': item.cantidad,
             'precio_unitario': float(item.precio_unitario),
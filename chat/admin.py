@@ -4,13 +4,10 @@ from .models import Conversacion, Mensaje
 
 @admin.register(Conversacion)
 class ConversacionAdmin(admin.ModelAdmin):
-    list_display = ['pedido', 'fecha_creacion', 'activa', 'total_mensajes']
+    list_display = ['pedido', 'fecha_creacion', 'activa', 'total_mensajes', 'no_leidos_cliente', 'no_leidos_comerciante']
     list_filter = ['activa', 'fecha_creacion']
     search_fields = ['pedido__numero_pedido', 'pedido__cliente__username']
-    
-    def total_mensajes(self, obj):
-        return obj.mensajes.count()
-    total_mensajes.short_description = 'Total Mensajes'
+    readonly_fields = ['total_mensajes', 'no_leidos_cliente', 'no_leidos_comerciante', 'ultimo_mensaje']
 
 @admin.register(Mensaje)
 class MensajeAdmin(admin.ModelAdmin):
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.7 on 2026-10-18 10:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def calcular_contadores(apps, schema_editor):
+    Conversacion = apps.get_model('chat', 'Conversacion')
+    no_leidos = models.Q(leido=False)
+
+    for conversacion in Conversacion.objects.select_related('pedido').iterator():
+        cliente_id = conversacion.pedido.cliente_id
+        datos = conversacion.mensajes.aggregate(
+            total=models.Count('id'),
+            para_cliente=models.Count('id', filter=no_leidos & ~models.Q(usuario_id=cliente_id)),
+            para_comerciante=models.Count('id', filter=no_leidos & models.Q(usuario_id=cliente_id)),
+            ultimo=models.Max('id'),
+        )
+        Conversacion.objects.filter(pk=conversacion.pk).update(
+            total_mensajes=datos['total'],
+            no_leidos_cliente=datos['para_cliente'],
+            no_leidos_comerciante=datos['para_comerciante'],
+            ultimo_mensaje_id=datos['ultimo'],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversacion',
+            name='no_leidos_cliente',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='conversacion',
+            name='no_leidos_comerciante',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='conversacion',
+            name='total_mensajes',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='conversacion',
+            name='ultimo_mensaje',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='chat.mensaje'),
+        ),
+        migrations.RunPython(calcular_contadores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-18 10:37
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0002_contadores_conversacion'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='mensaje',
+            index=models.Index(fields=['conversacion', 'id'], name='chat_mensaj_convers_6ed025_idx'),
+        ),
+    ]
@@ -1,5 +1,6 @@
 # chat/models.py
 from django.db import models
+from django.db.models.functions import Coalesce, Greatest
 from usuarios.models import Usuario
 from pedidos.models import Pedido
 
@@ -8,6 +9,16 @@ class Conversacion(models.Model):
     fecha_creacion = models.DateTimeField(auto_now_add=True)
     activa = models.BooleanField(default=True)
     
+    # Contadores mantenidos al crear mensajes (registrar_mensaje) y al leerlos
+    # (marcar_leidos), así las listas de chats no recorren los mensajes;
+    # recalcular() los rehace desde cero
+    total_mensajes = models.PositiveIntegerField(default=0)
+    no_leidos_cliente = models.PositiveIntegerField(default=0)
+    no_leidos_comerciante = models.PositiveIntegerField(default=0)
+    ultimo_mensaje = models.ForeignKey(
+        'Mensaje', on_delete=models.SET_NULL, null=True, blank=True, related_name='+'
+    )
+    
     class Meta:
         verbose_name = 'Conversación'
         verbose_name_plural = 'Conversaciones'
@@ -15,6 +26,60 @@ class Conversacion(models.Model):
     
     def __str__(self):
         return f"Chat - {self.pedido.numero_pedido}"
+    
+    @classmethod
+    def de_pedido(cls, pedido):
+        """Conversación del pedido (la crea si no existe) con el pedido ya asociado"""
+        conversacion, created = cls.objects.get_or_create(pedido=pedido)
+        conversacion.pedido = pedido
+        return conversacion
+    
+    def campo_no_leidos(self, usuario_id):
+        """Contador de mensajes sin leer del participante `usuario_id`"""
+        return 'no_leidos_cliente' if usuario_id == self.pedido.cliente_id else 'no_leidos_comerciante'
+    
+    def no_leidos_para(self, usuario):
+        return getattr(self, self.campo_no_leidos(usuario.pk))
+    
+    def registrar_mensaje(self, mensaje):
+        """Suma el mensaje nuevo a los contadores con un UPDATE atómico"""
+        # El mensaje queda sin leer para el otro participante
+        campo = 'no_leidos_comerciante' if mensaje.usuario_id == self.pedido.cliente_id else 'no_leidos_cliente'
+        Conversacion.objects.filter(pk=self.pk).update(
+            total_mensajes=models.F('total_mensajes') + 1,
+            ultimo_mensaje_id=Greatest(Coalesce('ultimo_mensaje_id', 0), mensaje.pk),
+            **{campo: models.F(campo) + 1}
+        )
+    
+    def marcar_leidos(self, usuario):
+        """
+        Marca como leídos los mensajes recibidos por `usuario` y descuenta de
+        su contador solo los que marcó este UPDATE: un mensaje que llegue
+        entre ambas sentencias sigue contado como no leído.
+        """
+        campo = self.campo_no_leidos(usuario.pk)
+        marcados = self.mensajes.filter(leido=False).exclude(usuario=usuario).update(leido=True)
+        if marcados:
+            Conversacion.objects.filter(pk=self.pk).update(
+                **{campo: Greatest(models.F(campo) - marcados, 0)}
+            )
+        setattr(self, campo, max(getattr(self, campo) - marcados, 0))
+    
+    def recalcular(self):
+        """Recalcula los contadores desde los mensajes"""
+        cliente_id = self.pedido.cliente_id
+        no_leidos = models.Q(leido=False)
+        datos = self.mensajes.aggregate(
+            total=models.Count('id'),
+            para_cliente=models.Count('id', filter=no_leidos & ~models.Q(usuario_id=cliente_id)),
+            para_comerciante=models.Count('id', filter=no_leidos & models.Q(usuario_id=cliente_id)),
+            ultimo=models.Max('id'),
+        )
+        self.total_mensajes = datos['total']
+        self.no_leidos_cliente = datos['para_cliente']
+        self.no_leidos_comerciante = datos['para_comerciante']
+        self.ultimo_mensaje_id = datos['ultimo']
+        self.save(update_fields=['total_mensajes', 'no_leidos_cliente', 'no_leidos_comerciante', 'ultimo_mensaje'])
 
 class Mensaje(models.Model):
     conversacion = models.ForeignKey(Conversacion, on_delete=models.CASCADE, related_name='mensajes')
@@ -32,6 +97,21 @@ class Mensaje(models.Model):
         verbose_name = 'Mensaje'
         verbose_name_plural = 'Mensajes'
         ordering = ['fecha_envio']
+        indexes = [
+            models.Index(fields=['conversacion', 'id']),  # páginas del historial por cursor
+        ]
     
     def __str__(self):
-        return f"{self.usuario.username}: {self.mensaje[:50]}..."
\ No newline at end of file
+        return f"{self.usuario.username}: {self.mensaje[:50]}..."
+    
+    def save(self, *args, **kwargs):
+        nuevo = self._state.adding
+        super().save(*args, **kwargs)
+        if nuevo:
+            self.conversacion.registrar_mensaje(self)
+    
+    def delete(self, *args, **kwargs):
+        conversacion = self.conversacion
+        resultado = super().delete(*args, **kwargs)
+        conversacion.recalcular()
+        return resultado
@@ -0,0 +1,30 @@
+# chat/signals.py
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from pickup_rural import pubsub
+from .models import Mensaje
+
+
+def canal_conversacion(conversacion_id):
+    return f'chat:{conversacion_id}'
+
+
+def datos_mensaje(mensaje):
+    return {
+        'id': mensaje.id,
+        'texto': mensaje.mensaje,
+        'fecha': mensaje.fecha_envio.isoformat(),
+        'usuario': mensaje.usuario.username,
+        'usuario_id': mensaje.usuario_id,
+        'leido': mensaje.leido,
+    }
+
+
+@receiver(post_save, sender=Mensaje)
+def publicar_mensaje(sender, instance, created, **kwargs):
+    """Empujar el mensaje nuevo a los streams abiertos de la conversación"""
+    if created:
+        canal = canal_conversacion(instance.conversacion_id)
+        datos = datos_mensaje(instance)
+        transaction.on_commit(lambda: pubsub.publicar(canal, datos))
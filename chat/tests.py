@@ -0,0 +1,103 @@
+import time
+from decimal import Decimal
+from unittest import mock
+
+from django.db.models import QuerySet
+from django.test import AsyncClient, TestCase
+
+from chat.models import Conversacion, Mensaje
+from pedidos.models import Pedido
+from usuarios.models import Usuario, Negocio
+
+
+class ChatTestCase(TestCase):
+    def setUp(self):
+        self.comerciante = Usuario.objects.create_user(
+            username='comerciante', password='x', tipo_usuario='comerciante'
+        )
+        self.negocio = Negocio.objects.create(
+            propietario=self.comerciante,
+            nombre='Almacén Test',
+            direccion='Camino Rural Km 5',
+            telefono='+56912345678',
+            email='almacen@test.cl',
+            horario_apertura='08:00',
+            horario_cierre='20:00',
+            dias_atencion='Lunes a Sábado',
+        )
+        self.cliente = Usuario.objects.create_user(username='cliente', password='x')
+        self.pedido = Pedido.objects.create(
+            cliente=self.cliente, negocio=self.negocio, metodo_entrega='pickup',
+            telefono_contacto='+56987654321', total=Decimal('1000'),
+        )
+        self.conversacion = Conversacion.de_pedido(self.pedido)
+        self.client.force_login(self.cliente)
+
+
+class StreamWsgiTest(ChatTestCase):
+    """Bajo WSGI (Client de pruebas) el chat no retiene hilos del servidor"""
+
+    def test_stream_rechazado_bajo_wsgi(self):
+        response = self.client.get(f'/chat/api/{self.pedido.pk}/stream/')
+
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(response.streaming)
+
+    def test_long_poll_no_espera_bajo_wsgi(self):
+        inicio = time.monotonic()
+        response = self.client.get(f'/chat/api/{self.pedido.pk}/mensajes/', {'ultimo_id': 0, 'espera': 25})
+
+        self.assertLess(time.monotonic() - inicio, 5)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'mensajes': [], 'espera': 0})
+
+    def test_long_poll_entrega_pendientes_bajo_wsgi(self):
+        mensaje = Mensaje.objects.create(conversacion=self.conversacion, usuario=self.comerciante, mensaje='Listo')
+
+        response = self.client.get(f'/chat/api/{self.pedido.pk}/mensajes/', {'ultimo_id': 0, 'espera': 25})
+
+        self.assertEqual([m['id'] for m in response.json()['mensajes']], [mensaje.pk])
+
+    async def test_long_poll_espera_bajo_asgi(self):
+        await Mensaje.objects.acreate(conversacion=self.conversacion, usuario=self.comerciante, mensaje='Listo')
+        cliente = AsyncClient()
+        await cliente.aforce_login(self.cliente)
+
+        response = await cliente.get(f'/chat/api/{self.pedido.pk}/mensajes/', {'ultimo_id': 0, 'espera': 25})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['espera'], 25)
+        self.assertEqual(len(response.json()['mensajes']), 1)
+
+
+class MarcarLeidosTest(ChatTestCase):
+    def enviar(self, usuario, texto='Hola'):
+        return Mensaje.objects.create(conversacion=self.conversacion, usuario=usuario, mensaje=texto)
+
+    def test_descuenta_los_marcados(self):
+        self.enviar(self.comerciante)
+        self.enviar(self.comerciante)
+        self.enviar(self.cliente)
+
+        self.conversacion.marcar_leidos(self.cliente)
+
+        self.conversacion.refresh_from_db()
+        self.assertEqual((self.conversacion.no_leidos_cliente, self.conversacion.no_leidos_comerciante), (0, 1))
+
+    def test_mensaje_que_llega_durante_la_marca_sigue_sin_leer(self):
+        self.enviar(self.comerciante)
+        update = QuerySet.update
+        llegados = []
+
+        def update_y_llega_mensaje(queryset, **kwargs):
+            filas = update(queryset, **kwargs)
+            if queryset.model is Mensaje and not llegados:
+                llegados.append(self.enviar(self.comerciante, 'Otro'))
+            return filas
+
+        with mock.patch.object(QuerySet, 'update', autospec=True, side_effect=update_y_llega_mensaje):
+            self.conversacion.marcar_leidos(self.cliente)
+
+        self.conversacion.refresh_from_db()
+        self.assertEqual(self.conversacion.no_leidos_cliente, 1)
+        self.assertEqual(self.conversacion.mensajes.filter(leido=False).count(), 1)
@@ -11,6 +11,8 @@ urlpatterns = [
     # APIs para el chat en tiempo real
     path('api/<int:pedido_id>/enviar/', views.enviar_mensaje, name='enviar_mensaje'),
     path('api/<int:pedido_id>/mensajes/', views.obtener_mensajes, name='obtener_mensajes'),
+    path('api/<int:pedido_id>/stream/', views.stream_mensajes, name='stream_mensajes'),
+    path('api/<int:pedido_id>/anteriores/', views.mensajes_anteriores, name='mensajes_anteriores'),
     
     # Lista de chats para comerciante
     path('comerciante/lista/', views.lista_chats_comerciante, name='lista_chats_comerciante'),
@@ -1,11 +1,32 @@
 # chat/views.py
-from django.shortcuts import render, get_object_or_404
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.shortcuts import render, get_object_or_404, aget_object_or_404
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from .models import Conversacion, Mensaje
+from .signals import canal_conversacion, datos_mensaje
 from pedidos.models import Pedido
+from pickup_rural import pubsub
+
+# Mensajes que se cargan al abrir el chat y por cada página anterior
+MENSAJES_POR_PAGINA = 30
+MAX_MENSAJES_POR_PAGINA = 100
+
+def _pagina_mensajes(conversacion, antes_de_id=None, limite=MENSAJES_POR_PAGINA):
+    """
+    Los `limite` mensajes más recientes (con id < antes_de_id si se indica),
+    en orden cronológico, y si quedan mensajes más antiguos.
+    """
+    mensajes = conversacion.mensajes.select_related('usuario').order_by('-id')
+    if antes_de_id:
+        mensajes = mensajes.filter(id__lt=antes_de_id)
+    pagina = list(mensajes[:limite + 1])
+    return pagina[:limite][::-1], len(pagina) > limite
 
 @login_required
 def chat_pedido(request, pedido_id):
@@ -19,16 +40,20 @@ def chat_pedido(request, pedido_id):
         }, status=403)
     
     # Obtener o crear conversación
-    conversacion, created = Conversacion.objects.get_or_create(pedido=pedido)
+    conversacion = Conversacion.de_pedido(pedido)
     
-    # Marcar mensajes como leídos
-    if request.user == pedido.negocio.propietario:
-        conversacion.mensajes.filter(leido=False).exclude(usuario=request.user).update(leido=True)
+    # Marcar como leídos los mensajes recibidos
+    if conversacion.no_leidos_para(request.user):
+        conversacion.marcar_leidos(request.user)
+    
+    # Solo la última página; las anteriores se piden a mensajes_anteriores
+    mensajes, hay_anteriores = _pagina_mensajes(conversacion)
     
     context = {
         'pedido': pedido,
         'conversacion': conversacion,
-        'mensajes': conversacion.mensajes.all().select_related('usuario'),
+        'mensajes': mensajes,
+        'hay_anteriores': hay_anteriores,
         'es_comerciante': request.user == pedido.negocio.propietario,
     }
     
@@ -51,7 +76,7 @@ def enviar_mensaje(request, pedido_id):
         return JsonResponse({'error': 'El mensaje no puede estar vacío'}, status=400)
     
     # Obtener conversación
-    conversacion, created = Conversacion.objects.get_or_create(pedido=pedido)
+    conversacion = Conversacion.de_pedido(pedido)
     
     # Crear mensaje
     mensaje = Mensaje.objects.create(
@@ -72,38 +97,160 @@ def enviar_mensaje(request, pedido_id):
     })
 
 @login_required
-def obtener_mensajes(request, pedido_id):
-    """API para obtener mensajes nuevos"""
-    pedido = get_object_or_404(Pedido, id=pedido_id)
+def mensajes_anteriores(request, pedido_id):
+    """API para cargar el historial hacia atrás (cursor antes_de_id)"""
+    pedido = get_object_or_404(Pedido.objects.select_related('negocio'), id=pedido_id)
     
-    if request.user != pedido.cliente and request.user != pedido.negocio.propietario:
+    # Verificar permisos
+    if request.user.pk not in (pedido.cliente_id, pedido.negocio.propietario_id):
         return JsonResponse({'error': 'No autorizado'}, status=403)
     
-    ultimo_mensaje_id = request.GET.get('ultimo_id', 0)
+    try:
+        antes_de_id = int(request.GET.get('antes_de_id') or 0)
+        limite = min(int(request.GET.get('limite') or MENSAJES_POR_PAGINA), MAX_MENSAJES_POR_PAGINA)
+    except ValueError:
+        return JsonResponse({'error': 'Parámetros inválidos'}, status=400)
+    if limite < 1:
+        return JsonResponse({'error': 'Parámetros inválidos'}, status=400)
+    
+    conversacion = Conversacion.objects.filter(pedido=pedido).first()
+    if conversacion is None:
+        return JsonResponse({'mensajes': [], 'hay_mas': False})
+    
+    mensajes, hay_mas = _pagina_mensajes(conversacion, antes_de_id, limite)
     
+    mensajes_data = []
+    for mensaje in mensajes:
+        datos = datos_mensaje(mensaje)
+        datos['es_mio'] = mensaje.usuario_id == request.user.pk
+        mensajes_data.append(datos)
+    
+    return JsonResponse({'mensajes': mensajes_data, 'hay_mas': hay_mas})
+
+def _leer_mensajes(conversacion, ultimo_id, usuario):
+    """Mensajes con id > ultimo_id ya serializados (marca como leídos los del otro participante)"""
+    mensajes = list(conversacion.mensajes.filter(id__gt=ultimo_id).select_related('usuario'))
+    
+    if any(not m.leido and m.usuario_id != usuario.pk for m in mensajes):
+        conversacion.marcar_leidos(usuario)
+    
+    mensajes_data = []
+    for mensaje in mensajes:
+        datos = datos_mensaje(mensaje)
+        datos['es_mio'] = mensaje.usuario_id == usuario.pk
+        mensajes_data.append(datos)
+    return mensajes_data
+
+def _ultimo_id(valor):
     try:
-        conversacion = Conversacion.objects.get(pedido=pedido)
-        mensajes = conversacion.mensajes.filter(id__gt=ultimo_mensaje_id).select_related('usuario')
-        
-        # Marcar como leídos si es comerciante
-        if request.user == pedido.negocio.propietario:
-            mensajes.filter(leido=False).exclude(usuario=request.user).update(leido=True)
-        
-        mensajes_data = []
-        for mensaje in mensajes:
-            mensajes_data.append({
-                'id': mensaje.id,
-                'texto': mensaje.mensaje,
-                'fecha': mensaje.fecha_envio.isoformat(),
-                'usuario': mensaje.usuario.username,
-                'es_mio': mensaje.usuario == request.user,
-                'leido': mensaje.leido
-            })
+        return max(int(valor or 0), 0)
+    except ValueError:
+        return 0
+
+async def _pedido_del_chat(request, pedido_id):
+    """(usuario, pedido); pedido es None si el usuario no participa"""
+    usuario = await request.auser()
+    pedido = await aget_object_or_404(Pedido.objects.select_related('negocio'), id=pedido_id)
+    if usuario.pk not in (pedido.cliente_id, pedido.negocio.propietario_id):
+        return usuario, None
+    return usuario, pedido
+
+@login_required
+async def obtener_mensajes(request, pedido_id):
+    """
+    API para obtener mensajes nuevos (id > ultimo_id).
+    
+    Con `espera=N` funciona como long-poll: si no hay mensajes nuevos
+    mantiene la petición abierta hasta N segundos esperando uno (respaldo
+    para clientes sin EventSource). Bajo WSGI no se espera (cada petición
+    abierta bloquea un hilo): la respuesta indica `espera: 0` y el cliente
+    vuelve a consultar con su propio intervalo.
+    """
+    usuario, pedido = await _pedido_del_chat(request, pedido_id)
+    if pedido is None:
+        return JsonResponse({'error': 'No autorizado'}, status=403)
+    
+    ultimo_mensaje_id = _ultimo_id(request.GET.get('ultimo_id'))
+    espera = min(_ultimo_id(request.GET.get('espera')), settings.LONG_POLL_MAX_SEGUNDOS)
+    if not pubsub.sirve_asgi(request):
+        espera = 0
+    
+    conversacion = await Conversacion.objects.filter(pedido=pedido).afirst()
+    if conversacion is None:
+        return JsonResponse({'mensajes': [], 'espera': espera})
+    conversacion.pedido = pedido
+    
+    leer = sync_to_async(_leer_mensajes)
+    if not espera:
+        return JsonResponse({'mensajes': await leer(conversacion, ultimo_mensaje_id, usuario), 'espera': espera})
+    
+    # Suscribirse antes de consultar: un mensaje que llegue entre la
+    # consulta y la espera no se pierde
+    async with pubsub.suscribir(canal_conversacion(conversacion.pk)) as suscripcion:
+        mensajes_data = await leer(conversacion, ultimo_mensaje_id, usuario)
+        if not mensajes_data:
+            try:
+                await suscripcion.recibir(espera)
+            except asyncio.TimeoutError:
+                pass
+            else:
+                mensajes_data = await leer(conversacion, ultimo_mensaje_id, usuario)
+    
+    return JsonResponse({'mensajes': mensajes_data, 'espera': espera})
+
+@login_required
+async def stream_mensajes(request, pedido_id):
+    """
+    Stream SSE con los mensajes nuevos de la conversación (requiere ASGI).
+    
+    Al conectar envía los mensajes con id > ultimo_id (o Last-Event-ID al
+    reconectar) y luego empuja cada mensaje nuevo desde pubsub: un chat
+    inactivo no hace consultas, solo envía un comentario de keepalive.
+    Bajo WSGI responde 503 y el cliente pasa al long-poll.
+    """
+    if not pubsub.sirve_asgi(request):
+        return pubsub.sin_streaming()
+    
+    usuario, pedido = await _pedido_del_chat(request, pedido_id)
+    if pedido is None:
+        return JsonResponse({'error': 'No autorizado'}, status=403)
+    
+    ultimo_mensaje_id = _ultimo_id(request.headers.get('Last-Event-ID') or request.GET.get('ultimo_id'))
+    conversacion = await sync_to_async(Conversacion.de_pedido)(pedido)
+    
+    async def eventos():
+        ultimo = ultimo_mensaje_id
+        yield 'retry: 3000\n\n'
         
-        return JsonResponse({'mensajes': mensajes_data})
+        async with pubsub.suscribir(canal_conversacion(conversacion.pk)) as suscripcion:
+            for datos in await sync_to_async(_leer_mensajes)(conversacion, ultimo, usuario):
+                ultimo = datos['id']
+                yield pubsub.evento_sse(datos, evento='mensaje', id=datos['id'])
+            
+            while True:
+                try:
+                    datos = await suscripcion.recibir(settings.SSE_KEEPALIVE_SEGUNDOS)
+                except asyncio.TimeoutError:
+                    yield ': keepalive\n\n'
+                    continue
+                
+                if datos is None:
+                    # Cliente lento: cerrar; al reconectar recupera desde Last-Event-ID
+                    return
+                if datos['id'] <= ultimo:
+                    continue
+                
+                ultimo = datos['id']
+                datos = dict(datos, es_mio=datos['usuario_id'] == usuario.pk)
+                if not datos['es_mio']:
+                    await sync_to_async(conversacion.marcar_leidos)(usuario)
+                    datos['leido'] = True
+                yield pubsub.evento_sse(datos, evento='mensaje', id=datos['id'])
     
-    except Conversacion.DoesNotExist:
-        return JsonResponse({'mensajes': []})
+    respuesta = StreamingHttpResponse(eventos(), content_type='text/event-stream')
+    respuesta['Cache-Control'] = 'no-cache'
+    respuesta['X-Accel-Buffering'] = 'no'
+    return respuesta
 
 @login_required
 def lista_chats_comerciante(request):
@@ -120,19 +267,18 @@ def lista_chats_comerciante(request):
         pedidos_con_chat = Pedido.objects.filter(
             negocio=negocio,
             conversacion__isnull=False
-        ).select_related('cliente', 'conversacion').prefetch_related('conversacion__mensajes').order_by('-fecha_pedido')
+        ).select_related(
+            'cliente', 'conversacion', 'conversacion__ultimo_mensaje__usuario'
+        ).order_by('-fecha_pedido')
         
-        # Contar mensajes no leídos para cada chat
+        # Contadores guardados en la conversación: sin consultas por chat
         chats_con_info = []
         for pedido in pedidos_con_chat:
-            mensajes_no_leidos = pedido.conversacion.mensajes.filter(leido=False).exclude(usuario=request.user).count()
-            ultimo_mensaje = pedido.conversacion.mensajes.last()
-            
             chats_con_info.append({
                 'pedido': pedido,
-                'mensajes_no_leidos': mensajes_no_leidos,
-                'ultimo_mensaje': ultimo_mensaje,
-                'total_mensajes': pedido.conversacion.mensajes.count()
+                'mensajes_no_leidos': pedido.conversacion.no_leidos_comerciante,
+                'ultimo_mensaje': pedido.conversacion.ultimo_mensaje,
+                'total_mensajes': pedido.conversacion.total_mensajes
             })
         
         context = {
@@ -1,6 +1,6 @@
 # fidelizacion/admin.py
 from django.contrib import admin
-from .models import ProgramaFidelidad, ClienteFidelidad, Premio, CanjePuntos
+from .models import ProgramaFidelidad, ClienteFidelidad, Premio, CanjePuntos, MovimientoPuntos
 
 @admin.register(ProgramaFidelidad)
 class ProgramaFidelidadAdmin(admin.ModelAdmin):
@@ -23,4 +23,21 @@ class PremioAdmin(admin.ModelAdmin):
 class CanjePuntosAdmin(admin.ModelAdmin):
     list_display = ['cliente_fidelidad', 'premio', 'puntos_usados', 'fecha_canje', 'estado']
     list_filter = ['estado', 'fecha_canje']
-    readonly_fields = ['fecha_canje']
\ No newline at end of file
+    readonly_fields = ['fecha_canje']
+
+@admin.register(MovimientoPuntos)
+class MovimientoPuntosAdmin(admin.ModelAdmin):
+    list_display = ['cliente_fidelidad', 'tipo', 'puntos', 'pedido', 'canje', 'fecha']
+    list_filter = ['tipo', 'fecha']
+    search_fields = ['cliente_fidelidad__cliente__username']
+    raw_id_fields = ['cliente_fidelidad', 'pedido', 'canje']
+    
+    # El libro es de solo lectura: los saldos se derivan de él
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,25 @@
+# fidelizacion/management/commands/recalcular_niveles.py
+from django.core.management.base import BaseCommand
+from fidelizacion.models import ClienteFidelidad
+from fidelizacion.services import ServicioNiveles
+
+
+class Command(BaseCommand):
+    help = 'Recalcula el nivel de todos los clientes según ClienteFidelidad.NIVELES (UPDATE masivo por lotes)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=ServicioNiveles.TAMANO_LOTE, help='Rango de ids por sentencia')
+        parser.add_argument('--dry-run', action='store_true', help='Solo contar los cambios, sin escribir')
+
+    def handle(self, *args, **options):
+        cambios = ServicioNiveles.recalcular(simular=options['dry_run'], tamano_lote=options['lote'])
+
+        nombres = dict(ClienteFidelidad._meta.get_field('nivel').choices)
+        for (anterior, nuevo), cantidad in sorted(cambios.items()):
+            self.stdout.write(f'  {nombres.get(anterior, anterior)} → {nombres.get(nuevo, nuevo)}: {cantidad}')
+
+        total = sum(cambios.values())
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(f'🔍 Simulación: {total} clientes cambiarían de nivel'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'✅ {total} clientes cambiaron de nivel'))
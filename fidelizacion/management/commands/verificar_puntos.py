@@ -0,0 +1,26 @@
+# fidelizacion/management/commands/verificar_puntos.py
+from django.core.management.base import BaseCommand
+from fidelizacion.services import ServicioPuntos
+
+
+class Command(BaseCommand):
+    help = 'Compara los saldos de puntos de cada cliente con el libro de movimientos (y opcionalmente los corrige)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reparar', action='store_true', help='Reescribir los saldos que no cuadran')
+        parser.add_argument('--lote', type=int, default=ServicioPuntos.TAMANO_LOTE, help='Clientes por consulta')
+
+    def handle(self, *args, **options):
+        diferencias = ServicioPuntos.verificar(reparar=options['reparar'], tamano_lote=options['lote'])
+
+        for cliente_id, (guardado, esperado) in sorted(diferencias.items()):
+            self.stdout.write(
+                f'⚠️  cliente_fidelidad {cliente_id}: acumulados/canjeados {guardado[0]}/{guardado[1]} '
+                f'→ libro {esperado[0]}/{esperado[1]}'
+            )
+        if not diferencias:
+            self.stdout.write(self.style.SUCCESS('✅ Todos los saldos cuadran con el libro'))
+        elif options['reparar']:
+            self.stdout.write(self.style.SUCCESS(f'✅ {len(diferencias)} saldos corregidos'))
+        else:
+            self.stdout.write(self.style.WARNING(f'❌ {len(diferencias)} saldos no cuadran (usar --reparar para corregirlos)'))
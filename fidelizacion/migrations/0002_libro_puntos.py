@@ -0,0 +1,53 @@
+# Generated by Django 5.2.7 on 2026-10-18 10:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def saldos_iniciales(apps, schema_editor):
+    """Abre el libro con los saldos actuales de cada cliente"""
+    ClienteFidelidad = apps.get_model('fidelizacion', 'ClienteFidelidad')
+    MovimientoPuntos = apps.get_model('fidelizacion', 'MovimientoPuntos')
+
+    movimientos = []
+    for cliente in ClienteFidelidad.objects.only('pk', 'puntos_acumulados', 'puntos_canjeados').iterator():
+        if cliente.puntos_acumulados > 0:
+            movimientos.append(MovimientoPuntos(
+                cliente_fidelidad_id=cliente.pk, tipo='saldo_inicial', puntos=cliente.puntos_acumulados
+            ))
+        if cliente.puntos_canjeados > 0:
+            # Canjes anteriores al libro: un solo movimiento sin CanjePuntos asociado
+            movimientos.append(MovimientoPuntos(
+                cliente_fidelidad_id=cliente.pk, tipo='canje', puntos=cliente.puntos_canjeados
+            ))
+    MovimientoPuntos.objects.bulk_create(movimientos, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fidelizacion', '0001_initial'),
+        ('pedidos', '0002_resumenes_diarios'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MovimientoPuntos',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('acumulacion', 'Acumulación por pedido'), ('canje', 'Canje de premio'), ('saldo_inicial', 'Saldo inicial')], max_length=20)),
+                ('puntos', models.PositiveIntegerField()),
+                ('fecha', models.DateTimeField(auto_now_add=True)),
+                ('canje', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='movimientos', to='fidelizacion.canjepuntos')),
+                ('cliente_fidelidad', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movimientos', to='fidelizacion.clientefidelidad')),
+                ('pedido', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='movimientos_puntos', to='pedidos.pedido')),
+            ],
+            options={
+                'verbose_name': 'Movimiento de Puntos',
+                'verbose_name_plural': 'Movimientos de Puntos',
+                'ordering': ['-fecha'],
+                'constraints': [models.UniqueConstraint(fields=('tipo', 'pedido'), name='movimiento_unico_por_pedido'), models.UniqueConstraint(fields=('tipo', 'canje'), name='movimiento_unico_por_canje')],
+            },
+        ),
+        migrations.RunPython(saldos_iniciales, migrations.RunPython.noop),
+    ]
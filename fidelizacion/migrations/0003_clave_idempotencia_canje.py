@@ -0,0 +1,22 @@
+# Generated by Django 5.2.7 on 2026-10-18 10:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fidelizacion', '0002_libro_puntos'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='canjepuntos',
+            name='clave_idempotencia',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='canjepuntos',
+            constraint=models.UniqueConstraint(fields=('cliente_fidelidad', 'clave_idempotencia'), name='canje_unico_por_clave'),
+        ),
+    ]
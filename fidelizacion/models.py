@@ -20,6 +20,14 @@ class ProgramaFidelidad(models.Model):
         return self.nombre
 
 class ClienteFidelidad(models.Model):
+    # (puntos acumulados mínimos, nivel), de mayor a menor
+    NIVELES = [
+        (5000, 'diamante'),
+        (2000, 'oro'),
+        (500, 'plata'),
+        (0, 'bronce'),
+    ]
+
     cliente = models.OneToOneField(Usuario, on_delete=models.CASCADE, related_name='fidelidad')
     programa = models.ForeignKey(ProgramaFidelidad, on_delete=models.CASCADE, default=1)
     puntos_acumulados = models.IntegerField(default=0)
@@ -44,18 +52,36 @@ class ClienteFidelidad(models.Model):
     def puntos_disponibles(self):
         return self.puntos_acumulados - self.puntos_canjeados
     
+    @classmethod
+    def nivel_para(cls, puntos):
+        for minimo, nivel in cls.NIVELES:
+            if puntos >= minimo:
+                return nivel
+        return cls.NIVELES[-1][1]
+    
+    @classmethod
+    def expresion_nivel(cls):
+        """CASE SQL equivalente a nivel_para(puntos_acumulados), para UPDATE masivos"""
+        return models.Case(
+            *[models.When(puntos_acumulados__gte=minimo, then=models.Value(nivel)) for minimo, nivel in cls.NIVELES[:-1]],
+            default=models.Value(cls.NIVELES[-1][1]),
+        )
+    
+    @classmethod
+    def filtro_nivel_desactualizado(cls):
+        """Q de los clientes cuyo nivel guardado no corresponde a sus puntos"""
+        desactualizados = models.Q()
+        maximo = None
+        for minimo, nivel in cls.NIVELES:
+            rango = models.Q(puntos_acumulados__gte=minimo) if minimo else models.Q()
+            if maximo is not None:
+                rango &= models.Q(puntos_acumulados__lt=maximo)
+            desactualizados |= rango & ~models.Q(nivel=nivel)
+            maximo = minimo
+        return desactualizados
+    
     def actualizar_nivel(self):
-        puntos_totales = self.puntos_acumulados
-        
-        if puntos_totales >= 5000:
-            self.nivel = 'diamante'
-        elif puntos_totales >= 2000:
-            self.nivel = 'oro'
-        elif puntos_totales >= 500:
-            self.nivel = 'plata'
-        else:
-            self.nivel = 'bronce'
-        
+        self.nivel = self.nivel_para(self.puntos_acumulados)
         self.save()
 
 class Premio(models.Model):
@@ -86,11 +112,50 @@ class CanjePuntos(models.Model):
         ('entregado', 'Entregado'),
         ('rechazado', 'Rechazado')
     ])
+    # Enviada por el cliente (header Idempotency-Key): un reintento del mismo canje no lo repite
+    clave_idempotencia = models.CharField(max_length=64, null=True, blank=True)
     
     class Meta:
         verbose_name = 'Canje de Puntos'
         verbose_name_plural = 'Canjes de Puntos'
         ordering = ['-fecha_canje']
+        constraints = [
+            models.UniqueConstraint(fields=['cliente_fidelidad', 'clave_idempotencia'], name='canje_unico_por_clave'),
+        ]
+    
+    def __str__(self):
+        return f"Canje {self.cliente_fidelidad.cliente.username} - {self.premio.nombre}"
+
+class MovimientoPuntos(models.Model):
+    """
+    Libro de puntos: una fila por acumulación o canje, nunca se modifica.
+    puntos_acumulados = suma de 'acumulacion' + 'saldo_inicial' y
+    puntos_canjeados = suma de 'canje' (ver fidelizacion/services.py).
+    Las restricciones únicas hacen que un pedido o un canje no se
+    contabilicen dos veces.
+    """
+    TIPOS = [
+        ('acumulacion', 'Acumulación por pedido'),
+        ('canje', 'Canje de premio'),
+        ('saldo_inicial', 'Saldo inicial'),
+    ]
+    
+    cliente_fidelidad = models.ForeignKey(ClienteFidelidad, on_delete=models.CASCADE, related_name='movimientos')
+    tipo = models.CharField(max_length=20, choices=TIPOS)
+    puntos = models.PositiveIntegerField()
+    pedido = models.ForeignKey(Pedido, on_delete=models.SET_NULL, null=True, blank=True, related_name='movimientos_puntos')
+    canje = models.ForeignKey(CanjePuntos, on_delete=models.SET_NULL, null=True, blank=True, related_name='movimientos')
+    fecha = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = 'Movimiento de Puntos'
+        verbose_name_plural = 'Movimientos de Puntos'
+        ordering = ['-fecha']
+        constraints = [
+            models.UniqueConstraint(fields=['tipo', 'pedido'], name='movimiento_unico_por_pedido'),
+            models.UniqueConstraint(fields=['tipo', 'canje'], name='movimiento_unico_por_canje'),
+        ]
     
     def __str__(self):
-        return f"Canje {self.cliente_fidelidad.cliente.username} - {self.premio.nombre}"
\ No newline at end of file
+        signo = '-' if self.tipo == 'canje' else '+'
+        return f"{self.cliente_fidelidad.cliente.username} {signo}{self.puntos} ({self.get_tipo_display()})"
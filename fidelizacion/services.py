@@ -0,0 +1,290 @@
+# fidelizacion/services.py
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, Min, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .models import ClienteFidelidad, ProgramaFidelidad, Premio, CanjePuntos, MovimientoPuntos
+
+
+class PuntosInsuficientes(ValueError):
+    pass
+
+
+class PremioAgotado(ValueError):
+    pass
+
+
+class ServicioPuntos:
+    """
+    Acumulación y canje de puntos sobre el libro MovimientoPuntos.
+
+    Cada operación inserta su movimiento y ajusta los saldos de
+    ClienteFidelidad con F() en la misma transacción, sin leer-modificar-
+    escribir: dos operaciones simultáneas sobre el mismo cliente se
+    serializan en la fila y ninguna pisa a la otra.
+    """
+
+    TAMANO_LOTE = 1000
+
+    @staticmethod
+    def programa_por_defecto():
+        programa = ProgramaFidelidad.objects.order_by('pk').first()
+        if not programa:
+            programa = ProgramaFidelidad.objects.create(
+                nombre="Programa Pick Up Rural",
+                descripcion="Acumula puntos con tus compras y canjéalos por premios exclusivos",
+                puntos_por_peso=1,
+                puntos_minimos_canje=100
+            )
+        return programa
+
+    @classmethod
+    def cliente_de(cls, usuario):
+        """ClienteFidelidad del usuario (se crea en el programa por defecto si no existe)"""
+        try:
+            return ClienteFidelidad.objects.select_related('programa').get(cliente=usuario)
+        except ClienteFidelidad.DoesNotExist:
+            pass
+        programa = cls.programa_por_defecto()
+        try:
+            with transaction.atomic():
+                return ClienteFidelidad.objects.create(cliente=usuario, programa=programa)
+        except IntegrityError:
+            # Otra petición lo creó al mismo tiempo
+            return ClienteFidelidad.objects.select_related('programa').get(cliente=usuario)
+
+    @staticmethod
+    def puntos_por_pedido(pedido, programa):
+        # 1 punto por cada $100 gastado (por puntos_por_peso del programa)
+        return int(pedido.total / 100 * programa.puntos_por_peso)
+
+    @classmethod
+    def acumular_por_pedido(cls, pedido):
+        """
+        Abona los puntos del pedido una sola vez. Retorna el movimiento
+        creado, o None si el pedido no da puntos o ya se había abonado.
+        """
+        with transaction.atomic():
+            cliente_fidelidad = cls.cliente_de(pedido.cliente)
+            puntos = cls.puntos_por_pedido(pedido, cliente_fidelidad.programa)
+            if puntos <= 0:
+                return None
+            try:
+                with transaction.atomic():
+                    movimiento = MovimientoPuntos.objects.create(
+                        cliente_fidelidad=cliente_fidelidad, tipo='acumulacion', puntos=puntos, pedido=pedido
+                    )
+            except IntegrityError:
+                return None
+            cls._sumar(cliente_fidelidad.pk, acumulados=puntos)
+        return movimiento
+
+    @classmethod
+    def canjear(cls, cliente_fidelidad, premio, clave=None):
+        """
+        Canjea el premio en una transacción: descuenta una unidad de stock
+        (si no es ilimitado) y los puntos con UPDATE condicionales, crea el
+        CanjePuntos y su movimiento. Retorna (canje, creado).
+
+        Los chequeos van en el WHERE de cada UPDATE, así canjes simultáneos
+        no sobrevenden el premio ni gastan dos veces los mismos puntos.
+        Lanza PremioAgotado o PuntosInsuficientes (sin cambios en la BD).
+        Con `clave` (Idempotency-Key del cliente) un reintento retorna el
+        canje ya hecho con creado=False.
+        """
+        if clave:
+            anterior = CanjePuntos.objects.filter(cliente_fidelidad=cliente_fidelidad, clave_idempotencia=clave).first()
+            if anterior:
+                return anterior, False
+
+        puntos = premio.puntos_requeridos
+        try:
+            with transaction.atomic():
+                # Siempre premio y luego cliente: el mismo orden de bloqueo en todos los canjes
+                descontado = Premio.objects.filter(pk=premio.pk, activo=True, stock__gt=0).update(
+                    stock=F('stock') - 1
+                )
+                if not descontado and not Premio.objects.filter(pk=premio.pk, activo=True, stock=-1).exists():
+                    raise PremioAgotado()
+
+                descontado = ClienteFidelidad.objects.filter(
+                    pk=cliente_fidelidad.pk,
+                    puntos_acumulados__gte=F('puntos_canjeados') + puntos,
+                ).update(puntos_canjeados=F('puntos_canjeados') + puntos)
+                if not descontado:
+                    raise PuntosInsuficientes()
+
+                canje = CanjePuntos.objects.create(
+                    cliente_fidelidad=cliente_fidelidad,
+                    premio=premio,
+                    puntos_usados=puntos,
+                    estado='pendiente',
+                    clave_idempotencia=clave or None,
+                )
+                MovimientoPuntos.objects.create(
+                    cliente_fidelidad=cliente_fidelidad, tipo='canje', puntos=puntos, canje=canje
+                )
+        except IntegrityError:
+            if not clave:
+                raise
+            # Un reintento simultáneo con la misma clave ganó: se revirtió todo lo de este
+            return CanjePuntos.objects.get(cliente_fidelidad=cliente_fidelidad, clave_idempotencia=clave), False
+
+        cliente_fidelidad.refresh_from_db(fields=['puntos_acumulados', 'puntos_canjeados', 'nivel'])
+        premio.refresh_from_db(fields=['stock'])
+        if premio.stock != -1:
+            # El stock cambió con update() (sin señales): el catálogo en caché quedó viejo
+            programa_id = premio.programa_id
+            transaction.on_commit(lambda: CatalogoPremios.invalidar(programa_id))
+        return canje, True
+
+    @staticmethod
+    def _sumar(cliente_fidelidad_id, acumulados=0, canjeados=0):
+        clientes = ClienteFidelidad.objects.filter(pk=cliente_fidelidad_id)
+        clientes.update(
+            puntos_acumulados=F('puntos_acumulados') + acumulados,
+            puntos_canjeados=F('puntos_canjeados') + canjeados,
+        )
+        if acumulados:
+            # En otra sentencia: MySQL evalúa el SET en orden y el CASE debe
+            # ver el saldo nuevo (la fila ya quedó bloqueada por el UPDATE anterior)
+            clientes.update(nivel=ClienteFidelidad.expresion_nivel())
+
+    # ============================================================
+    # VERIFICACIÓN
+    # ============================================================
+
+    @staticmethod
+    def saldos_libro(cliente_ids):
+        """{cliente_fidelidad_id: (acumulados, canjeados)} según el libro, en una query"""
+        filas = MovimientoPuntos.objects.filter(cliente_fidelidad_id__in=cliente_ids).values(
+            'cliente_fidelidad_id'
+        ).annotate(
+            acumulados=Sum('puntos', filter=~Q(tipo='canje')),
+            canjeados=Sum('puntos', filter=Q(tipo='canje')),
+        ).order_by()
+        return {f['cliente_fidelidad_id']: (f['acumulados'] or 0, f['canjeados'] or 0) for f in filas}
+
+    @classmethod
+    def verificar(cls, reparar=False, tamano_lote=TAMANO_LOTE):
+        """
+        Recalcula los saldos desde el libro por lotes de clientes (dos queries
+        por lote) y retorna {cliente_fidelidad_id: ((acumulados, canjeados)
+        guardados, (acumulados, canjeados) según el libro)} de los que no
+        cuadran. Con `reparar` corrige esos clientes recalculando en el
+        mismo UPDATE (subconsulta sobre el libro), así no pisa movimientos
+        registrados mientras corre la verificación.
+        """
+        diferencias = {}
+        ultimo_id = 0
+        while True:
+            clientes = list(
+                ClienteFidelidad.objects.filter(pk__gt=ultimo_id).order_by('pk')
+                .only('pk', 'puntos_acumulados', 'puntos_canjeados', 'nivel')[:tamano_lote]
+            )
+            if not clientes:
+                return diferencias
+            ultimo_id = clientes[-1].pk
+
+            libro = cls.saldos_libro([c.pk for c in clientes])
+            descuadrados = []
+            for cliente in clientes:
+                guardado = (cliente.puntos_acumulados, cliente.puntos_canjeados)
+                esperado = libro.get(cliente.pk, (0, 0))
+                if guardado != esperado:
+                    diferencias[cliente.pk] = (guardado, esperado)
+                    descuadrados.append(cliente.pk)
+            if reparar and descuadrados:
+                cls.reparar(descuadrados)
+
+    @staticmethod
+    def reparar(cliente_ids):
+        """Reescribe saldos y nivel de los clientes desde el libro (set-based)"""
+        def suma(filtro):
+            return Coalesce(Subquery(
+                MovimientoPuntos.objects.filter(filtro, cliente_fidelidad=OuterRef('pk'))
+                .values('cliente_fidelidad').annotate(total=Sum('puntos')).values('total')
+            ), Value(0))
+
+        clientes = ClienteFidelidad.objects.filter(pk__in=cliente_ids)
+        with transaction.atomic():
+            clientes.update(
+                puntos_acumulados=suma(~Q(tipo='canje')),
+                puntos_canjeados=suma(Q(tipo='canje')),
+            )
+            clientes.update(nivel=ClienteFidelidad.expresion_nivel())
+
+
+
+class CatalogoPremios:
+    """Premios activos de cada programa, en caché hasta que se modifica un Premio (fidelizacion/signals.py)."""
+
+    DURACION_CACHE = 60 * 60 * 24
+
+    @staticmethod
+    def clave(programa_id):
+        return f'premios_programa:{programa_id}'
+
+    @classmethod
+    def de_programa(cls, programa_id):
+        """Lista de Premio activos del programa (por puntos requeridos), desde caché si está"""
+        premios = cache.get(cls.clave(programa_id))
+        if premios is None:
+            premios = list(Premio.objects.filter(programa_id=programa_id, activo=True))
+            cache.set(cls.clave(programa_id), premios, cls.DURACION_CACHE)
+        return premios
+
+    @classmethod
+    def disponibles_para(cls, cliente_fidelidad):
+        """Premios que el cliente puede canjear con sus puntos (filtrado en memoria)"""
+        puntos = cliente_fidelidad.puntos_disponibles
+        return [
+            premio for premio in cls.de_programa(cliente_fidelidad.programa_id)
+            if premio.puntos_requeridos <= puntos and premio.stock != 0
+        ]
+
+    @classmethod
+    def invalidar(cls, programa_id):
+        cache.delete(cls.clave(programa_id))
+
+
+class ServicioNiveles:
+    """
+    Recalcula el nivel de todos los clientes (p. ej. tras cambiar
+    ClienteFidelidad.NIVELES) con UPDATE ... SET nivel = CASE ... por rangos
+    de id, tocando solo las filas cuyo nivel cambia. Cada rango es una
+    sentencia corta en su propia transacción.
+    """
+
+    TAMANO_LOTE = 5000
+
+    @classmethod
+    def recalcular(cls, simular=False, tamano_lote=TAMANO_LOTE):
+        """
+        Retorna {(nivel anterior, nivel nuevo): cantidad} de los clientes que
+        cambian (con `simular` solo se cuentan, sin escribir).
+        """
+        rango = ClienteFidelidad.objects.aggregate(desde=Min('pk'), hasta=Max('pk'))
+        if rango['desde'] is None:
+            return {}
+
+        cambios = {}
+        nuevo_nivel = ClienteFidelidad.expresion_nivel()
+        for inicio in range(rango['desde'], rango['hasta'] + 1, tamano_lote):
+            desactualizados = ClienteFidelidad.objects.filter(
+                ClienteFidelidad.filtro_nivel_desactualizado(),
+                pk__gte=inicio, pk__lt=inicio + tamano_lote,
+            )
+            with transaction.atomic():
+                conteos = (
+                    desactualizados.annotate(nuevo=nuevo_nivel)
+                    .values_list('nivel', 'nuevo').annotate(total=Count('id')).order_by()
+                )
+                hay_cambios = False
+                for anterior, nuevo, total in conteos:
+                    cambios[(anterior, nuevo)] = cambios.get((anterior, nuevo), 0) + total
+                    hay_cambios = True
+                if hay_cambios and not simular:
+                    desactualizados.update(nivel=nuevo_nivel)
+        return cambios
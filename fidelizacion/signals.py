@@ -1,40 +1,46 @@
 # fidelizacion/signals.py
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 from pedidos.models import Pedido
-from .models import ClienteFidelidad, ProgramaFidelidad
+from pedidos.resumenes import CAMPOS_PEDIDO
+from tareas.cola import encolar
+from .models import Premio
+from .services import CatalogoPremios
+
+
+def _estado_guardado(pedido):
+    """Estado del pedido en la BD antes de este save (None si es nuevo)"""
+    if pedido._state.adding:
+        return None
+    valores = getattr(pedido, '_guardado', None)
+    if valores is not None:
+        # Leído en Pedido.from_db(): sin query
+        return valores[CAMPOS_PEDIDO.index('estado')]
+    return Pedido.objects.filter(pk=pedido.pk).values_list('estado', flat=True).first()
+
+
+@receiver(pre_save, sender=Pedido)
+def detectar_completado(sender, instance, update_fields=None, **kwargs):
+    """Marca el pedido si este save lo hace pasar a 'completado'"""
+    instance._recien_completado = (
+        instance.estado == 'completado'
+        and (update_fields is None or 'estado' in update_fields)
+        and _estado_guardado(instance) != 'completado'
+    )
+
 
 @receiver(post_save, sender=Pedido)
 def agregar_puntos_por_pedido(sender, instance, created, **kwargs):
-    """Agregar puntos cuando un pedido se completa"""
-    if instance.estado == 'completado':
-        try:
-            cliente_fidelidad = ClienteFidelidad.objects.get(cliente=instance.cliente)
-            programa = cliente_fidelidad.programa
-            
-            # 1 punto por cada $100 gastado
-            puntos_ganados = int(instance.total / 100 * float(programa.puntos_por_peso))
-            
-            if puntos_ganados > 0:
-                cliente_fidelidad.puntos_acumulados += puntos_ganados
-                cliente_fidelidad.actualizar_nivel()
-                cliente_fidelidad.save()
-                
-        except ClienteFidelidad.DoesNotExist:
-            # Crear automáticamente el registro de fidelidad si no existe
-            programa_default = ProgramaFidelidad.objects.first()
-            if not programa_default:
-                programa_default = ProgramaFidelidad.objects.create(
-                    nombre="Programa Pick Up Rural",
-                    descripcion="Acumula puntos con tus compras y canjéalos por premios exclusivos",
-                    puntos_por_peso=1.0,
-                    puntos_minimos_canje=100
-                )
-            
-            puntos_ganados = int(instance.total / 100 * float(programa_default.puntos_por_peso))
-            
-            ClienteFidelidad.objects.create(
-                cliente=instance.cliente,
-                programa=programa_default,
-                puntos_acumulados=puntos_ganados
-            )
\ No newline at end of file
+    """Encola la acumulación de puntos cuando el pedido pasa a completado"""
+    if getattr(instance, '_recien_completado', False):
+        instance._recien_completado = False
+        encolar('fidelizacion.acumular_puntos', pedido_ids=[instance.pk])
+
+
+@receiver(post_save, sender=Premio)
+@receiver(post_delete, sender=Premio)
+def invalidar_catalogo(sender, instance, **kwargs):
+    """Invalidar el catálogo en caché del programa (al confirmar la transacción)"""
+    programa_id = instance.programa_id
+    transaction.on_commit(lambda: CatalogoPremios.invalidar(programa_id))
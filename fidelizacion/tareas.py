@@ -0,0 +1,12 @@
+# fidelizacion/tareas.py
+from pedidos.models import Pedido
+from tareas.cola import tarea
+from .services import ServicioPuntos
+
+
+@tarea('fidelizacion.acumular_puntos')
+def acumular_puntos(pedido_ids):
+    """Abona los puntos de pedidos completados (idempotente: el libro no repite un pedido)"""
+    pedidos = Pedido.objects.filter(pk__in=pedido_ids, estado='completado').select_related('cliente')
+    for pedido in pedidos:
+        ServicioPuntos.acumular_por_pedido(pedido)
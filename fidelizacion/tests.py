@@ -0,0 +1,251 @@
+import threading
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+
+from fidelizacion.models import CanjePuntos, ClienteFidelidad, MovimientoPuntos, Premio, ProgramaFidelidad
+from fidelizacion.services import PremioAgotado, PuntosInsuficientes, ServicioNiveles, ServicioPuntos
+from pedidos.models import Pedido
+from tareas.models import Tarea
+from usuarios.models import Usuario, Negocio
+
+
+@override_settings(TAREAS_MODO='inmediato')
+class LibroPuntosTest(TestCase):
+    def setUp(self):
+        comerciante = Usuario.objects.create_user(username='comerciante', password='x', tipo_usuario='comerciante')
+        self.negocio = Negocio.objects.create(
+            propietario=comerciante,
+            nombre='Almacén Test',
+            direccion='Camino Rural Km 5',
+            telefono='+56912345678',
+            email='almacen@test.cl',
+            horario_apertura='08:00',
+            horario_cierre='20:00',
+            dias_atencion='Lunes a Sábado',
+        )
+        self.cliente = Usuario.objects.create_user(username='cliente', password='x')
+        self.programa = ProgramaFidelidad.objects.create(puntos_por_peso=Decimal('1.5'))
+
+    def completar(self, total):
+        pedido = Pedido.objects.create(
+            cliente=self.cliente, negocio=self.negocio, metodo_entrega='pickup',
+            telefono_contacto='+56987654321', total=Decimal(total),
+        )
+        pedido.estado = 'completado'
+        with self.captureOnCommitCallbacks(execute=True):
+            pedido.save()
+        return pedido
+
+    def test_puntos_por_pedido_se_abonan_una_vez(self):
+        pedido = self.completar('40000')
+        with self.captureOnCommitCallbacks(execute=True):
+            pedido.save()
+            Pedido.objects.get(pk=pedido.pk).save()
+
+        fidelidad = ClienteFidelidad.objects.get(cliente=self.cliente)
+        self.assertEqual(fidelidad.puntos_acumulados, 600)
+        self.assertEqual(fidelidad.nivel, 'plata')
+        self.assertEqual(MovimientoPuntos.objects.get().pedido, pedido)
+
+    def test_canje_descuenta_y_registra_movimiento(self):
+        self.completar('20000')
+        premio = Premio.objects.create(programa=self.programa, nombre='Café', descripcion='-', puntos_requeridos=200)
+        self.client.force_login(self.cliente)
+
+        respuesta = self.client.post(f'/fidelizacion/premios/canjear/{premio.pk}/')
+        self.assertEqual(respuesta.json()['puntos_restantes'], 100)
+        respuesta = self.client.post(f'/fidelizacion/premios/canjear/{premio.pk}/')
+        self.assertEqual(respuesta.status_code, 400)
+
+        fidelidad = ClienteFidelidad.objects.get(cliente=self.cliente)
+        self.assertEqual((fidelidad.puntos_acumulados, fidelidad.puntos_canjeados), (300, 200))
+        self.assertEqual(fidelidad.movimientos.get(tipo='canje').canje.premio, premio)
+
+    def test_reintento_con_la_misma_clave_no_repite_el_canje(self):
+        self.completar('100000')
+        premio = Premio.objects.create(
+            programa=self.programa, nombre='Café', descripcion='-', puntos_requeridos=200, stock=5
+        )
+        self.client.force_login(self.cliente)
+
+        respuestas = [
+            self.client.post(f'/fidelizacion/premios/canjear/{premio.pk}/', HTTP_IDEMPOTENCY_KEY=clave).json()
+            for clave in ('a1', 'a1', 'b2')
+        ]
+
+        self.assertEqual(respuestas[0]['canje_id'], respuestas[1]['canje_id'])
+        self.assertNotEqual(respuestas[0]['canje_id'], respuestas[2]['canje_id'])
+        self.assertEqual(CanjePuntos.objects.count(), 2)
+        premio.refresh_from_db()
+        self.assertEqual(premio.stock, 3)
+        self.assertEqual(ClienteFidelidad.objects.get(cliente=self.cliente).puntos_canjeados, 400)
+
+    def test_verificar_y_reparar(self):
+        self.completar('10000')
+        fidelidad = ClienteFidelidad.objects.get(cliente=self.cliente)
+        ClienteFidelidad.objects.filter(pk=fidelidad.pk).update(puntos_acumulados=999, nivel='plata')
+
+        self.assertEqual(ServicioPuntos.verificar(), {fidelidad.pk: ((999, 0), (150, 0))})
+        call_command('verificar_puntos', '--reparar', stdout=StringIO())
+
+        fidelidad.refresh_from_db()
+        self.assertEqual((fidelidad.puntos_acumulados, fidelidad.nivel), (150, 'bronce'))
+        self.assertEqual(ServicioPuntos.verificar(), {})
+
+    def test_solo_la_transicion_a_completado_encola(self):
+        pedido = Pedido.objects.create(
+            cliente=self.cliente, negocio=self.negocio, metodo_entrega='pickup',
+            telefono_contacto='+56987654321', total=Decimal('10000'),
+        )
+        with self.captureOnCommitCallbacks() as callbacks:
+            pedido.calcular_total()
+            pedido.estado = 'listo'
+            pedido.save()
+            self.assertFalse(Tarea.objects.exists())
+
+            pedido = Pedido.objects.get(pk=pedido.pk)
+            pedido.estado = 'completado'
+            pedido.save()
+            pedido.save()
+            self.assertEqual(Tarea.objects.get().datos, {'pedido_ids': [pedido.pk]})
+        self.assertFalse(ClienteFidelidad.objects.exists())
+
+        for callback in callbacks:
+            callback()
+        self.assertFalse(Tarea.objects.exists())
+        self.assertTrue(ClienteFidelidad.objects.filter(cliente=self.cliente).exists())
+
+
+class DashboardFidelidadTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.programa = ProgramaFidelidad.objects.create()
+        self.cliente = Usuario.objects.create_user(username='cliente', password='x')
+        self.fidelidad = ClienteFidelidad.objects.create(
+            cliente=self.cliente, programa=self.programa, puntos_acumulados=1000
+        )
+        for nombre, puntos in [('Café', 100), ('Queso', 400), ('Canasta', 2000)]:
+            Premio.objects.create(programa=self.programa, nombre=nombre, descripcion='-', puntos_requeridos=puntos)
+        self.client.force_login(self.cliente)
+
+    def consultar(self):
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get('/fidelizacion/dashboard/')
+        propias = [q for q in consultas.captured_queries if 'fidelizacion_' in q['sql']]
+        return [p.nombre for p in respuesta.context['premios_disponibles']], len(propias)
+
+    def test_dos_queries_y_catalogo_en_cache(self):
+        self.consultar()
+        self.assertEqual(self.consultar(), (['Café', 'Queso'], 2))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Premio.objects.create(programa=self.programa, nombre='Pan', descripcion='-', puntos_requeridos=50)
+        self.assertEqual(self.consultar(), (['Pan', 'Café', 'Queso'], 3))
+
+        queso = Premio.objects.get(nombre='Queso')
+        queso.stock = 1
+        queso.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            ServicioPuntos.canjear(self.fidelidad, queso)
+        # Sin stock: sale del catálogo aunque los puntos alcancen
+        self.assertEqual(self.consultar(), (['Pan', 'Café'], 3))
+
+
+class RecalcularNivelesTest(TestCase):
+    def test_recalcula_solo_los_desactualizados(self):
+        programa = ProgramaFidelidad.objects.create()
+        puntos_y_niveles = [(0, 'oro'), (600, 'bronce'), (2500, 'oro'), (9000, 'plata'), (100, 'bronce')]
+        clientes = [
+            ClienteFidelidad.objects.create(
+                cliente=Usuario.objects.create(username=f'cliente{i}'), programa=programa,
+                puntos_acumulados=puntos, nivel=nivel,
+            )
+            for i, (puntos, nivel) in enumerate(puntos_y_niveles)
+        ]
+
+        salida = StringIO()
+        call_command('recalcular_niveles', '--dry-run', stdout=salida)
+        self.assertIn('3 clientes cambiarían', salida.getvalue())
+        self.assertEqual(ClienteFidelidad.objects.filter(nivel='oro').count(), 2)
+
+        cambios = ServicioNiveles.recalcular(tamano_lote=2)
+
+        self.assertEqual(cambios, {('oro', 'bronce'): 1, ('bronce', 'plata'): 1, ('plata', 'diamante'): 1})
+        self.assertEqual(
+            [c.nivel for c in ClienteFidelidad.objects.filter(pk__in=[c.pk for c in clientes]).order_by('pk')],
+            [ClienteFidelidad.nivel_para(puntos) for puntos, _ in puntos_y_niveles],
+        )
+
+
+@skipUnlessDBFeature('test_db_allows_multiple_connections')
+class CanjeConcurrenteTest(TransactionTestCase):
+    """Canjes en paralelo: 40 clientes por un premio con 10 unidades, y 10 canjes de un cliente con saldo para 3."""
+
+    def setUp(self):
+        self.programa = ProgramaFidelidad.objects.create()
+
+    def crear_cliente(self, nombre, puntos):
+        return ClienteFidelidad.objects.create(
+            cliente=Usuario.objects.create(username=nombre), programa=self.programa, puntos_acumulados=puntos
+        )
+
+    def en_paralelo(self, premio, clientes):
+        barrera = threading.Barrier(len(clientes))
+        exitos, rechazos, errores = [], [], []
+
+        def canjear(cliente_fidelidad):
+            try:
+                barrera.wait()
+                exitos.append(ServicioPuntos.canjear(cliente_fidelidad, premio)[0])
+            except ValueError as e:
+                rechazos.append(e)
+            except Exception as e:
+                errores.append(e)
+            finally:
+                connection.close()
+
+        # Una instancia por hilo (cada uno con su propia conexión)
+        hilos = [
+            threading.Thread(target=canjear, args=(ClienteFidelidad.objects.get(pk=c.pk),))
+            for c in clientes
+        ]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        self.assertEqual(errores, [])
+        return exitos, rechazos
+
+    def test_no_sobrevende_el_stock(self):
+        premio = Premio.objects.create(
+            programa=self.programa, nombre='Queso', descripcion='-', puntos_requeridos=100, stock=10
+        )
+        clientes = [self.crear_cliente(f'cliente{i}', 1000) for i in range(40)]
+
+        exitos, rechazos = self.en_paralelo(premio, clientes)
+
+        self.assertEqual(len(exitos), 10)
+        self.assertTrue(all(isinstance(e, PremioAgotado) for e in rechazos))
+        premio.refresh_from_db()
+        self.assertEqual(premio.stock, 0)
+        self.assertEqual(CanjePuntos.objects.filter(premio=premio).count(), 10)
+
+    def test_no_gasta_dos_veces_los_puntos(self):
+        premio = Premio.objects.create(
+            programa=self.programa, nombre='Café', descripcion='-', puntos_requeridos=100
+        )
+        cliente = self.crear_cliente('cliente', 300)
+
+        exitos, rechazos = self.en_paralelo(premio, [cliente] * 10)
+
+        self.assertEqual((len(exitos), len(rechazos)), (3, 7))
+        self.assertTrue(all(isinstance(e, PuntosInsuficientes) for e in rechazos))
+        cliente.refresh_from_db()
+        self.assertEqual((cliente.puntos_canjeados, cliente.puntos_disponibles), (300, 0))
+        self.assertEqual(cliente.movimientos.filter(tipo='canje').count(), 3)
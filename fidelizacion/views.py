@@ -3,41 +3,21 @@ from django.shortcuts import render, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse
 from django.views.decorators.http import require_http_methods
-from .models import ClienteFidelidad, Premio, CanjePuntos, ProgramaFidelidad
-from pedidos.models import Pedido
+from .models import ClienteFidelidad, Premio, CanjePuntos
+from .services import ServicioPuntos, CatalogoPremios, PuntosInsuficientes, PremioAgotado
 
 @login_required
 def dashboard_fidelidad(request):
     """Dashboard del cliente con su estado de fidelidad"""
-    try:
-        cliente_fidelidad = ClienteFidelidad.objects.get(cliente=request.user)
-    except ClienteFidelidad.DoesNotExist:
-        # Si no existe, crear automáticamente
-        programa_default = ProgramaFidelidad.objects.first()
-        if not programa_default:
-            # Crear programa por defecto si no existe
-            programa_default = ProgramaFidelidad.objects.create(
-                nombre="Programa Pick Up Rural",
-                descripcion="Acumula puntos con tus compras y canjéalos por premios exclusivos",
-                puntos_por_peso=1.0,
-                puntos_minimos_canje=100
-            )
-        
-        cliente_fidelidad = ClienteFidelidad.objects.create(
-            cliente=request.user,
-            programa=programa_default,
-            puntos_acumulados=0
-        )
+    # Estado de fidelidad y su programa en una query (si no existe, se crea automáticamente)
+    cliente_fidelidad = ServicioPuntos.cliente_de(request.user)
     
-    premios_disponibles = Premio.objects.filter(
-        programa=cliente_fidelidad.programa,
-        activo=True,
-        puntos_requeridos__lte=cliente_fidelidad.puntos_disponibles
-    )
+    # Catálogo del programa desde caché, filtrado por los puntos del cliente
+    premios_disponibles = CatalogoPremios.disponibles_para(cliente_fidelidad)
     
-    canjes_recientes = CanjePuntos.objects.filter(
+    canjes_recientes = list(CanjePuntos.objects.filter(
         cliente_fidelidad=cliente_fidelidad
-    ).select_related('premio').order_by('-fecha_canje')[:5]
+    ).select_related('premio').order_by('-fecha_canje')[:5])
     
     context = {
         'cliente_fidelidad': cliente_fidelidad,
@@ -53,33 +33,21 @@ def canjear_puntos(request, premio_id):
     """Canjear puntos por un premio"""
     premio = get_object_or_404(Premio, id=premio_id, activo=True)
     cliente_fidelidad = get_object_or_404(ClienteFidelidad, cliente=request.user)
+    # Clave del cliente para reintentos (p. ej. tras un corte de conexión)
+    clave = request.headers.get('Idempotency-Key') or request.POST.get('clave_idempotencia')
+    if clave and len(clave) > 64:
+        return JsonResponse({'error': 'Idempotency-Key inválida'}, status=400)
     
-    # Validaciones
-    if cliente_fidelidad.puntos_disponibles < premio.puntos_requeridos:
+    try:
+        canje, _ = ServicioPuntos.canjear(cliente_fidelidad, premio, clave=clave)
+    except PuntosInsuficientes:
         return JsonResponse({'error': 'Puntos insuficientes'}, status=400)
-    
-    if premio.stock == 0:
+    except PremioAgotado:
         return JsonResponse({'error': 'Premio agotado'}, status=400)
     
-    # Crear canje
-    canje = CanjePuntos.objects.create(
-        cliente_fidelidad=cliente_fidelidad,
-        premio=premio,
-        puntos_usados=premio.puntos_requeridos,
-        estado='pendiente'
-    )
-    
-    # Actualizar stock si no es ilimitado
-    if premio.stock > 0:
-        premio.stock -= 1
-        premio.save()
-    
-    # Actualizar puntos del cliente
-    cliente_fidelidad.puntos_canjeados += premio.puntos_requeridos
-    cliente_fidelidad.save()
-    
     return JsonResponse({
         'success': True,
-        'mensaje': f'¡Canje exitoso! Has canjeado {premio.puntos_requeridos} puntos por {premio.nombre}',
+        'canje_id': canje.id,
+        'mensaje': f'¡Canje exitoso! Has canjeado {canje.puntos_usados} puntos por {premio.nombre}',
         'puntos_restantes': cliente_fidelidad.puntos_disponibles
-    })
\ No newline at end of file
+    })
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class NotificacionesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'notificaciones'
+
+    def ready(self):
+        import notificaciones.signals
@@ -0,0 +1,102 @@
+# notificaciones/contador.py
+"""
+Contador de notificaciones no leídas por usuario, mantenido en caché.
+
+Se suma al crear notificaciones (notificaciones/signals.py) y se resta al
+marcarlas como leídas o eliminarlas, siempre con cache.incr() y después del
+commit, así la campana lee el número sin consultar Notificacion. Si la clave
+no existe (caché vacía) se cuenta una vez en la BD;
+`manage.py reconciliar_notificaciones` corrige desvíos de escrituras que no
+pasan por estos caminos (QuerySet.update(), borrados en cascada).
+"""
+from collections import Counter
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+
+from .models import Notificacion
+
+PREFIJO = 'notificaciones:no_leidas:'
+TAMANO_LOTE = 1000
+
+
+def clave(usuario_id):
+    return f'{PREFIJO}{usuario_id}'
+
+
+def contar(usuario_id):
+    return Notificacion.objects.filter(usuario_id=usuario_id, leida=False).count()
+
+
+def obtener(usuario_id):
+    """No leídas del usuario desde caché; si falta la clave, cuenta y la guarda."""
+    valor = cache.get(clave(usuario_id))
+    if valor is None:
+        valor = contar(usuario_id)
+        cache.add(clave(usuario_id), valor, timeout=None)
+    return valor
+
+
+def ajustar(deltas):
+    """Aplica {usuario_id: delta}; si una clave no existe queda para el próximo conteo."""
+    for usuario_id, delta in deltas.items():
+        if not delta:
+            continue
+        try:
+            valor = cache.incr(clave(usuario_id), delta)
+        except ValueError:
+            continue
+        if valor < 0:
+            # Desvío (p. ej. una lectura ya descontada): forzar recuento
+            cache.delete(clave(usuario_id))
+
+
+def ajustar_al_confirmar(deltas):
+    deltas = {usuario_id: delta for usuario_id, delta in deltas.items() if delta}
+    if deltas:
+        transaction.on_commit(lambda: ajustar(deltas))
+
+
+def sumar_nuevas(notificaciones):
+    """Suma al contador de cada destinatario las notificaciones nuevas no leídas"""
+    ajustar_al_confirmar(Counter(n.usuario_id for n in notificaciones if not n.leida))
+
+
+def reconciliar(usuario_ids=None, tamano_lote=TAMANO_LOTE):
+    """
+    Recuenta en la BD (un GROUP BY por lote de usuarios) y reescribe los
+    contadores. Sin `usuario_ids` recorre todos los usuarios. Retorna
+    {usuario_id: (valor anterior en caché o None, valor nuevo)} de los que cambiaron.
+    """
+    from usuarios.models import Usuario
+
+    if usuario_ids is None:
+        usuario_ids = Usuario.objects.order_by('pk').values_list('pk', flat=True).iterator(chunk_size=tamano_lote)
+
+    cambios = {}
+    lote = []
+    for usuario_id in usuario_ids:
+        lote.append(usuario_id)
+        if len(lote) >= tamano_lote:
+            cambios.update(_reconciliar_lote(lote))
+            lote = []
+    if lote:
+        cambios.update(_reconciliar_lote(lote))
+    return cambios
+
+
+def _reconciliar_lote(usuario_ids):
+    conteos = dict(
+        Notificacion.objects.filter(usuario_id__in=usuario_ids, leida=False)
+        .values_list('usuario_id').annotate(total=Count('id')).order_by()
+    )
+    claves = {clave(usuario_id): usuario_id for usuario_id in usuario_ids}
+    anteriores = cache.get_many(list(claves))
+    nuevos = {clave(usuario_id): conteos.get(usuario_id, 0) for usuario_id in usuario_ids}
+    cache.set_many(nuevos, timeout=None)
+    return {
+        claves[k]: (anteriores.get(k), valor)
+        for k, valor in nuevos.items()
+        if anteriores.get(k) != valor
+    }
@@ -0,0 +1,35 @@
+# notificaciones/management/commands/purgar_notificaciones.py
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from notificaciones import retencion
+
+
+class Command(BaseCommand):
+    help = 'Borra (y opcionalmente archiva) las notificaciones leídas más antiguas que su plazo de retención (ejecutar periódicamente)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=retencion.TAMANO_LOTE, help='Notificaciones por transacción')
+        parser.add_argument('--pausa', type=float, default=0, help='Segundos de espera entre lotes')
+        parser.add_argument('--archivo-dir', help='Directorio para el archivo .jsonl.gz (por defecto NOTIFICACIONES_ARCHIVO_DIRECTORIO)')
+        parser.add_argument('--dry-run', action='store_true', help='Solo contar, sin borrar ni archivar')
+
+    def handle(self, *args, **options):
+        directorio = options['archivo_dir'] or getattr(settings, 'NOTIFICACIONES_ARCHIVO_DIRECTORIO', None)
+        archivo = retencion.ruta_archivo(directorio) if directorio else None
+
+        por_tipo = retencion.purgar(
+            tamano_lote=options['lote'],
+            archivo=archivo,
+            simular=options['dry_run'],
+            pausa=options['pausa'],
+        )
+
+        for tipo, cantidad in sorted(por_tipo.items()):
+            self.stdout.write(f'  {tipo}: {cantidad}')
+        total = sum(por_tipo.values())
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(f'🔍 Simulación: se borrarían {total} notificaciones'))
+            return
+        if archivo and total:
+            self.stdout.write(f'📦 Archivadas en {archivo}')
+        self.stdout.write(self.style.SUCCESS(f'✅ {total} notificaciones purgadas'))
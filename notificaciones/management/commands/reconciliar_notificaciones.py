@@ -0,0 +1,21 @@
+# notificaciones/management/commands/reconciliar_notificaciones.py
+from django.core.management.base import BaseCommand
+from notificaciones import contador
+
+
+class Command(BaseCommand):
+    help = 'Recuenta las notificaciones no leídas de cada usuario y corrige los contadores en caché (ejecutar periódicamente)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuario', type=int, action='append', help='ID de usuario (repetible; por defecto todos)')
+        parser.add_argument('--lote', type=int, default=contador.TAMANO_LOTE, help='Usuarios por consulta')
+
+    def handle(self, *args, **options):
+        cambios = contador.reconciliar(options['usuario'], tamano_lote=options['lote'])
+
+        corregidos = 0
+        for usuario_id, (anterior, valor) in sorted(cambios.items()):
+            if anterior is not None:
+                corregidos += 1
+                self.stdout.write(f'⚠️  usuario {usuario_id}: {anterior} → {valor}')
+        self.stdout.write(self.style.SUCCESS(f'✅ Contadores reconciliados ({corregidos} corregidos)'))
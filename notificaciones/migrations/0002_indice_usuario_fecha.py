@@ -0,0 +1,20 @@
+# Generated by Django 5.2.7 on 2026-10-18 10:46
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notificaciones', '0001_initial'),
+        ('pedidos', '0002_resumenes_diarios'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notificacion',
+            index=models.Index(fields=['usuario', '-fecha_creacion'], name='notif_usuario_fecha_idx'),
+        ),
+    ]
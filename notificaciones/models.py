@@ -31,17 +31,28 @@ class Notificacion(models.Model):
         ordering = ['-fecha_creacion']
         indexes = [
             models.Index(fields=['usuario', 'leida']),
+            # Listados por usuario ordenados por fecha (lista y no leídas)
+            models.Index(fields=['usuario', '-fecha_creacion'], name='notif_usuario_fecha_idx'),
         ]
     
     def __str__(self):
         return f"{self.usuario.username} - {self.titulo}"
     
     def marcar_como_leida(self):
-        if not self.leida:
-            from django.utils import timezone
-            self.leida = True
-            self.fecha_lectura = timezone.now()
-            self.save()
+        """Marca la notificación como leída; retorna True si no lo estaba."""
+        if self.leida:
+            return False
+        from django.utils import timezone
+        from . import contador
+        self.leida = True
+        self.fecha_lectura = timezone.now()
+        # UPDATE condicional: si dos pestañas la marcan a la vez, descuenta una sola
+        marcada = Notificacion.objects.filter(pk=self.pk, leida=False).update(
+            leida=True, fecha_lectura=self.fecha_lectura
+        )
+        if marcada:
+            contador.ajustar_al_confirmar({self.usuario_id: -1})
+        return bool(marcada)
 
 class ConfiguracionNotificacion(models.Model):
     usuario = models.OneToOneField(Usuario, on_delete=models.CASCADE, related_name='config_notificaciones')
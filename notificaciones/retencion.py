@@ -0,0 +1,103 @@
+# notificaciones/retencion.py
+"""
+Retención de notificaciones leídas.
+
+Las notificaciones leídas más antiguas que el plazo de su tipo
+(settings.NOTIFICACIONES_RETENCION_DIAS) se borran en lotes pequeños, cada
+uno en su propia transacción corta: se recorre la tabla por id (keyset,
+sin OFFSET) y se borra por lista de ids, así ningún DELETE bloquea la tabla
+ni crece con su tamaño. Opcionalmente cada lote se escribe antes en un
+archivo .jsonl.gz (una notificación por línea).
+
+Las no leídas nunca se purgan, así el contador en caché
+(notificaciones/contador.py) no cambia.
+"""
+import gzip
+import json
+import time
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Notificacion
+
+TAMANO_LOTE = 1000
+
+CAMPOS_ARCHIVO = (
+    'id', 'usuario_id', 'pedido_id', 'tipo', 'titulo', 'mensaje',
+    'leida', 'fecha_creacion', 'fecha_lectura',
+)
+
+
+def plazos():
+    """{tipo: días de retención} para todos los tipos (con el valor 'default')"""
+    configurados = getattr(settings, 'NOTIFICACIONES_RETENCION_DIAS', {})
+    por_defecto = configurados.get('default', 90)
+    return {tipo: configurados.get(tipo, por_defecto) for tipo, _ in Notificacion.TIPO_NOTIFICACION}
+
+
+def filtro_vencidas(ahora=None, dias=None):
+    """Q de las notificaciones leídas cuyo plazo ya venció"""
+    ahora = ahora or timezone.now()
+    dias = dias or plazos()
+    # Un OR por plazo distinto (no por tipo), agrupando los tipos que lo comparten
+    por_plazo = {}
+    for tipo, plazo in dias.items():
+        por_plazo.setdefault(plazo, []).append(tipo)
+    vencidas = Q()
+    for plazo, tipos in por_plazo.items():
+        vencidas |= Q(tipo__in=tipos, fecha_creacion__lt=ahora - timedelta(days=plazo))
+    return Q(leida=True) & vencidas
+
+
+def ruta_archivo(directorio, ahora=None):
+    ahora = ahora or timezone.now()
+    return Path(directorio) / f'notificaciones-{ahora:%Y%m%d-%H%M%S}.jsonl.gz'
+
+
+def _linea(fila):
+    return json.dumps({
+        campo: valor.isoformat() if hasattr(valor, 'isoformat') else valor
+        for campo, valor in fila.items()
+    }, ensure_ascii=False) + '\n'
+
+
+def purgar(tamano_lote=TAMANO_LOTE, archivo=None, simular=False, pausa=0, ahora=None):
+    """
+    Borra (y archiva en `archivo`, una ruta .jsonl.gz, si se indica) las
+    notificaciones leídas vencidas. Con `simular` solo cuenta. `pausa` son
+    segundos de espera entre lotes para no saturar la BD. Retorna
+    {tipo: cantidad} de lo borrado (o lo que se borraría).
+    """
+    vencidas = Notificacion.objects.filter(filtro_vencidas(ahora)).order_by('id')
+    por_tipo = {}
+    salida = None
+    try:
+        ultimo_id = 0
+        while True:
+            with transaction.atomic():
+                filas = list(vencidas.filter(id__gt=ultimo_id).values(*CAMPOS_ARCHIVO)[:tamano_lote])
+                if not filas:
+                    break
+                ultimo_id = filas[-1]['id']
+                if not simular:
+                    if archivo:
+                        if salida is None:
+                            # Se abre con el primer lote: sin nada que purgar no deja archivos vacíos
+                            Path(archivo).parent.mkdir(parents=True, exist_ok=True)
+                            salida = gzip.open(archivo, 'at', encoding='utf-8')
+                        salida.writelines(_linea(fila) for fila in filas)
+                        salida.flush()
+                    Notificacion.objects.filter(id__in=[fila['id'] for fila in filas]).delete()
+            for fila in filas:
+                por_tipo[fila['tipo']] = por_tipo.get(fila['tipo'], 0) + 1
+            if pausa:
+                time.sleep(pausa)
+    finally:
+        if salida:
+            salida.close()
+    return por_tipo
@@ -0,0 +1,90 @@
+# notificaciones/services.py
+from django.db import connection
+from tareas.cola import encolar
+from . import contador
+from .models import Notificacion, ConfiguracionNotificacion
+
+
+def configuraciones(usuario_ids):
+    """{usuario_id: ConfiguracionNotificacion} en una query (sin fila = todo activado)"""
+    return {c.usuario_id: c for c in ConfiguracionNotificacion.objects.filter(usuario_id__in=set(usuario_ids))}
+
+
+def acepta(config, campo):
+    """Si el usuario tiene activado `campo` (por defecto sí)"""
+    return config is None or campo is None or getattr(config, campo)
+
+
+class NotificacionesPedido:
+    """Notificaciones al cliente cuando su pedido cambia de estado"""
+
+    # estado → (tipo de notificación, campo de ConfiguracionNotificacion; None = siempre)
+    POR_ESTADO = {
+        'confirmado': ('pedido_confirmado', 'notif_pedido_confirmado'),
+        'preparando': ('pedido_preparando', None),
+        'listo': ('pedido_listo', 'notif_pedido_listo'),
+        'en_camino': ('pedido_en_camino', 'notif_pedido_en_camino'),
+        'completado': ('pedido_completado', 'notif_pedido_completado'),
+        'cancelado': ('pedido_cancelado', None),
+    }
+
+    MENSAJES = {
+        'confirmado': 'El comercio confirmó tu pedido {numero}.',
+        'preparando': 'Tu pedido {numero} se está preparando.',
+        'listo': 'Tu pedido {numero} está listo para retirar o entregar.',
+        'en_camino': 'Tu pedido {numero} va en camino.',
+        'completado': 'Tu pedido {numero} fue completado. ¡Gracias por tu compra!',
+        'cancelado': 'Tu pedido {numero} fue cancelado.',
+    }
+
+    TAMANO_LOTE = 500
+
+    @classmethod
+    def notificar_cambios_estado(cls, pedidos):
+        """
+        Crea con un bulk_create las notificaciones de los pedidos (ya con su
+        estado nuevo) según la configuración de cada cliente, y deja el
+        envío por email/push a la cola de tareas. Costo fijo por llamada:
+        una query de configuraciones, los INSERT por lote (por fila en MySQL)
+        y la tarea.
+        """
+        pedidos = [p for p in pedidos if p.estado in cls.POR_ESTADO]
+        if not pedidos:
+            return []
+
+        titulos = dict(Notificacion.TIPO_NOTIFICACION)
+        configs = configuraciones(p.cliente_id for p in pedidos)
+
+        nuevas = []
+        for pedido in pedidos:
+            tipo, campo = cls.POR_ESTADO[pedido.estado]
+            if not acepta(configs.get(pedido.cliente_id), campo):
+                continue
+            nuevas.append(Notificacion(
+                usuario_id=pedido.cliente_id,
+                pedido=pedido,
+                tipo=tipo,
+                titulo=titulos[tipo],
+                mensaje=cls.MENSAJES[pedido.estado].format(numero=pedido.numero_pedido),
+            ))
+        if not nuevas:
+            return []
+
+        if connection.features.can_return_rows_from_bulk_insert:
+            creadas = Notificacion.objects.bulk_create(nuevas, batch_size=cls.TAMANO_LOTE)
+        else:
+            # MySQL no retorna los ids de un bulk_create: un INSERT por fila
+            # para tener los ids exactos (el push queda para la tarea)
+            for notificacion in nuevas:
+                notificacion._entrega_en_cola = True
+                notificacion.save(force_insert=True)
+            creadas = nuevas
+        ids = [n.pk for n in creadas]
+
+        contador.sumar_nuevas(creadas)
+        encolar('notificaciones.entregar', ids=ids)
+        return creadas
+
+    @classmethod
+    def notificar_cambio_estado(cls, pedido):
+        return cls.notificar_cambios_estado([pedido])
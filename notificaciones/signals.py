@@ -0,0 +1,49 @@
+# notificaciones/signals.py
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from pickup_rural import pubsub
+from . import contador
+from .models import Notificacion
+
+
+def canal_usuario(usuario_id):
+    return f'notificaciones:{usuario_id}'
+
+
+def datos_notificacion(notificacion):
+    pedido = notificacion.pedido if notificacion.pedido_id else None
+    return {
+        'id': notificacion.id,
+        'tipo': notificacion.tipo,
+        'titulo': notificacion.titulo,
+        'mensaje': notificacion.mensaje,
+        'leida': notificacion.leida,
+        'fecha_creacion': notificacion.fecha_creacion.strftime('%Y-%m-%d %H:%M:%S'),
+        'pedido_id': notificacion.pedido_id,
+        'pedido_numero': pedido.numero_pedido if pedido else None,
+    }
+
+
+def notificaciones_creadas(notificaciones):
+    """
+    Al confirmarse la transacción suma las notificaciones al contador de no
+    leídas y las empuja a las conexiones abiertas de cada destinatario.
+    Llamarla también en altas que no disparan post_save (bulk_create).
+    """
+    contador.sumar_nuevas(notificaciones)
+    eventos = [(canal_usuario(n.usuario_id), datos_notificacion(n)) for n in notificaciones]
+
+    def publicar():
+        for canal, datos in eventos:
+            pubsub.publicar(canal, datos)
+
+    transaction.on_commit(publicar)
+
+
+@receiver(post_save, sender=Notificacion)
+def publicar_notificacion(sender, instance, created, **kwargs):
+    """Empujar la notificación nueva a las pestañas abiertas de su usuario"""
+    # Las de notificar_cambios_estado se cuentan y entregan en bloque
+    if created and not getattr(instance, '_entrega_en_cola', False):
+        notificaciones_creadas([instance])
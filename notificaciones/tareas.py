@@ -0,0 +1,26 @@
+# notificaciones/tareas.py
+from django.core.mail import EmailMessage, get_connection
+from pickup_rural import pubsub
+from tareas.cola import tarea
+from .models import Notificacion
+from .services import acepta, configuraciones
+from .signals import canal_usuario, datos_notificacion
+
+
+@tarea('notificaciones.entregar')
+def entregar(ids):
+    """Envía por push y email las notificaciones creadas en bloque (según la configuración de cada usuario)"""
+    notificaciones = list(Notificacion.objects.filter(id__in=ids).select_related('usuario', 'pedido'))
+    configs = configuraciones(n.usuario_id for n in notificaciones)
+
+    correos = []
+    for notificacion in notificaciones:
+        config = configs.get(notificacion.usuario_id)
+        if acepta(config, 'notif_push'):
+            pubsub.publicar(canal_usuario(notificacion.usuario_id), datos_notificacion(notificacion))
+        if acepta(config, 'notif_email') and notificacion.usuario.email:
+            correos.append(EmailMessage(notificacion.titulo, notificacion.mensaje, to=[notificacion.usuario.email]))
+
+    if correos:
+        # Una sola conexión SMTP para todo el lote
+        get_connection().send_messages(correos)
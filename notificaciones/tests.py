@@ -1,3 +1,246 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import json
+import tempfile
+from contextlib import AsyncExitStack
+from datetime import timedelta
+from io import StringIO
+from pathlib import Path
 
-# Create your tests here.
+from decimal import Decimal
+from unittest import mock
+
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import QuerySet
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from notificaciones import contador
+from notificaciones.models import Notificacion, ConfiguracionNotificacion
+from notificaciones.services import NotificacionesPedido
+from notificaciones.signals import canal_usuario
+from pedidos.models import Pedido
+from pickup_rural import pubsub
+from tareas.models import Tarea
+from usuarios.models import Usuario, Negocio
+
+
+class PushNotificacionesTest(TestCase):
+    def setUp(self):
+        self.usuario = Usuario.objects.create(username='cliente')
+        self.loop = asyncio.new_event_loop()
+        self.conexiones = AsyncExitStack()
+
+    def tearDown(self):
+        self.loop.run_until_complete(self.conexiones.aclose())
+        self.loop.close()
+
+    def conectar(self, maximo=None):
+        return self.loop.run_until_complete(
+            self.conexiones.enter_async_context(pubsub.suscribir(canal_usuario(self.usuario.pk), maximo))
+        )
+
+    def recibir(self, suscripcion):
+        return self.loop.run_until_complete(suscripcion.recibir(1))
+
+    def test_entrega_al_confirmar(self):
+        suscripcion = self.conectar()
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            notificacion = Notificacion.objects.create(
+                usuario=self.usuario, tipo='sistema', titulo='Hola', mensaje='Bienvenido'
+            )
+        self.assertTrue(suscripcion.cola.empty())
+
+        for callback in callbacks:
+            callback()
+        datos = self.recibir(suscripcion)
+        self.assertEqual((datos['id'], datos['titulo']), (notificacion.pk, 'Hola'))
+
+    def test_limite_de_conexiones_por_usuario(self):
+        primera = self.conectar(maximo=2)
+        segunda = self.conectar(maximo=2)
+        tercera = self.conectar(maximo=2)
+
+        self.assertIsNone(self.recibir(primera))
+        pubsub.publicar(canal_usuario(self.usuario.pk), {'id': 1})
+        self.assertEqual(self.recibir(segunda), {'id': 1})
+        self.assertEqual(self.recibir(tercera), {'id': 1})
+
+    def test_stream_rechazado_bajo_wsgi(self):
+        self.client.force_login(self.usuario)
+
+        respuesta = self.client.get('/api/notificaciones/stream/')
+
+        self.assertEqual(respuesta.status_code, 503)
+        self.assertFalse(respuesta.streaming)
+        self.assertEqual(pubsub.broker().suscriptores(canal_usuario(self.usuario.pk)), 0)
+
+
+class ContadorNoLeidasTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.usuario = Usuario.objects.create_user(username='cliente', password='x')
+        self.client.force_login(self.usuario)
+
+    def crear(self, cantidad):
+        with self.captureOnCommitCallbacks(execute=True):
+            return [
+                Notificacion.objects.create(usuario=self.usuario, tipo='sistema', titulo=f'N{i}', mensaje='m')
+                for i in range(cantidad)
+            ]
+
+    def no_leidas(self):
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get('/api/notificaciones/contador/')
+        self.assertFalse([q for q in consultas.captured_queries if 'notificaciones_notificacion' in q['sql']])
+        return respuesta.json()['no_leidas']
+
+    def test_contador_se_mantiene(self):
+        self.assertEqual(contador.obtener(self.usuario.pk), 0)
+        primera, segunda, tercera, _ = self.crear(4)
+        self.assertEqual(self.no_leidas(), 4)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/notificaciones/{primera.pk}/leer/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/notificaciones/{primera.pk}/leer/')
+        self.assertEqual(self.no_leidas(), 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f'/api/notificaciones/{segunda.pk}/eliminar/')
+        self.assertEqual(self.no_leidas(), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/notificaciones/marcar-todas-leidas/')
+        self.assertEqual(self.no_leidas(), 0)
+        self.assertEqual(contador.contar(self.usuario.pk), 0)
+
+    def test_reconciliar(self):
+        self.crear(2)
+        cache.set(contador.clave(self.usuario.pk), 9)
+
+        call_command('reconciliar_notificaciones', stdout=StringIO())
+
+        self.assertEqual(contador.obtener(self.usuario.pk), 2)
+
+
+@override_settings(TAREAS_MODO='inmediato')
+class NotificacionesPedidoTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.comerciante = Usuario.objects.create_user(
+            username='comerciante', password='x', tipo_usuario='comerciante'
+        )
+        self.negocio = Negocio.objects.create(
+            propietario=self.comerciante,
+            nombre='Almacén Test',
+            direccion='Camino Rural Km 5',
+            telefono='+56912345678',
+            email='almacen@test.cl',
+            horario_apertura='08:00',
+            horario_cierre='20:00',
+            dias_atencion='Lunes a Sábado',
+        )
+        self.cliente = Usuario.objects.create_user(username='cliente', password='x', email='cliente@test.cl')
+
+    def crear_pedido(self, cliente=None):
+        return Pedido.objects.create(
+            cliente=cliente or self.cliente, negocio=self.negocio, metodo_entrega='pickup',
+            telefono_contacto='+56987654321', total=Decimal('1000'),
+        )
+
+    def cambiar_estado(self, pedido, estado):
+        self.client.force_login(self.comerciante)
+        with self.captureOnCommitCallbacks(execute=True):
+            respuesta = self.client.post(f'/comerciante/pedidos/{pedido.pk}/actualizar/', {'estado': estado})
+        self.assertEqual(respuesta.status_code, 200)
+
+    def test_cambio_de_estado_notifica_y_entrega(self):
+        ConfiguracionNotificacion.objects.create(usuario=self.cliente, notif_pedido_listo=False)
+        pedido = self.crear_pedido()
+
+        self.cambiar_estado(pedido, 'confirmado')
+        self.cambiar_estado(pedido, 'listo')
+
+        notificacion = Notificacion.objects.get()
+        self.assertEqual((notificacion.usuario, notificacion.tipo), (self.cliente, 'pedido_confirmado'))
+        self.assertEqual(contador.obtener(self.cliente.pk), 1)
+        # Entregada por email desde la cola, que quedó vacía
+        self.assertEqual([m.to for m in mail.outbox], [['cliente@test.cl']])
+        self.assertFalse(Tarea.objects.exists())
+
+    def test_costo_fijo_por_lote(self):
+        def consultas(cantidad):
+            pedidos = [self.crear_pedido() for _ in range(cantidad)]
+            for pedido in pedidos:
+                pedido.estado = 'en_camino'
+            with CaptureQueriesContext(connection) as contexto:
+                NotificacionesPedido.notificar_cambios_estado(pedidos)
+            return len(contexto)
+
+        self.assertEqual(consultas(1), consultas(20))
+        self.assertEqual(Notificacion.objects.count(), 21)
+
+
+    @override_settings(TAREAS_MODO='externo')
+    def test_sin_ids_del_bulk_insert_encola_solo_las_creadas(self):
+        pedido = self.crear_pedido()
+        pedido.estado = 'en_camino'
+        bulk_create = QuerySet.bulk_create
+
+        def bulk_create_y_llega_otra(queryset, objetos, **kwargs):
+            creadas = bulk_create(queryset, objetos, **kwargs)
+            # Otra notificación del mismo pedido creada en paralelo
+            Notificacion.objects.create(usuario=self.cliente, pedido=pedido, tipo='pedido_en_camino', titulo='t', mensaje='m')
+            return creadas
+
+        with mock.patch.object(type(connection.features), 'can_return_rows_from_bulk_insert', False), \
+                mock.patch.object(QuerySet, 'bulk_create', autospec=True, side_effect=bulk_create_y_llega_otra):
+            creadas = NotificacionesPedido.notificar_cambios_estado([pedido])
+
+        self.assertEqual(Tarea.objects.get().datos, {'ids': [creadas[0].pk]})
+        self.assertEqual(contador.obtener(self.cliente.pk), Notificacion.objects.count())
+
+@override_settings(NOTIFICACIONES_RETENCION_DIAS={'default': 90, 'stock_bajo': 30})
+class RetencionNotificacionesTest(TestCase):
+    def setUp(self):
+        self.usuario = Usuario.objects.create(username='comerciante')
+
+    def crear(self, tipo, dias, leida=True):
+        notificacion = Notificacion.objects.create(
+            usuario=self.usuario, tipo=tipo, titulo=tipo, mensaje='m', leida=leida
+        )
+        # auto_now_add: la fecha se ajusta después de crear
+        Notificacion.objects.filter(pk=notificacion.pk).update(
+            fecha_creacion=timezone.now() - timedelta(days=dias)
+        )
+        return notificacion
+
+    def test_purga_por_tipo_en_lotes_y_archiva(self):
+        vencidas = [self.crear('stock_bajo', 40) for _ in range(3)] + [self.crear('sistema', 100)]
+        conservadas = [
+            self.crear('sistema', 40),                 # dentro del plazo por defecto
+            self.crear('stock_bajo', 10),              # dentro del plazo de su tipo
+            self.crear('stock_bajo', 40, leida=False),  # no leída
+        ]
+
+        salida = StringIO()
+        call_command('purgar_notificaciones', '--dry-run', stdout=salida)
+        self.assertIn('se borrarían 4', salida.getvalue())
+        self.assertEqual(Notificacion.objects.count(), 7)
+
+        with tempfile.TemporaryDirectory() as directorio:
+            call_command('purgar_notificaciones', '--lote=2', f'--archivo-dir={directorio}', stdout=StringIO())
+            archivos = list(Path(directorio).glob('*.jsonl.gz'))
+            with gzip.open(archivos[0], 'rt', encoding='utf-8') as archivo:
+                archivadas = [json.loads(linea) for linea in archivo]
+
+        self.assertEqual(sorted(n['id'] for n in archivadas), sorted(n.pk for n in vencidas))
+        self.assertEqual(
+            set(Notificacion.objects.values_list('pk', flat=True)), {n.pk for n in conservadas}
+        )
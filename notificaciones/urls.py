@@ -6,5 +6,9 @@ app_name = 'notificaciones'
 urlpatterns = [
     path('', views.lista_notificaciones, name='lista'),
     path('<int:pk>/leer/', views.marcar_leida, name='marcar_leida'),
+    path('<int:pk>/eliminar/', views.eliminar_notificacion, name='eliminar'),
+    path('marcar-todas-leidas/', views.marcar_todas_leidas, name='marcar_todas_leidas'),
     path('no-leidas/', views.notificaciones_no_leidas, name='no_leidas'),
+    path('contador/', views.contador_no_leidas, name='contador'),
+    path('stream/', views.stream_notificaciones, name='stream'),
 ]
\ No newline at end of file
@@ -1,10 +1,18 @@
 # notificaciones/views.py
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.shortcuts import render, get_object_or_404
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views.decorators.http import require_http_methods
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.csrf import csrf_exempt
+from django.utils import timezone
+from pickup_rural import pubsub
+from . import contador
 from .models import Notificacion
+from .signals import canal_usuario, datos_notificacion
 import json
 
 @login_required
@@ -15,16 +23,7 @@ def lista_notificaciones(request):
         usuario=request.user
     ).select_related('pedido', 'pedido__negocio').order_by('-fecha_creacion')[:20]
     
-    data = [{
-        'id': n.id,
-        'tipo': n.tipo,
-        'titulo': n.titulo,
-        'mensaje': n.mensaje,
-        'leida': n.leida,
-        'fecha_creacion': n.fecha_creacion.strftime('%Y-%m-%d %H:%M:%S'),
-        'pedido_id': n.pedido.id if n.pedido else None,
-        'pedido_numero': n.pedido.numero_pedido if n.pedido else None,
-    } for n in notificaciones]
+    data = [datos_notificacion(n) for n in notificaciones]
     
     return JsonResponse({
         'notificaciones': data,
@@ -46,27 +45,83 @@ def marcar_leida(request, pk):
 @login_required
 @require_http_methods(["GET"])
 def notificaciones_no_leidas(request):
-    """Obtener notificaciones no leídas (para polling)"""
+    """Obtener notificaciones no leídas (carga inicial y respaldo sin stream)"""
     notificaciones = Notificacion.objects.filter(
         usuario=request.user,
         leida=False
     ).select_related('pedido', 'pedido__negocio').order_by('-fecha_creacion')[:10]
     
-    data = [{
-        'id': n.id,
-        'tipo': n.tipo,
-        'titulo': n.titulo,
-        'mensaje': n.mensaje,
-        'fecha_creacion': n.fecha_creacion.strftime('%Y-%m-%d %H:%M:%S'),
-        'pedido_id': n.pedido.id if n.pedido else None,
-        'pedido_numero': n.pedido.numero_pedido if n.pedido else None,
-    } for n in notificaciones]
+    data = [datos_notificacion(n) for n in notificaciones]
     
     return JsonResponse({
         'notificaciones': data,
         'count': len(data)
     })
 
+@login_required
+@require_http_methods(["GET"])
+def contador_no_leidas(request):
+    """Cantidad de notificaciones no leídas (desde caché, para la campana)"""
+    return JsonResponse({'no_leidas': contador.obtener(request.user.pk)})
+
+def _no_leidas_desde(usuario, ultimo_id):
+    """Notificaciones no leídas con id > ultimo_id, de la más antigua a la más nueva"""
+    notificaciones = Notificacion.objects.filter(
+        usuario=usuario, leida=False, id__gt=ultimo_id
+    ).select_related('pedido').order_by('-id')[:10]
+    return [datos_notificacion(n) for n in reversed(notificaciones)]
+
+@login_required
+@require_http_methods(["GET"])
+async def stream_notificaciones(request):
+    """
+    Stream SSE con las notificaciones nuevas del usuario (requiere ASGI).
+    
+    Al conectar envía las no leídas con id > ultimo_id (o Last-Event-ID al
+    reconectar) y luego cada notificación creada, sin consultar la BD.
+    Cada usuario tiene a lo más NOTIFICACIONES_MAX_CONEXIONES abiertas por
+    proceso: una pestaña nueva corta la conexión más antigua. Bajo WSGI
+    responde 503 y el cliente pasa al polling.
+    """
+    if not pubsub.sirve_asgi(request):
+        return pubsub.sin_streaming()
+    
+    usuario = await request.auser()
+    try:
+        ultimo_id = max(int(request.headers.get('Last-Event-ID') or request.GET.get('ultimo_id') or 0), 0)
+    except ValueError:
+        ultimo_id = 0
+    
+    async def eventos():
+        ultimo = ultimo_id
+        yield 'retry: 5000\n\n'
+        
+        async with pubsub.suscribir(canal_usuario(usuario.pk), settings.NOTIFICACIONES_MAX_CONEXIONES) as suscripcion:
+            for datos in await sync_to_async(_no_leidas_desde)(usuario, ultimo):
+                ultimo = datos['id']
+                yield pubsub.evento_sse(datos, evento='notificacion', id=datos['id'])
+            
+            while True:
+                try:
+                    datos = await suscripcion.recibir(settings.SSE_KEEPALIVE_SEGUNDOS)
+                except asyncio.TimeoutError:
+                    yield ': keepalive\n\n'
+                    continue
+                
+                if datos is None:
+                    # Cliente lento o desplazado por una conexión más nueva
+                    return
+                if datos['id'] <= ultimo:
+                    continue
+                
+                ultimo = datos['id']
+                yield pubsub.evento_sse(datos, evento='notificacion', id=datos['id'])
+    
+    respuesta = StreamingHttpResponse(eventos(), content_type='text/event-stream')
+    respuesta['Cache-Control'] = 'no-cache'
+    respuesta['X-Accel-Buffering'] = 'no'
+    return respuesta
+
 @login_required
 @require_http_methods(["POST"])
 def marcar_todas_leidas(request):
@@ -74,7 +129,8 @@ def marcar_todas_leidas(request):
     count = Notificacion.objects.filter(
         usuario=request.user,
         leida=False
-    ).update(leida=True)
+    ).update(leida=True, fecha_lectura=timezone.now())
+    contador.ajustar_al_confirmar({request.user.pk: -count})
     
     return JsonResponse({
         'success': True,
@@ -88,6 +144,8 @@ def eliminar_notificacion(request, pk):
     """Eliminar una notificación"""
     notificacion = get_object_or_404(Notificacion, pk=pk, usuario=request.user)
     notificacion.delete()
+    if not notificacion.leida:
+        contador.ajustar_al_confirmar({request.user.pk: -1})
     
     return JsonResponse({
         'success': True,
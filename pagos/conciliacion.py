@@ -0,0 +1,213 @@
+# pagos/conciliacion.py
+"""
+Conciliación de pagos contra el archivo de liquidación de la pasarela.
+
+El archivo (CSV) se lee fila a fila; cada fila se busca en un índice en
+memoria {codigo_transaccion / orden_compra → pago} armado por rangos de id
+(una query por bloque). Los cambios de estado se acumulan y se aplican por
+lotes: un UPDATE por transición y un bulk_create de HistorialPago por lote,
+cada lote en su transacción. La memoria depende de la cantidad de pagos,
+no del largo del archivo; las diferencias se escriben al reporte a medida
+que aparecen.
+
+Los UPDATE por lote no disparan señales: los contadores del sitio
+(administracion.contadores) se ajustan al confirmar cada lote.
+
+Columnas reconocidas: codigo_transaccion y/o orden_compra (al menos una),
+monto, estado y opcionalmente codigo_autorizacion.
+"""
+import csv
+from collections import Counter, defaultdict
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.utils import timezone
+
+from administracion import contadores
+from notificaciones.services import NotificacionesPedido
+from pedidos.models import HistorialEstadoPedido, Pedido
+from .models import Pago, HistorialPago
+
+TAMANO_LOTE = 1000
+
+# Estado informado por la pasarela → estado de Pago
+ESTADOS_LIQUIDACION = {
+    'authorized': 'aprobado',
+    'aprobado': 'aprobado',
+    'failed': 'rechazado',
+    'rechazado': 'rechazado',
+    'reversed': 'reembolsado',
+    'nullified': 'reembolsado',
+    'reembolsado': 'reembolsado',
+}
+
+# estado nuevo → estados desde los que la liquidación lo puede aplicar
+# ('rechazado' → 'aprobado': pagos rechazados porque WebPay no respondió a
+# la confirmación, aunque el cobro se hizo)
+TRANSICIONES = {
+    'aprobado': ('pendiente', 'procesando', 'rechazado'),
+    'rechazado': ('pendiente', 'procesando'),
+    'reembolsado': ('aprobado',),
+}
+
+COLUMNAS_REPORTE = ['linea', 'referencia', 'motivo', 'detalle']
+
+
+def indice_pagos(tamano_lote=TAMANO_LOTE):
+    """
+    ({codigo_transaccion: fila}, {orden_compra: fila}) con fila =
+    [id, estado, monto, pedido_id]; ambos dicts comparten la misma lista,
+    así un cambio de estado se ve por cualquiera de las dos claves.
+
+    Se lee por rangos de id, `tamano_lote` filas por query: no depende de
+    cursores del servidor (el conector de MySQL trae el resultado completo
+    aunque se use iterator()), así a lo más un bloque queda en tránsito
+    además de los dicts.
+    """
+    por_codigo, por_orden = {}, {}
+    pagos = Pago.objects.order_by('id').values_list(
+        'id', 'codigo_transaccion', 'orden_compra', 'estado', 'monto', 'pedido_id'
+    )
+    ultimo_id = 0
+    while True:
+        bloque = list(pagos.filter(id__gt=ultimo_id)[:tamano_lote])
+        for pago_id, codigo, orden, estado, monto, pedido_id in bloque:
+            fila = [pago_id, estado, monto, pedido_id]
+            por_codigo[codigo] = fila
+            if orden:
+                por_orden[orden] = fila
+        if len(bloque) < tamano_lote:
+            return por_codigo, por_orden
+        ultimo_id = bloque[-1][0]
+
+
+class Conciliacion:
+    def __init__(self, simular=False, tamano_lote=TAMANO_LOTE, reporte=None, origen='liquidación'):
+        """`reporte`: archivo de texto abierto donde escribir las diferencias (CSV)"""
+        self.simular = simular
+        self.tamano_lote = tamano_lote
+        self.origen = origen
+        self.resumen = Counter()
+        self._reporte = csv.writer(reporte) if reporte else None
+        if self._reporte:
+            self._reporte.writerow(COLUMNAS_REPORTE)
+        self._vistos = set()
+        # (anterior, nuevo) → [(linea, referencia, pago_id, pedido_id, detalle)]
+        self._pendientes = defaultdict(list)
+        self._cantidad_pendientes = 0
+
+    def procesar_archivo(self, archivo, delimitador=','):
+        return self.procesar(csv.DictReader(archivo, delimiter=delimitador))
+
+    def procesar(self, filas):
+        """Concilia las filas (dicts); retorna el resumen {categoría: cantidad}"""
+        por_codigo, por_orden = indice_pagos(self.tamano_lote)
+        for linea, fila in enumerate(filas, start=2):
+            self.resumen['lineas'] += 1
+            self._conciliar_fila(linea, fila, por_codigo, por_orden)
+            if self._cantidad_pendientes >= self.tamano_lote:
+                self._aplicar()
+        self._aplicar()
+        return self.resumen
+
+    def _diferencia(self, linea, referencia, motivo, detalle=''):
+        self.resumen[motivo] += 1
+        if self._reporte:
+            self._reporte.writerow([linea, referencia, motivo, detalle])
+
+    def _conciliar_fila(self, linea, fila, por_codigo, por_orden):
+        codigo = (fila.get('codigo_transaccion') or '').strip()
+        orden = (fila.get('orden_compra') or '').strip()
+        referencia = codigo or orden
+        pago = por_codigo.get(codigo) if codigo else por_orden.get(orden)
+        if pago is None:
+            return self._diferencia(linea, referencia, 'no_encontrado')
+        pago_id, estado, monto, pedido_id = pago
+
+        if pago_id in self._vistos:
+            return self._diferencia(linea, referencia, 'duplicado')
+        self._vistos.add(pago_id)
+
+        nuevo = ESTADOS_LIQUIDACION.get((fila.get('estado') or '').strip().lower())
+        if nuevo is None:
+            return self._diferencia(linea, referencia, 'estado_desconocido', fila.get('estado', ''))
+        try:
+            monto_liquidado = Decimal((fila.get('monto') or '').strip())
+        except InvalidOperation:
+            return self._diferencia(linea, referencia, 'monto_invalido', fila.get('monto', ''))
+        if monto_liquidado != monto:
+            return self._diferencia(linea, referencia, 'monto_distinto', f'{monto} ≠ {monto_liquidado}')
+
+        if estado == nuevo:
+            self.resumen['sin_cambios'] += 1
+        elif estado not in TRANSICIONES[nuevo]:
+            self._diferencia(linea, referencia, 'estado_incompatible', f'{estado} → {nuevo}')
+        else:
+            autorizacion = (fila.get('codigo_autorizacion') or '').strip()
+            detalle = f'Conciliación {self.origen}' + (f' (autorización {autorizacion})' if autorizacion else '')
+            self._pendientes[(estado, nuevo)].append((linea, referencia, pago_id, pedido_id, detalle))
+            self._cantidad_pendientes += 1
+            pago[1] = nuevo
+
+    def _aplicar(self):
+        """Aplica el lote acumulado: un UPDATE por transición y los historiales en bulk"""
+        pendientes, self._pendientes = self._pendientes, defaultdict(list)
+        self._cantidad_pendientes = 0
+        if not pendientes:
+            return
+        if self.simular:
+            for (anterior, nuevo), pagos in pendientes.items():
+                self.resumen[nuevo] += len(pagos)
+            return
+
+        ahora = timezone.now()
+        with transaction.atomic():
+            historial, confirmar = [], []
+            ajustes = Counter()
+            for (anterior, nuevo), pagos in pendientes.items():
+                ids = [pendiente[2] for pendiente in pagos]
+                # Solo los que siguen en el estado leído (otro proceso pudo cambiarlos)
+                vigentes = set(
+                    Pago.objects.select_for_update().filter(id__in=ids, estado=anterior).values_list('id', flat=True)
+                )
+                campos = {'fecha_aprobacion': ahora} if nuevo == 'aprobado' else {}
+                Pago.objects.filter(id__in=vigentes).update(estado=nuevo, **campos)
+
+                for linea, referencia, pago_id, pedido_id, detalle in pagos:
+                    if pago_id not in vigentes:
+                        self._diferencia(linea, referencia, 'cambio_concurrente', f'ya no estaba {anterior}')
+                        continue
+                    historial.append(HistorialPago(
+                        pago_id=pago_id, estado_anterior=anterior, estado_nuevo=nuevo, descripcion=detalle
+                    ))
+                    if nuevo == 'aprobado':
+                        confirmar.append(pedido_id)
+                self.resumen[nuevo] += len(vigentes)
+                for nombre, delta in contadores.deltas(Pago, {'estado': anterior}, {'estado': nuevo}).items():
+                    ajustes[nombre] += delta * len(vigentes)
+
+            HistorialPago.objects.bulk_create(historial, batch_size=self.tamano_lote)
+            self._confirmar_pedidos(confirmar)
+            if any(ajustes.values()):
+                transaction.on_commit(lambda: contadores.ajustar(ajustes))
+
+    def _confirmar_pedidos(self, pedido_ids):
+        """
+        Confirma los pedidos aún pendientes de los pagos aprobados. Van con
+        save() (no update()) para que las señales de pedidos mantengan los
+        resúmenes diarios; son pocos frente al total de filas del archivo.
+        """
+        if not pedido_ids:
+            return
+        pedidos, confirmados = [], []
+        for pedido in Pedido.objects.select_for_update().filter(id__in=pedido_ids, estado='pendiente'):
+            pedido.estado = 'confirmado'
+            pedido.save(update_fields=['estado'])
+            confirmados.append(HistorialEstadoPedido(
+                pedido=pedido, estado_anterior='pendiente', estado_nuevo='confirmado',
+                comentario=f'Pago aprobado (conciliación {self.origen})',
+            ))
+            pedidos.append(pedido)
+        HistorialEstadoPedido.objects.bulk_create(confirmados)
+        NotificacionesPedido.notificar_cambios_estado(pedidos)
+        self.resumen['pedidos_confirmados'] += len(confirmados)
@@ -0,0 +1,44 @@
+# pagos/management/commands/conciliar_pagos.py
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from pagos.conciliacion import Conciliacion, TAMANO_LOTE
+
+
+class Command(BaseCommand):
+    help = 'Concilia los pagos contra un archivo de liquidación (CSV) de la pasarela'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='CSV con codigo_transaccion/orden_compra, monto y estado')
+        parser.add_argument('--delimitador', default=',', help="Separador de columnas (WebPay usa ';')")
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE, help='Cambios por transacción')
+        parser.add_argument('--reporte', help='CSV donde escribir las diferencias encontradas')
+        parser.add_argument('--dry-run', action='store_true', help='Solo comparar, sin modificar pagos')
+
+    def handle(self, *args, **options):
+        if not os.path.isfile(options['archivo']):
+            raise CommandError(f"No existe el archivo {options['archivo']}")
+
+        reporte = open(options['reporte'], 'w', newline='', encoding='utf-8') if options['reporte'] else None
+        try:
+            with open(options['archivo'], newline='', encoding='utf-8-sig') as archivo:
+                conciliacion = Conciliacion(
+                    simular=options['dry_run'],
+                    tamano_lote=options['lote'],
+                    reporte=reporte,
+                    origen=os.path.basename(options['archivo']),
+                )
+                resumen = conciliacion.procesar_archivo(archivo, options['delimitador'])
+        finally:
+            if reporte:
+                reporte.close()
+
+        lineas = resumen.pop('lineas', 0)
+        for categoria, cantidad in sorted(resumen.items()):
+            self.stdout.write(f'  {categoria}: {cantidad}')
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(f'🔍 Simulación: {lineas} líneas comparadas, sin cambios aplicados'))
+            return
+        if options['reporte']:
+            self.stdout.write(f"📄 Diferencias en {options['reporte']}")
+        self.stdout.write(self.style.SUCCESS(f'✅ {lineas} líneas conciliadas'))
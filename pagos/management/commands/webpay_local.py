@@ -0,0 +1,26 @@
+# pagos/management/commands/webpay_local.py
+import time
+
+from django.core.management.base import BaseCommand
+from pagos.webpay_local import ServidorWebpayLocal
+
+
+class Command(BaseCommand):
+    help = 'Levanta un servidor local que imita la API de WebPay Plus (desarrollo sin red)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--puerto', type=int, default=8765)
+        parser.add_argument('--retraso', type=float, default=0, help='Segundos de demora por respuesta (pasarela lenta)')
+        parser.add_argument('--rechazar-sobre', type=int, help='Rechazar transacciones de monto mayor a este')
+
+    def handle(self, *args, **options):
+        limite = options['rechazar_sobre']
+        aprobar = (lambda monto: monto <= limite) if limite is not None else None
+
+        with ServidorWebpayLocal(options['puerto'], options['retraso'], aprobar) as servidor:
+            self.stdout.write(self.style.SUCCESS(f'💳 WebPay local en {servidor.url} (usar WEBPAY_URL = {servidor.url!r})'))
+            try:
+                while True:
+                    time.sleep(3600)
+            except KeyboardInterrupt:
+                self.stdout.write('👋 Servidor detenido')
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 10:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pagos', '0001_initial'),
+        ('pedidos', '0002_resumenes_diarios'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pago',
+            index=models.Index(fields=['token_ws'], name='pagos_pago_token_w_a44490_idx'),
+        ),
+    ]
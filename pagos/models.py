@@ -1,5 +1,6 @@
-from django.db import models
-from pedidos.models import Pedido
+from django.db import models, transaction
+from django.utils import timezone
+from pedidos.models import Pedido, HistorialEstadoPedido
 import uuid
 
 class Pago(models.Model):
@@ -46,7 +47,15 @@ class Pago(models.Model):
         indexes = [
             models.Index(fields=['codigo_transaccion']),
             models.Index(fields=['pedido', 'estado']),
+            models.Index(fields=['token_ws']),
         ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Valor leído de `estado`, para que los contadores del sitio no consulten la BD al guardar
+        instance._estado_guardado = instance.__dict__.get('estado')
+        return instance
     
     def save(self, *args, **kwargs):
         if not self.codigo_transaccion:
@@ -56,15 +65,51 @@ class Pago(models.Model):
     def __str__(self):
         return f"{self.codigo_transaccion} - {self.pedido.numero_pedido}"
     
-    def aprobar_pago(self):
-        from django.utils import timezone
-        self.estado = 'aprobado'
-        self.fecha_aprobacion = timezone.now()
-        self.save()
-        
-        # Actualizar estado del pedido
-        self.pedido.estado = 'confirmado'
-        self.pedido.save()
+    def cambiar_estado(self, nuevo, descripcion='', desde=None, **campos):
+        """
+        Pasa el pago a `nuevo` (más `campos`) y registra el HistorialPago en
+        una transacción, con la fila bloqueada. Si el estado en la BD ya no
+        está en `desde` (por defecto el leído), no hace nada y retorna False:
+        dos procesos que confirman el mismo pago no lo aplican dos veces.
+        Guarda con save(update_fields) para que las señales (contadores del
+        sitio) vean el cambio.
+        """
+        desde = desde or [self.estado]
+        with transaction.atomic():
+            anterior = Pago.objects.select_for_update().values_list('estado', flat=True).get(pk=self.pk)
+            if anterior not in desde:
+                return False
+            self.estado = nuevo
+            for campo, valor in campos.items():
+                setattr(self, campo, valor)
+            self.save(update_fields=['estado', *campos])
+            HistorialPago.objects.create(
+                pago=self, estado_anterior=anterior, estado_nuevo=nuevo, descripcion=descripcion
+            )
+        return True
+    
+    def aprobar_pago(self, descripcion='Pago aprobado', **campos):
+        """Aprueba el pago y confirma el pedido si seguía pendiente (todo en una transacción)"""
+        from notificaciones.services import NotificacionesPedido
+        with transaction.atomic():
+            aprobado = self.cambiar_estado(
+                'aprobado', descripcion, desde=['pendiente', 'procesando'],
+                fecha_aprobacion=timezone.now(), **campos
+            )
+            if not aprobado:
+                return False
+            
+            # Actualizar estado del pedido
+            pedido = Pedido.objects.select_for_update().get(pk=self.pedido_id)
+            if pedido.estado == 'pendiente':
+                pedido.estado = 'confirmado'
+                pedido.save(update_fields=['estado'])
+                HistorialEstadoPedido.objects.create(
+                    pedido=pedido, estado_anterior='pendiente', estado_nuevo='confirmado', comentario=descripcion
+                )
+                NotificacionesPedido.notificar_cambio_estado(pedido)
+            self.pedido = pedido
+        return True
 
 class HistorialPago(models.Model):
     pago = models.ForeignKey(Pago, on_delete=models.CASCADE, related_name='historial')
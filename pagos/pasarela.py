@@ -0,0 +1,71 @@
+# pagos/pasarela.py
+"""
+Adaptador de la pasarela de pago (API REST de WebPay Plus).
+
+Solo lo usa el worker de tareas (pagos/tareas.py): una pasarela lenta o
+caída demora la tarea, no una petición web. settings.WEBPAY_URL apunta al
+ambiente de integración de Transbank; en tests y desarrollo se puede
+apuntar al servidor local de pagos/webpay_local.py.
+"""
+import json
+import urllib.error
+import urllib.request
+
+from django.conf import settings
+
+RUTA_TRANSACCIONES = '/rswebpaytransaction/api/webpay/v1.2/transactions'
+
+
+class ErrorPasarela(Exception):
+    """La pasarela no respondió o respondió con error (la tarea se reintenta)"""
+
+
+class PasarelaWebpay:
+    def __init__(self, url=None, comercio=None, api_key=None, timeout=None):
+        self.url = (url or settings.WEBPAY_URL).rstrip('/')
+        self.comercio = comercio or settings.WEBPAY_COMERCIO
+        self.api_key = api_key or settings.WEBPAY_API_KEY
+        self.timeout = timeout or getattr(settings, 'WEBPAY_TIMEOUT_SEGUNDOS', 10)
+
+    def _llamar(self, metodo, ruta, datos=None):
+        peticion = urllib.request.Request(
+            self.url + RUTA_TRANSACCIONES + ruta,
+            method=metodo,
+            data=json.dumps(datos).encode() if datos is not None else None,
+            headers={
+                'Tbk-Api-Key-Id': self.comercio,
+                'Tbk-Api-Key-Secret': self.api_key,
+                'Content-Type': 'application/json',
+            },
+        )
+        try:
+            with urllib.request.urlopen(peticion, timeout=self.timeout) as respuesta:
+                return json.loads(respuesta.read() or b'{}')
+        except urllib.error.HTTPError as e:
+            raise ErrorPasarela(f'{metodo} {ruta}: HTTP {e.code} {e.read()[:200]!r}') from e
+        except (urllib.error.URLError, TimeoutError, ValueError) as e:
+            raise ErrorPasarela(f'{metodo} {ruta}: {e}') from e
+
+    def crear_transaccion(self, orden_compra, sesion, monto, url_retorno):
+        """Retorna {'token': ..., 'url': ...} para redirigir al cliente al formulario de pago"""
+        return self._llamar('POST', '', {
+            'buy_order': orden_compra,
+            'session_id': sesion,
+            'amount': monto,
+            'return_url': url_retorno,
+        })
+
+    def confirmar_transaccion(self, token):
+        """Confirma (commit) la transacción al volver el cliente; retorna la respuesta completa"""
+        return self._llamar('PUT', f'/{token}')
+
+    def estado_transaccion(self, token):
+        return self._llamar('GET', f'/{token}')
+
+    @staticmethod
+    def aprobada(respuesta):
+        return respuesta.get('status') == 'AUTHORIZED' and respuesta.get('response_code') == 0
+
+
+def pasarela():
+    return PasarelaWebpay()
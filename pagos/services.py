@@ -0,0 +1,75 @@
+# pagos/services.py
+from django.db import transaction
+
+from tareas.cola import encolar
+from .models import Pago
+
+
+class ServicioPagos:
+    """
+    Flujo de pago con WebPay sin llamadas a la pasarela desde las vistas:
+
+    1. iniciar_webpay(): el pago pasa a 'procesando' y se encola la creación
+       de la transacción (pagos.crear_transaccion).
+    2. El worker crea la transacción y guarda token_ws y la URL del
+       formulario; el cliente la obtiene consultando datos_estado().
+    3. Al volver de WebPay, registrar_retorno() encola la confirmación
+       (pagos.confirmar_transaccion) y el worker aprueba o rechaza el pago.
+    """
+
+    @staticmethod
+    def crear_pago(pedido, metodo_pago):
+        """Pago del pedido (uno por pedido); retorna (pago, creado)"""
+        return Pago.objects.get_or_create(
+            pedido=pedido, defaults={'metodo_pago': metodo_pago, 'monto': pedido.total}
+        )
+
+    @staticmethod
+    def iniciar_webpay(pago, url_retorno):
+        """
+        Encola la creación de la transacción en WebPay. Retorna False si el
+        pago ya no se puede iniciar (aprobado o ya en proceso: un doble
+        clic no crea dos transacciones).
+        """
+        with transaction.atomic():
+            iniciado = pago.cambiar_estado(
+                'procesando', 'Iniciando transacción WebPay', desde=['pendiente', 'rechazado'],
+                metodo_pago='webpay', token_ws='', datos_respuesta=None,
+            )
+            if iniciado:
+                encolar('pagos.crear_transaccion', pago_id=pago.pk, url_retorno=url_retorno)
+        return iniciado
+
+    @staticmethod
+    def registrar_retorno(token_ws=None, token_anulado=None):
+        """
+        Vuelta del cliente desde WebPay. Con token_ws encola la confirmación;
+        con TBK_TOKEN (el cliente anuló el pago en el formulario) lo rechaza.
+        Retorna el pago, o None si el token no corresponde a ninguno.
+        """
+        pago = Pago.objects.filter(token_ws=token_ws or token_anulado).exclude(token_ws='').first()
+        if pago is None:
+            return None
+        with transaction.atomic():
+            if token_ws:
+                encolar('pagos.confirmar_transaccion', pago_id=pago.pk)
+            else:
+                pago.cambiar_estado('rechazado', 'Pago anulado por el cliente en WebPay', desde=['procesando'])
+        return pago
+
+    @staticmethod
+    def datos_estado(pago_id, usuario):
+        """Estado del pago para el polling del cliente (una query, sin pasar por el modelo)"""
+        datos = Pago.objects.filter(pk=pago_id, pedido__cliente=usuario).values(
+            'id', 'codigo_transaccion', 'estado', 'monto', 'metodo_pago', 'token_ws', 'datos_respuesta',
+        ).first()
+        if datos is None:
+            return None
+        respuesta = datos.pop('datos_respuesta') or {}
+        token = datos.pop('token_ws')
+        datos['monto'] = float(datos['monto'])
+        if datos['estado'] == 'procesando' and token and respuesta.get('url'):
+            # Transacción creada: el cliente debe ir al formulario de WebPay
+            datos['url_pago'] = respuesta['url']
+            datos['token_ws'] = token
+        return datos
@@ -0,0 +1,66 @@
+# pagos/tareas.py
+from tareas.cola import tarea
+from .models import Pago
+from .pasarela import ErrorPasarela, pasarela
+
+
+def rechazar_sin_pasarela(descripcion):
+    """
+    al_agotar de las tareas de WebPay: el pago sale de 'procesando' como
+    rechazado, así el cliente ve el resultado y puede volver a intentar
+    (iniciar_webpay acepta pagos rechazados).
+    """
+    def rechazar(pago_id, **datos):
+        pago = Pago.objects.get(pk=pago_id)
+        pago.cambiar_estado('rechazado', descripcion, desde=['procesando'])
+    return rechazar
+
+
+@tarea('pagos.crear_transaccion', al_agotar=rechazar_sin_pasarela(
+    'WebPay no respondió: no se pudo crear la transacción'
+))
+def crear_transaccion(pago_id, url_retorno):
+    """Crea la transacción en WebPay y guarda el token (si la pasarela falla, la tarea se reintenta)"""
+    pago = Pago.objects.select_related('pedido').get(pk=pago_id)
+    if pago.estado != 'procesando' or pago.token_ws:
+        return
+    respuesta = pasarela().crear_transaccion(
+        orden_compra=pago.pedido.numero_pedido,
+        sesion=pago.codigo_transaccion,
+        monto=int(pago.monto),
+        url_retorno=url_retorno,
+    )
+    Pago.objects.filter(pk=pago.pk, estado='procesando').update(
+        token_ws=respuesta['token'],
+        orden_compra=pago.pedido.numero_pedido,
+        datos_respuesta={'url': respuesta['url']},
+    )
+
+
+@tarea('pagos.confirmar_transaccion', al_agotar=rechazar_sin_pasarela(
+    'WebPay no respondió: no se pudo confirmar la transacción (la conciliación la aprueba si se cobró)'
+))
+def confirmar_transaccion(pago_id):
+    """Confirma la transacción en WebPay y aprueba o rechaza el pago"""
+    pago = Pago.objects.get(pk=pago_id)
+    if pago.estado != 'procesando' or not pago.token_ws:
+        return
+    cliente = pasarela()
+    try:
+        respuesta = cliente.confirmar_transaccion(pago.token_ws)
+    except ErrorPasarela:
+        # Un intento anterior pudo confirmarla sin alcanzar a guardar el resultado
+        respuesta = cliente.estado_transaccion(pago.token_ws)
+        if respuesta.get('status') not in ('AUTHORIZED', 'FAILED'):
+            raise
+
+    if cliente.aprobada(respuesta):
+        pago.aprobar_pago(
+            f"Aprobado por WebPay (autorización {respuesta.get('authorization_code')})",
+            datos_respuesta=respuesta,
+        )
+    else:
+        pago.cambiar_estado(
+            'rechazado', f"Rechazado por WebPay (código {respuesta.get('response_code')})",
+            desde=['procesando'], datos_respuesta=respuesta,
+        )
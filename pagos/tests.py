@@ -1,3 +1,306 @@
-from django.test import TestCase
+import io
+import threading
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.contrib.auth.models import AnonymousUser
+from django.http import JsonResponse
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.client import encode_multipart
+from django.utils import timezone
+
+from administracion import contadores
+from pagos.conciliacion import Conciliacion, indice_pagos
+from pagos.models import HistorialPago, Pago
+from pagos.webpay_local import ServidorWebpayLocal
+from pickup_rural.idempotencia import IdempotenciaMiddleware
+from pedidos.models import HistorialEstadoPedido, Pedido
+from tareas.cola import procesar_pendientes
+from tareas.models import Tarea
+from usuarios.models import Usuario, Negocio
+
+
+class PedidoClienteTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        comerciante = Usuario.objects.create_user(username='comerciante', password='x', tipo_usuario='comerciante')
+        negocio = Negocio.objects.create(
+            propietario=comerciante,
+            nombre='Almacén Test',
+            direccion='Camino Rural Km 5',
+            telefono='+56912345678',
+            email='almacen@test.cl',
+            horario_apertura='08:00',
+            horario_cierre='20:00',
+            dias_atencion='Lunes a Sábado',
+        )
+        self.cliente = Usuario.objects.create_user(username='cliente', password='x')
+        self.pedido = Pedido.objects.create(
+            cliente=self.cliente, negocio=negocio, metodo_entrega='pickup',
+            telefono_contacto='+56987654321', total=Decimal('15990'),
+        )
+        self.client.force_login(self.cliente)
+
+
+@override_settings(TAREAS_MODO='inmediato')
+class PagoWebpayTest(PedidoClienteTestCase):
+    @contextmanager
+    def webpay(self, **opciones):
+        with ServidorWebpayLocal(**opciones) as servidor, self.settings(WEBPAY_URL=servidor.url):
+            yield servidor
+
+    def post(self, url, datos):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(url, datos)
+
+    def pagar(self):
+        pago_id = self.post('/api/pagos/crear/', {'pedido_id': self.pedido.pk}).json()['id']
+        respuesta = self.post('/api/pagos/webpay/iniciar/', {'pago_id': pago_id})
+        self.assertEqual(respuesta.status_code, 202)
+
+        estado = self.client.get(f'/api/pagos/{pago_id}/verificar/').json()
+        self.assertEqual(estado['estado'], 'procesando')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            respuesta = self.client.get('/api/pagos/webpay/retorno/', {'token_ws': estado['token_ws']})
+        self.assertEqual(respuesta.status_code, 202)
+        return Pago.objects.get(pk=pago_id), estado
+
+    def test_pago_aprobado(self):
+        self.assertEqual(contadores.obtener()['pagos_aprobados'], 0)
+        with self.webpay() as servidor:
+            pago, estado = self.pagar()
+
+        self.assertTrue(estado['url_pago'].startswith(servidor.url))
+        transaccion = servidor.transacciones[pago.token_ws]
+        self.assertEqual((transaccion['amount'], transaccion['buy_order']), (15990, self.pedido.numero_pedido))
+        self.assertEqual(pago.estado, 'aprobado')
+        self.assertEqual(pago.datos_respuesta['status'], 'AUTHORIZED')
+        self.assertEqual(
+            list(pago.historial.order_by('id').values_list('estado_anterior', 'estado_nuevo')),
+            [('pendiente', 'procesando'), ('procesando', 'aprobado')],
+        )
+        self.pedido.refresh_from_db()
+        self.assertEqual(self.pedido.estado, 'confirmado')
+        self.assertEqual(self.client.get(f'/api/pagos/{pago.pk}/verificar/').json()['estado'], 'aprobado')
+        self.assertEqual(contadores.obtener()['pagos_aprobados'], 1)
+
+    def test_pago_rechazado_se_puede_reintentar(self):
+        with self.webpay(aprobar=lambda monto: False):
+            pago, _ = self.pagar()
+
+        self.assertEqual(pago.estado, 'rechazado')
+        self.pedido.refresh_from_db()
+        self.assertEqual(self.pedido.estado, 'pendiente')
+        with self.settings(TAREAS_MODO='externo'):
+            respuesta = self.post('/api/pagos/webpay/iniciar/', {'pago_id': pago.pk})
+        self.assertEqual(respuesta.status_code, 202)
+
+    def test_reintentos_agotados_rechazan_el_pago(self):
+        # Puerto sin servidor: cada intento de la tarea falla
+        with self.settings(WEBPAY_URL='http://127.0.0.1:9'):
+            pago_id = self.post('/api/pagos/crear/', {'pedido_id': self.pedido.pk}).json()['id']
+            self.assertEqual(self.post('/api/pagos/webpay/iniciar/', {'pago_id': pago_id}).status_code, 202)
+            while Tarea.objects.filter(estado='pendiente').exists():
+                Tarea.objects.update(disponible_desde=timezone.now() - timedelta(seconds=1))
+                procesar_pendientes()
+
+        self.assertEqual(Tarea.objects.get().estado, 'fallida')
+        pago = Pago.objects.get(pk=pago_id)
+        self.assertEqual(pago.estado, 'rechazado')
+        self.assertEqual(pago.historial.order_by('id').last().estado_anterior, 'procesando')
+        self.assertEqual(self.client.get(f'/api/pagos/{pago_id}/verificar/').json()['estado'], 'rechazado')
+
+        # El cliente puede volver a intentar
+        with self.webpay():
+            self.assertEqual(self.post('/api/pagos/webpay/iniciar/', {'pago_id': pago_id}).status_code, 202)
+        self.assertTrue(Pago.objects.get(pk=pago_id).token_ws)
+
+    def test_la_vista_no_espera_a_la_pasarela(self):
+        pago_id = self.post('/api/pagos/crear/', {'pedido_id': self.pedido.pk}).json()['id']
+
+        # Con el worker aparte, iniciar (dos veces: doble clic) solo encola
+        with self.webpay(retraso=5) as servidor, self.settings(TAREAS_MODO='externo'):
+            respuesta = self.post('/api/pagos/webpay/iniciar/', {'pago_id': pago_id})
+            self.post('/api/pagos/webpay/iniciar/', {'pago_id': pago_id})
+
+        self.assertEqual(respuesta.json()['estado'], 'procesando')
+        self.assertEqual(servidor.transacciones, {})
+        self.assertEqual(Tarea.objects.get().nombre, 'pagos.crear_transaccion')
+        self.assertNotIn('url_pago', self.client.get(f'/api/pagos/{pago_id}/verificar/').json())
+
+
+class ConciliacionTest(PedidoClienteTestCase):
+    def pago(self, estado, monto='15990', orden=''):
+        pedido = Pedido.objects.create(
+            cliente=self.cliente, negocio=self.pedido.negocio, metodo_entrega='pickup',
+            telefono_contacto='+56987654321', total=Decimal(monto),
+        )
+        return Pago.objects.create(
+            pedido=pedido, metodo_pago='webpay', estado=estado, monto=Decimal(monto), orden_compra=orden,
+        )
+
+    def test_aplica_cambios_por_lotes_y_reporta_diferencias(self):
+        procesando = self.pago('procesando')
+        pendiente = self.pago('pendiente', orden='OC-2')
+        aprobado = self.pago('aprobado')
+        reembolsar = self.pago('aprobado', monto='5000')
+        distinto = self.pago('procesando')
+        archivo = io.StringIO(
+            'codigo_transaccion;orden_compra;monto;estado;codigo_autorizacion\n'
+            f'{procesando.codigo_transaccion};;15990;AUTHORIZED;123456\n'
+            ';OC-2;15990.00;FAILED;\n'
+            f'{aprobado.codigo_transaccion};;15990;AUTHORIZED;1\n'
+            f'{reembolsar.codigo_transaccion};;5000;REVERSED;\n'
+            f'{distinto.codigo_transaccion};;15000;AUTHORIZED;2\n'
+            'TRX-NOEXISTE;;100;AUTHORIZED;3\n'
+            f'{procesando.codigo_transaccion};;15990;AUTHORIZED;123456\n'
+            f'{aprobado.codigo_transaccion[:-1]}X;;15990;AUTHORIZED;1\n'
+        )
+        reporte = io.StringIO()
+        self.assertEqual(contadores.obtener()['pagos_aprobados'], 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            resumen = Conciliacion(tamano_lote=2, reporte=reporte).procesar_archivo(archivo, ';')
+
+        self.assertEqual(dict(resumen), {
+            'lineas': 8, 'aprobado': 1, 'rechazado': 1, 'reembolsado': 1, 'sin_cambios': 1,
+            'monto_distinto': 1, 'no_encontrado': 2, 'duplicado': 1, 'pedidos_confirmados': 1,
+        })
+        estados = dict(Pago.objects.values_list('pk', 'estado'))
+        self.assertEqual(estados[procesando.pk], 'aprobado')
+        self.assertEqual(estados[pendiente.pk], 'rechazado')
+        self.assertEqual(estados[reembolsar.pk], 'reembolsado')
+        self.assertEqual(estados[distinto.pk], 'procesando')
+        self.assertEqual(HistorialPago.objects.count(), 3)
+        self.assertIn('123456', HistorialPago.objects.get(pago=procesando).descripcion)
+        procesando.pedido.refresh_from_db()
+        self.assertEqual(procesando.pedido.estado, 'confirmado')
+        self.assertTrue(HistorialEstadoPedido.objects.filter(pedido=procesando.pedido).exists())
+        # +1 aprobado, -1 reembolsado
+        self.assertEqual(contadores.obtener()['pagos_aprobados'], 2)
+        self.assertEqual(contadores.contar_todos()['pagos_aprobados'], 2)
+
+        motivos = [fila.split(',')[2] for fila in reporte.getvalue().splitlines()[1:]]
+        self.assertEqual(sorted(motivos), ['duplicado', 'monto_distinto', 'no_encontrado', 'no_encontrado'])
+
+    def test_ajusta_contadores_al_confirmar(self):
+        pagos = [self.pago('procesando') for _ in range(3)]
+        archivo = io.StringIO('codigo_transaccion,monto,estado\n' + ''.join(
+            f'{pago.codigo_transaccion},15990,AUTHORIZED\n' for pago in pagos
+        ))
+        self.assertEqual(contadores.obtener()['pagos_aprobados'], 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Conciliacion(tamano_lote=2).procesar_archivo(archivo)
+
+        self.assertEqual(contadores.obtener()['pagos_aprobados'], 3)
+
+    def test_indice_por_rangos_de_id(self):
+        pagos = [self.pago('pendiente', orden=f'OC-{i}') for i in range(5)]
+
+        with self.assertNumQueries(3):
+            por_codigo, por_orden = indice_pagos(tamano_lote=2)
+
+        self.assertEqual({fila[0] for fila in por_codigo.values()}, {pago.pk for pago in pagos})
+        self.assertIs(por_orden['OC-4'], por_codigo[pagos[4].codigo_transaccion])
+
+    def test_simulacion_no_modifica(self):
+        pago = self.pago('procesando')
+        archivo = io.StringIO(f'codigo_transaccion,monto,estado\n{pago.codigo_transaccion},15990,AUTHORIZED\n')
+
+        resumen = Conciliacion(simular=True).procesar_archivo(archivo)
+
+        self.assertEqual(resumen['aprobado'], 1)
+        pago.refresh_from_db()
+        self.assertEqual(pago.estado, 'procesando')
+        self.assertFalse(HistorialPago.objects.exists())
+
+
+class IdempotenciaTest(PedidoClienteTestCase):
+    def crear(self, clave, **datos):
+        return self.client.post(
+            '/api/pagos/crear/', {'pedido_id': self.pedido.pk, **datos}, HTTP_IDEMPOTENCY_KEY=clave
+        )
+
+    def test_repite_la_respuesta_sin_ejecutar_la_vista(self):
+        primera = self.crear('compra-1')
+        segunda = self.crear('compra-1')
+        otra = self.crear('compra-2')
+
+        self.assertEqual((primera.status_code, segunda.status_code, otra.status_code), (201, 201, 200))
+        self.assertEqual(primera.content, segunda.content)
+        self.assertEqual(segunda['Idempotent-Replayed'], 'true')
+        self.assertFalse(otra.has_header('Idempotent-Replayed'))
+        self.assertEqual(Pago.objects.count(), 1)
+        self.assertEqual(self.crear('compra-1', metodo_pago='efectivo').status_code, 422)
+
+    def test_rechazo_csrf_no_se_repite(self):
+        navegador = Client(enforce_csrf_checks=True)
+        navegador.force_login(self.cliente)
+        rechazada = navegador.post(
+            '/api/pagos/crear/', {'pedido_id': self.pedido.pk}, HTTP_IDEMPOTENCY_KEY='compra-1'
+        )
+        reintento = self.crear('compra-1')
+
+        self.assertEqual((rechazada.status_code, reintento.status_code), (403, 201))
+        self.assertFalse(reintento.has_header('Idempotent-Replayed'))
+        self.assertEqual(Pago.objects.count(), 1)
+
+    def test_huella_canonica(self):
+        def huella(datos, **extra):
+            request = RequestFactory().post('/api/pagos/crear/', datos, **extra)
+            return IdempotenciaMiddleware.huella(request)
+
+        def multipart(boundary, datos):
+            return huella(encode_multipart(boundary, datos), content_type=f'multipart/form-data; boundary={boundary}')
+
+        # Cada envío del navegador trae otro boundary
+        self.assertEqual(
+            multipart('Boundary1', {'a': '1', 'b': ['2', '3']}),
+            multipart('Boundary2', {'b': ['2', '3'], 'a': '1'}),
+        )
+        self.assertNotEqual(huella({'a': '1'}), huella({'a': '2'}))
+        comprobante = lambda contenido: SimpleUploadedFile('boleta.pdf', contenido)
+        self.assertEqual(huella({'archivo': comprobante(b'x')}), huella({'archivo': comprobante(b'x')}))
+        self.assertNotEqual(huella({'archivo': comprobante(b'x')}), huella({'archivo': comprobante(b'y')}))
+        self.assertEqual(
+            huella('{"a": 1, "b": 2}', content_type='application/json'),
+            huella('{"b":2,"a":1}', content_type='application/json'),
+        )
+
+
+@override_settings(IDEMPOTENCIA_RUTAS=['/api/pagos/'])
+class IdempotenciaConcurrenteTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_los_duplicados_esperan_a_la_original(self):
+        ejecuciones = []
+
+        def vista_lenta(request):
+            ejecuciones.append(request)
+            time.sleep(0.3)
+            return JsonResponse({'pedido': len(ejecuciones)}, status=201)
+
+        middleware = IdempotenciaMiddleware(vista_lenta)
+        respuestas = []
+
+        def enviar():
+            request = RequestFactory().post('/api/pagos/crear/', {'pedido_id': 1}, HTTP_IDEMPOTENCY_KEY='k1')
+            request.user = AnonymousUser()
+            respuestas.append(middleware(request))
+
+        hilos = [threading.Thread(target=enviar) for _ in range(5)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        self.assertEqual(len(ejecuciones), 1)
+        self.assertEqual({(r.status_code, r.content) for r in respuestas}, {(201, b'{"pedido": 1}')})
+        self.assertEqual(sum(r.has_header('Idempotent-Replayed') for r in respuestas), 4)
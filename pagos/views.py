@@ -1,35 +1,74 @@
 from django.shortcuts import render, get_object_or_404
+from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse
+from django.urls import reverse
+from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
+from pedidos.models import Pedido
 from .models import Pago
+from .services import ServicioPagos
 
+@login_required
 @require_http_methods(["POST"])
 def crear_pago(request):
     """Crear un nuevo pago"""
-    # TODO: Implementar lógica de creación de pago
-    return JsonResponse({'message': 'Pago creado'}, status=201)
-
-@require_http_methods(["GET"])
-def verificar_pago(request, pk):
-    """Verificar estado de un pago"""
-    pago = get_object_or_404(Pago, pk=pk)
-    data = {
+    pedido = get_object_or_404(Pedido, pk=request.POST.get('pedido_id'), cliente=request.user)
+    metodo_pago = request.POST.get('metodo_pago', 'webpay')
+    if metodo_pago not in dict(Pago.METODO_PAGO):
+        return JsonResponse({'error': 'Método de pago inválido'}, status=400)
+    
+    pago, creado = ServicioPagos.crear_pago(pedido, metodo_pago)
+    return JsonResponse({
+        'message': 'Pago creado' if creado else 'El pedido ya tiene un pago',
         'id': pago.id,
         'codigo_transaccion': pago.codigo_transaccion,
         'estado': pago.estado,
-        'monto': float(pago.monto),
-        'metodo_pago': pago.metodo_pago,
-    }
+        'url_estado': reverse('pagos:verificar', args=[pago.id]),
+    }, status=201 if creado else 200)
+
+@login_required
+@require_http_methods(["GET"])
+def verificar_pago(request, pk):
+    """Verificar estado de un pago (el cliente consulta aquí mientras el worker habla con la pasarela)"""
+    data = ServicioPagos.datos_estado(pk, request.user)
+    if data is None:
+        return JsonResponse({'error': 'Pago no encontrado'}, status=404)
     return JsonResponse(data)
 
+@login_required
 @require_http_methods(["POST"])
 def iniciar_webpay(request):
-    """Iniciar proceso de pago con WebPay"""
-    # TODO: Implementar integración con WebPay
-    return JsonResponse({'message': 'WebPay iniciado'})
+    """Iniciar proceso de pago con WebPay (la transacción se crea en segundo plano)"""
+    pago = get_object_or_404(Pago, pk=request.POST.get('pago_id'), pedido__cliente=request.user)
+    url_retorno = request.build_absolute_uri(reverse('pagos:retorno_webpay'))
+    
+    if not ServicioPagos.iniciar_webpay(pago, url_retorno):
+        pago.refresh_from_db(fields=['estado'])
+    if pago.estado != 'procesando':
+        return JsonResponse({'error': f'El pago está {pago.get_estado_display().lower()}'}, status=400)
+    
+    return JsonResponse({
+        'message': 'WebPay iniciado',
+        'id': pago.id,
+        'estado': pago.estado,
+        'url_estado': reverse('pagos:verificar', args=[pago.id]),
+    }, status=202)
 
+@csrf_exempt
 @require_http_methods(["GET", "POST"])
 def retorno_webpay(request):
     """URL de retorno de WebPay"""
-    # TODO: Implementar lógica de retorno de WebPay
-    return JsonResponse({'message': 'Retorno de WebPay'})
\ No newline at end of file
+    datos = request.POST if request.method == 'POST' else request.GET
+    pago = ServicioPagos.registrar_retorno(
+        token_ws=datos.get('token_ws'), token_anulado=datos.get('TBK_TOKEN')
+    )
+    if pago is None:
+        return JsonResponse({'error': 'Transacción no encontrada'}, status=404)
+    
+    # La confirmación corre en el worker: el cliente sigue el estado del pago
+    return JsonResponse({
+        'message': 'Retorno de WebPay',
+        'id': pago.id,
+        'estado': pago.estado,
+        'url_estado': reverse('pagos:verificar', args=[pago.id]),
+    }, status=202)
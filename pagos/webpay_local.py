@@ -0,0 +1,151 @@
+# pagos/webpay_local.py
+"""
+Servidor HTTP local que imita la API REST de WebPay Plus, para tests y
+desarrollo sin credenciales ni red:
+
+    with ServidorWebpayLocal(retraso=0.5) as servidor:
+        with override_settings(WEBPAY_URL=servidor.url):
+            ...
+
+o `manage.py webpay_local` y WEBPAY_URL = 'http://127.0.0.1:8765'.
+
+Crear una transacción retorna un token y la URL del "formulario de pago";
+abrir esa URL redirige de inmediato al return_url con token_ws (como si el
+cliente hubiera pagado). Al confirmar, se aprueba salvo que
+`aprobar(monto)` retorne False. `retraso` demora cada respuesta de la API
+(pasarela lenta).
+"""
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+
+from .pasarela import RUTA_TRANSACCIONES
+
+RUTA_FORMULARIO = '/webpayserver/initTransaction'
+
+
+class _Manejador(BaseHTTPRequestHandler):
+    servidor_webpay = None  # se asigna por subclase en ServidorWebpayLocal
+
+    def log_message(self, *args):
+        pass
+
+    def _responder(self, estado, datos=None, cabeceras=None):
+        cuerpo = json.dumps(datos).encode() if datos is not None else b''
+        self.send_response(estado)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(cuerpo)))
+        for nombre, valor in (cabeceras or {}).items():
+            self.send_header(nombre, valor)
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def _api(self):
+        """Token de la ruta de la API ('' para la colección); None si ya se respondió con error"""
+        ruta = urlparse(self.path).path
+        if not ruta.startswith(RUTA_TRANSACCIONES):
+            self._responder(404, {'error_message': 'Not Found'})
+            return None
+        if not self.headers.get('Tbk-Api-Key-Id') or not self.headers.get('Tbk-Api-Key-Secret'):
+            self._responder(401, {'error_message': 'Not Authorized'})
+            return None
+        time.sleep(self.servidor_webpay.retraso)
+        return ruta[len(RUTA_TRANSACCIONES):].strip('/')
+
+    def do_POST(self):
+        token = self._api()
+        if token is None:
+            return
+        if token:
+            return self._responder(404, {'error_message': 'Not Found'})
+        datos = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)) or b'{}')
+        token = uuid.uuid4().hex
+        self.servidor_webpay.transacciones[token] = {
+            'buy_order': datos['buy_order'],
+            'session_id': datos['session_id'],
+            'amount': datos['amount'],
+            'return_url': datos['return_url'],
+            'status': 'INITIALIZED',
+        }
+        self._responder(200, {'token': token, 'url': self.servidor_webpay.url + RUTA_FORMULARIO})
+
+    def do_PUT(self):
+        token = self._api()
+        if token is None:
+            return
+        transaccion = self.servidor_webpay.transacciones.get(token)
+        if transaccion is None:
+            return self._responder(404, {'error_message': 'Transaction not found'})
+        with self.servidor_webpay.lock:
+            if transaccion['status'] != 'INITIALIZED':
+                return self._responder(422, {'error_message': 'Transaction already locked by another process'})
+            aprobada = self.servidor_webpay.aprobar(transaccion['amount'])
+            transaccion.update({
+                'status': 'AUTHORIZED' if aprobada else 'FAILED',
+                'response_code': 0 if aprobada else -1,
+                'authorization_code': f'{len(self.servidor_webpay.transacciones):06d}' if aprobada else '000000',
+                'vci': 'TSY',
+                'payment_type_code': 'VD',
+                'installments_number': 0,
+                'card_detail': {'card_number': '6623'},
+                'transaction_date': time.strftime('%Y-%m-%dT%H:%M:%S.000Z', time.gmtime()),
+            })
+        self._responder(200, self._publica(transaccion))
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == RUTA_FORMULARIO:
+            # "Formulario de pago": el cliente paga y vuelve al comercio
+            token = parse_qs(url.query).get('token_ws', [''])[0]
+            transaccion = self.servidor_webpay.transacciones.get(token)
+            if transaccion is None:
+                return self._responder(404, {'error_message': 'Transaction not found'})
+            destino = transaccion['return_url'] + '?' + urlencode({'token_ws': token})
+            return self._responder(302, cabeceras={'Location': destino})
+
+        token = self._api()
+        if token is None:
+            return
+        transaccion = self.servidor_webpay.transacciones.get(token)
+        if transaccion is None:
+            return self._responder(404, {'error_message': 'Transaction not found'})
+        self._responder(200, self._publica(transaccion))
+
+    @staticmethod
+    def _publica(transaccion):
+        return {clave: valor for clave, valor in transaccion.items() if clave != 'return_url'}
+
+
+class ServidorWebpayLocal:
+    def __init__(self, puerto=0, retraso=0, aprobar=None):
+        self.retraso = retraso
+        self.aprobar = aprobar or (lambda monto: True)
+        self.transacciones = {}
+        self.lock = threading.Lock()
+        manejador = type('Manejador', (_Manejador,), {'servidor_webpay': self})
+        self._http = ThreadingHTTPServer(('127.0.0.1', puerto), manejador)
+        self._http.daemon_threads = True
+        self._hilo = None
+
+    @property
+    def url(self):
+        host, puerto = self._http.server_address[:2]
+        return f'http://{host}:{puerto}'
+
+    def iniciar(self):
+        self._hilo = threading.Thread(target=self._http.serve_forever, name='webpay-local', daemon=True)
+        self._hilo.start()
+        return self
+
+    def detener(self):
+        self._http.shutdown()
+        self._http.server_close()
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *exc):
+        self.detener()
@@ -1,4 +1,6 @@
 from django.contrib import admin
+from django.db import transaction
+from django.utils import timezone
 from .models import Pedido, DetallePedido, HistorialEstadoPedido
 
 class DetallePedidoInline(admin.TabularInline):
@@ -40,24 +42,41 @@ class PedidoAdmin(admin.ModelAdmin):
     
     actions = ['marcar_confirmado', 'marcar_preparando', 'marcar_listo', 'marcar_completado']
     
+    def _marcar(self, queryset, estado, **campos):
+        """
+        Pasa los pedidos a `estado` uno a uno con save(update_fields): las
+        señales mantienen los resúmenes diarios, los contadores del sitio, la
+        caché de estadísticas y los puntos de fidelización (update() no las
+        dispara). Retorna cuántos cambiaron.
+        """
+        ids = list(queryset.exclude(estado=estado).values_list('pk', flat=True))
+        with transaction.atomic():
+            pedidos = list(Pedido.objects.select_for_update().filter(pk__in=ids).exclude(estado=estado))
+            for pedido in pedidos:
+                pedido.estado = estado
+                for campo, valor in campos.items():
+                    setattr(pedido, campo, valor)
+                pedido.save(update_fields=['estado', *campos])
+        return len(pedidos)
+    
     def marcar_confirmado(self, request, queryset):
-        queryset.update(estado='confirmado')
+        self._marcar(queryset, 'confirmado')
         self.message_user(request, "Pedidos marcados como confirmados")
     marcar_confirmado.short_description = "Marcar como Confirmado"
     
     def marcar_preparando(self, request, queryset):
-        queryset.update(estado='preparando')
+        self._marcar(queryset, 'preparando')
         self.message_user(request, "Pedidos marcados como en preparación")
     marcar_preparando.short_description = "Marcar como Preparando"
     
     def marcar_listo(self, request, queryset):
-        queryset.update(estado='listo')
+        self._marcar(queryset, 'listo')
         self.message_user(request, "Pedidos marcados como listos")
     marcar_listo.short_description = "Marcar como Listo"
     
     def marcar_completado(self, request, queryset):
-        from django.utils import timezone
-        queryset.update(estado='completado', fecha_completado=timezone.now())
+        # La señal de fidelización encola los puntos de los que recién se completan
+        self._marcar(queryset, 'completado', fecha_completado=timezone.now())
         self.message_user(request, "Pedidos marcados como completados")
     marcar_completado.short_description = "Marcar como Completado"
 
@@ -0,0 +1,36 @@
+# pedidos/management/commands/reconstruir_resumenes.py
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from pedidos import resumenes
+
+
+def _fecha(valor):
+    try:
+        return date.fromisoformat(valor)
+    except ValueError:
+        raise CommandError(f'Fecha inválida: {valor} (formato AAAA-MM-DD)')
+
+
+class Command(BaseCommand):
+    help = 'Recalcula los resúmenes diarios de ventas (ResumenVentasDiario, ResumenProductoDiario) desde los pedidos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--negocio', type=int, help='Solo los resúmenes de este negocio')
+        parser.add_argument('--desde', type=_fecha, help='Primera fecha a recalcular (AAAA-MM-DD)')
+        parser.add_argument('--hasta', type=_fecha, help='Última fecha a recalcular (AAAA-MM-DD)')
+        parser.add_argument('--lote', type=int, default=resumenes.TAMANO_LOTE, help='Filas por INSERT')
+
+    def handle(self, *args, **options):
+        if options['desde'] and options['hasta'] and options['desde'] > options['hasta']:
+            raise CommandError('--desde debe ser anterior a --hasta')
+
+        ventas, productos = resumenes.reconstruir(
+            negocio_id=options['negocio'],
+            desde=options['desde'],
+            hasta=options['hasta'],
+            tamano_lote=options['lote'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {ventas} resúmenes de ventas y {productos} de productos recalculados'
+        ))
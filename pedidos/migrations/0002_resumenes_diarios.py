@@ -0,0 +1,96 @@
+# Generated by Django 5.2.7 on 2026-10-18 10:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models.functions import TruncDate
+
+
+def calcular_resumenes(apps, schema_editor):
+    Pedido = apps.get_model('pedidos', 'Pedido')
+    DetallePedido = apps.get_model('pedidos', 'DetallePedido')
+    ResumenVentasDiario = apps.get_model('pedidos', 'ResumenVentasDiario')
+    ResumenProductoDiario = apps.get_model('pedidos', 'ResumenProductoDiario')
+
+    ventas = (
+        Pedido.objects.annotate(fecha=TruncDate('fecha_pedido'))
+        .values('negocio_id', 'fecha', 'estado', 'metodo_entrega')
+        .annotate(total_pedidos=models.Count('id'), total_ingresos=models.Sum('total'))
+        .order_by()
+    )
+    ResumenVentasDiario.objects.bulk_create(
+        (
+            ResumenVentasDiario(
+                negocio_id=fila['negocio_id'], fecha=fila['fecha'],
+                estado=fila['estado'], metodo_entrega=fila['metodo_entrega'],
+                pedidos=fila['total_pedidos'], ingresos=fila['total_ingresos'] or 0,
+            )
+            for fila in ventas.iterator()
+        ),
+        batch_size=1000,
+    )
+
+    productos = (
+        DetallePedido.objects.annotate(fecha=TruncDate('pedido__fecha_pedido'))
+        .values('pedido__negocio_id', 'fecha', 'producto_id')
+        .annotate(total_unidades=models.Sum('cantidad'), total_ingresos=models.Sum('subtotal'))
+        .order_by()
+    )
+    ResumenProductoDiario.objects.bulk_create(
+        (
+            ResumenProductoDiario(
+                negocio_id=fila['pedido__negocio_id'], fecha=fila['fecha'],
+                producto_id=fila['producto_id'],
+                unidades=fila['total_unidades'], ingresos=fila['total_ingresos'] or 0,
+            )
+            for fila in productos.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pedidos', '0001_initial'),
+        ('productos', '0005_reservastock'),
+        ('usuarios', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenProductoDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('unidades', models.IntegerField(default=0)),
+                ('ingresos', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('negocio', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumenes_productos', to='usuarios.negocio')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumenes_diarios', to='productos.producto')),
+            ],
+            options={
+                'verbose_name': 'Resumen de Producto Diario',
+                'verbose_name_plural': 'Resúmenes de Productos Diarios',
+                'ordering': ['-fecha'],
+                'unique_together': {('negocio', 'fecha', 'producto')},
+            },
+        ),
+        migrations.CreateModel(
+            name='ResumenVentasDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('confirmado', 'Confirmado'), ('preparando', 'Preparando'), ('listo', 'Listo para Retirar/Entregar'), ('en_camino', 'En Camino'), ('completado', 'Completado'), ('cancelado', 'Cancelado')], max_length=20)),
+                ('metodo_entrega', models.CharField(choices=[('pickup', 'Retiro en Tienda'), ('delivery', 'Entrega a Domicilio')], max_length=10)),
+                ('pedidos', models.IntegerField(default=0)),
+                ('ingresos', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('negocio', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumenes_ventas', to='usuarios.negocio')),
+            ],
+            options={
+                'verbose_name': 'Resumen de Ventas Diario',
+                'verbose_name_plural': 'Resúmenes de Ventas Diarios',
+                'ordering': ['-fecha'],
+                'unique_together': {('negocio', 'fecha', 'estado', 'metodo_entrega')},
+            },
+        ),
+        migrations.RunPython(calcular_resumenes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.2.7 on 2026-10-18 11:06
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import migrations, models
+
+# Copia de pedidos.prioridad al momento de la migración
+PLAZO_PREPARACION_HORAS = {'fresco': 2, 'refrigerado': 4, 'congelado': 6}
+
+
+def calcular_cola(apps, schema_editor):
+    """Clase y límite de preparación de los pedidos que aún están por preparar"""
+    Pedido = apps.get_model('pedidos', 'Pedido')
+    DetallePedido = apps.get_model('pedidos', 'DetallePedido')
+
+    detalles = DetallePedido.objects.filter(
+        pedido__estado__in=('pendiente', 'confirmado', 'preparando'),
+        producto__tipo_almacenamiento__in=PLAZO_PREPARACION_HORAS,
+    ).values_list('pedido_id', 'pedido__fecha_pedido', 'producto__tipo_almacenamiento', 'producto__vida_util_horas')
+
+    por_pedido = {}
+    for pedido_id, fecha_pedido, tipo, vida_util in detalles.iterator(chunk_size=1000):
+        horas = PLAZO_PREPARACION_HORAS[tipo]
+        if vida_util:
+            horas = min(horas, vida_util)
+        limite = fecha_pedido + timedelta(hours=horas)
+        if pedido_id not in por_pedido or limite < por_pedido[pedido_id][1]:
+            por_pedido[pedido_id] = (tipo, limite)
+
+    Pedido.objects.bulk_update(
+        [Pedido(pk=pk, clase_perecedero=tipo, limite_preparacion=limite) for pk, (tipo, limite) in por_pedido.items()],
+        ['clase_perecedero', 'limite_preparacion'],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pedidos', '0002_resumenes_diarios'),
+        ('productos', '0005_reservastock'),
+        ('usuarios', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pedido',
+            name='clase_perecedero',
+            field=models.CharField(blank=True, choices=[('ambiente', '🌡️ Temperatura Ambiente'), ('refrigerado', '❄️ Refrigerado (2-8°C)'), ('congelado', '🧊 Congelado (-18°C)'), ('fresco', '🥬 Fresco (caducidad corta)')], help_text='Almacenamiento del producto que fija el límite de preparación', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='pedido',
+            name='limite_preparacion',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(calcular_cola, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='pedido',
+            index=models.Index(fields=['negocio', 'estado', 'limite_preparacion'], name='pedido_cola_perecederos_idx'),
+        ),
+    ]
@@ -4,6 +4,9 @@ from usuarios.models import Usuario, Negocio
 from productos.models import Producto
 import uuid
 
+# Estados en que el pedido aún debe prepararse (cola de perecederos)
+ESTADOS_EN_PREPARACION = ('pendiente', 'confirmado', 'preparando')
+
 class Pedido(models.Model):
     ESTADO_CHOICES = [
         ('pendiente', 'Pendiente'),
@@ -47,6 +50,13 @@ class Pedido(models.Model):
     notas_cliente = models.TextField(blank=True)
     notas_internas = models.TextField(blank=True)
     
+    # Prioridad de preparación (se calcula al crear el pedido, ver pedidos/prioridad.py)
+    clase_perecedero = models.CharField(
+        max_length=20, blank=True, choices=Producto.TIPO_ALMACENAMIENTO_CHOICES,
+        help_text="Almacenamiento del producto que fija el límite de preparación"
+    )
+    limite_preparacion = models.DateTimeField(null=True, blank=True)
+    
     class Meta:
         verbose_name = 'Pedido'
         verbose_name_plural = 'Pedidos'
@@ -55,8 +65,26 @@ class Pedido(models.Model):
             models.Index(fields=['numero_pedido']),
             models.Index(fields=['cliente', 'estado']),
             models.Index(fields=['negocio', 'estado']),
+            # Cola de perecederos (pedidos.prioridad.cola). Índice normal y no
+            # parcial: MySQL no soporta índices con condición y Django lo omitiría
+            models.Index(
+                fields=['negocio', 'estado', 'limite_preparacion'],
+                name='pedido_cola_perecederos_idx',
+            ),
         ]
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Valores leídos, para que los resúmenes diarios descuenten solo lo que cambió
+        instance._guardado = tuple(
+            instance.__dict__.get(campo)
+            for campo in ('negocio_id', 'fecha_pedido', 'estado', 'metodo_entrega', 'total')
+        )
+        # Y el de `estado` para los contadores del sitio (administracion/signals.py)
+        instance._estado_guardado = instance.__dict__.get('estado')
+        return instance
+    
     def save(self, *args, **kwargs):
         if not self.numero_pedido:
             # Generar número de pedido único
@@ -83,6 +111,16 @@ class DetallePedido(models.Model):
         verbose_name = 'Detalle de Pedido'
         verbose_name_plural = 'Detalles de Pedidos'
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Valores leídos, para que los resúmenes diarios descuenten solo lo que cambió
+        instance._guardado = tuple(
+            instance.__dict__.get(campo)
+            for campo in ('pedido_id', 'producto_id', 'cantidad', 'subtotal')
+        )
+        return instance
+    
     def save(self, *args, **kwargs):
         self.subtotal = self.cantidad * self.precio_unitario
         super().save(*args, **kwargs)
@@ -104,4 +142,39 @@ class HistorialEstadoPedido(models.Model):
         ordering = ['-fecha']
     
     def __str__(self):
-        return f"{self.pedido.numero_pedido} - {self.estado_anterior} → {self.estado_nuevo}"
\ No newline at end of file
+        return f"{self.pedido.numero_pedido} - {self.estado_anterior} → {self.estado_nuevo}"
+
+class ResumenVentasDiario(models.Model):
+    """Pedidos e ingresos por día, estado y método de entrega (lo mantiene pedidos/resumenes.py)"""
+    negocio = models.ForeignKey(Negocio, on_delete=models.CASCADE, related_name='resumenes_ventas')
+    fecha = models.DateField()
+    estado = models.CharField(max_length=20, choices=Pedido.ESTADO_CHOICES)
+    metodo_entrega = models.CharField(max_length=10, choices=Pedido.METODO_ENTREGA)
+    pedidos = models.IntegerField(default=0)
+    ingresos = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    
+    class Meta:
+        verbose_name = 'Resumen de Ventas Diario'
+        verbose_name_plural = 'Resúmenes de Ventas Diarios'
+        unique_together = ['negocio', 'fecha', 'estado', 'metodo_entrega']
+        ordering = ['-fecha']
+    
+    def __str__(self):
+        return f"{self.negocio.nombre} {self.fecha} {self.estado}/{self.metodo_entrega}: {self.pedidos}"
+
+class ResumenProductoDiario(models.Model):
+    """Unidades e ingresos por día y producto (lo mantiene pedidos/resumenes.py)"""
+    negocio = models.ForeignKey(Negocio, on_delete=models.CASCADE, related_name='resumenes_productos')
+    fecha = models.DateField()
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='resumenes_diarios')
+    unidades = models.IntegerField(default=0)
+    ingresos = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    
+    class Meta:
+        verbose_name = 'Resumen de Producto Diario'
+        verbose_name_plural = 'Resúmenes de Productos Diarios'
+        unique_together = ['negocio', 'fecha', 'producto']
+        ordering = ['-fecha']
+    
+    def __str__(self):
+        return f"{self.negocio.nombre} {self.fecha} {self.producto.nombre}: {self.unidades}"
@@ -0,0 +1,98 @@
+# pedidos/prioridad.py
+"""
+Cola de preparación de pedidos con productos perecederos.
+
+Al crear el pedido se calcula una sola vez su clase de perecedero y su
+límite de preparación (fecha del pedido + el plazo más corto entre sus
+productos) y se guardan en Pedido.clase_perecedero / limite_preparacion.
+El dashboard lee la cola por el índice (negocio, estado,
+limite_preparacion): un rango por cada estado en preparación, ya ordenado
+por límite, así su costo no depende del historial de pedidos del negocio
+(los pedidos entregados o cancelados quedan en otros rangos del índice).
+No es un índice parcial porque MySQL no los soporta.
+"""
+from datetime import timedelta
+
+from django.db.models import BooleanField, ExpressionWrapper, F, Prefetch, Q
+from django.utils import timezone
+
+from .models import ESTADOS_EN_PREPARACION, Pedido, DetallePedido
+
+# Plazo máximo para preparar el pedido según el almacenamiento del producto;
+# si su vida útil es más corta, manda la vida útil
+PLAZO_PREPARACION_HORAS = {
+    'fresco': 2,
+    'refrigerado': 4,
+    'congelado': 6,
+}
+
+# Pasado este tiempo desde que se hizo el pedido, se marca urgente (la misma
+# regla que usaba el dashboard; el límite de preparación solo ordena la cola)
+URGENTE_TRAS = timedelta(hours=1)
+
+
+def plazo(tipo_almacenamiento, vida_util_horas=None):
+    """Plazo de preparación de un producto (None si no es perecedero)"""
+    horas = PLAZO_PREPARACION_HORAS.get(tipo_almacenamiento)
+    if horas is None:
+        return None
+    if vida_util_horas:
+        horas = min(horas, vida_util_horas)
+    return timedelta(hours=horas)
+
+
+def clasificar(productos):
+    """(clase_perecedero, plazo) del producto más urgente; ('', None) si no hay perecederos"""
+    clase, menor = '', None
+    for producto in productos:
+        actual = plazo(producto.tipo_almacenamiento, producto.vida_util_horas)
+        if actual is not None and (menor is None or actual < menor):
+            clase, menor = producto.tipo_almacenamiento, actual
+    return clase, menor
+
+
+def campos_pedido(productos, fecha_pedido):
+    """Valores de clase_perecedero y limite_preparacion para crear el pedido"""
+    clase, menor = clasificar(productos)
+    return {
+        'clase_perecedero': clase,
+        'limite_preparacion': fecha_pedido + menor if menor is not None else None,
+    }
+
+
+def registrar_detalle(detalle):
+    """
+    Adelanta el límite del pedido si el producto del detalle lo exige (un
+    UPDATE condicional, sin leer el pedido). Para pedidos cuyos detalles se
+    crean uno a uno; Carrito.convertir_a_pedido usa campos_pedido().
+    """
+    producto = detalle.producto
+    menor = plazo(producto.tipo_almacenamiento, producto.vida_util_horas)
+    if menor is None:
+        return
+    limite = F('fecha_pedido') + menor
+    Pedido.objects.filter(
+        Q(limite_preparacion__isnull=True) | Q(limite_preparacion__gt=limite), pk=detalle.pedido_id,
+    ).update(clase_perecedero=producto.tipo_almacenamiento, limite_preparacion=limite)
+
+
+def cola(negocio=None, ahora=None):
+    """
+    Pedidos en preparación con perecederos, del límite más próximo al más
+    lejano, con `es_urgente` (más de URGENTE_TRAS desde el pedido) calculado
+    en la query y los detalles perecederos precargados.
+    """
+    ahora = ahora or timezone.now()
+    pedidos = Pedido.objects.filter(estado__in=ESTADOS_EN_PREPARACION, limite_preparacion__isnull=False)
+    if negocio is not None:
+        pedidos = pedidos.filter(negocio=negocio)
+    return pedidos.annotate(
+        es_urgente=ExpressionWrapper(
+            Q(fecha_pedido__lt=ahora - URGENTE_TRAS), output_field=BooleanField()
+        ),
+    ).select_related('cliente').prefetch_related(
+        Prefetch(
+            'items',
+            queryset=DetallePedido.objects.exclude(producto__tipo_almacenamiento='ambiente').select_related('producto'),
+        ),
+    ).order_by('limite_preparacion', 'id')
@@ -0,0 +1,283 @@
+# pedidos/resumenes.py
+"""
+Resúmenes diarios de ventas por negocio.
+
+ResumenVentasDiario acumula pedidos e ingresos por (fecha, estado, método de
+entrega) y ResumenProductoDiario unidades e ingresos por (fecha, producto).
+Se mantienen de forma incremental desde pedidos/signals.py (y desde
+Carrito.convertir_a_pedido, que crea los detalles con bulk_create), así los
+reportes leen a lo más una fila por día y combinación sin recorrer Pedido.
+`manage.py reconstruir_resumenes` los recalcula desde cero.
+"""
+from datetime import datetime, time, timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Pedido, DetallePedido, ResumenVentasDiario, ResumenProductoDiario
+
+TAMANO_LOTE = 1000
+
+
+def fecha_local(momento):
+    return timezone.localdate(momento) if timezone.is_aware(momento) else momento.date()
+
+
+def _sumar(modelo, claves, valores):
+    """UPDATE ... SET campo = campo + valor sobre la fila `claves`, creándola si no existe."""
+    incrementos = {campo: F(campo) + valor for campo, valor in valores.items()}
+    if modelo.objects.filter(**claves).update(**incrementos):
+        return
+    try:
+        with transaction.atomic():
+            modelo.objects.create(**claves, **valores)
+    except IntegrityError:
+        # Otro proceso creó la fila entre el UPDATE y el INSERT
+        modelo.objects.filter(**claves).update(**incrementos)
+
+
+def _restar(modelo, claves, valores):
+    # Nunca crea filas: si no existe (resúmenes sin reconstruir, o el negocio
+    # se está borrando en cascada) no hay nada que descontar
+    modelo.objects.filter(**claves).update(**{campo: F(campo) - valor for campo, valor in valores.items()})
+
+
+# ============================================================
+# ACTUALIZACIÓN INCREMENTAL
+# ============================================================
+# Un "aporte" es (claves de la fila de resumen, cantidad, ingresos). Los
+# modelos guardan en from_db() los valores leídos (_guardado), así al
+# modificar un pedido o detalle se descuenta lo anterior y se suma lo nuevo.
+
+CAMPOS_PEDIDO = ('negocio_id', 'fecha_pedido', 'estado', 'metodo_entrega', 'total')
+CAMPOS_DETALLE = ('pedido_id', 'producto_id', 'cantidad', 'subtotal')
+
+
+def _aporte_pedido(negocio_id, fecha_pedido, estado, metodo_entrega, total):
+    claves = {
+        'negocio_id': negocio_id,
+        'fecha': fecha_local(fecha_pedido),
+        'estado': estado,
+        'metodo_entrega': metodo_entrega,
+    }
+    return claves, 1, total
+
+
+def aporte_pedido(pedido, guardado=False):
+    """Aporte del pedido a ResumenVentasDiario (con guardado=True, el de sus valores en BD)"""
+    if not guardado:
+        return _aporte_pedido(*(getattr(pedido, campo) for campo in CAMPOS_PEDIDO))
+    valores = getattr(pedido, '_guardado', None)
+    if valores is None or None in valores:
+        valores = Pedido.objects.filter(pk=pedido.pk).values_list(*CAMPOS_PEDIDO).first()
+    return _aporte_pedido(*valores) if valores else None
+
+
+def _aporte_detalle(negocio_id, fecha, producto_id, cantidad, subtotal):
+    claves = {'negocio_id': negocio_id, 'fecha': fecha, 'producto_id': producto_id}
+    return claves, cantidad, subtotal
+
+
+def aporte_detalle(detalle, guardado=False):
+    """Aporte del detalle a ResumenProductoDiario (con guardado=True, el de sus valores en BD)"""
+    if not guardado:
+        valores = tuple(getattr(detalle, campo) for campo in CAMPOS_DETALLE)
+    else:
+        valores = getattr(detalle, '_guardado', None)
+        if valores is None or None in valores:
+            valores = DetallePedido.objects.filter(pk=detalle.pk).values_list(*CAMPOS_DETALLE).first()
+        if not valores:
+            return None
+
+    pedido_id, producto_id, cantidad, subtotal = valores
+    if DetallePedido.pedido.is_cached(detalle) and detalle.pedido_id == pedido_id:
+        negocio_id, fecha_pedido = detalle.pedido.negocio_id, detalle.pedido.fecha_pedido
+    else:
+        datos = Pedido.objects.filter(pk=pedido_id).values_list('negocio_id', 'fecha_pedido').first()
+        if datos is None:
+            return None
+        negocio_id, fecha_pedido = datos
+    return _aporte_detalle(negocio_id, fecha_local(fecha_pedido), producto_id, cantidad, subtotal)
+
+
+def registrar_pedido(pedido, anterior=None):
+    """
+    Aplica al resumen la diferencia entre `anterior` (aporte guardado antes,
+    o None si el pedido es nuevo) y los valores actuales del pedido.
+    """
+    actual = aporte_pedido(pedido)
+    if anterior == actual:
+        return
+    if anterior is not None:
+        descontar_pedido(anterior)
+    claves, pedidos, ingresos = actual
+    _sumar(ResumenVentasDiario, claves, {'pedidos': pedidos, 'ingresos': ingresos})
+
+
+def descontar_pedido(aporte):
+    claves, pedidos, ingresos = aporte
+    _restar(ResumenVentasDiario, claves, {'pedidos': pedidos, 'ingresos': ingresos})
+
+
+def registrar_detalle(detalle, anterior=None):
+    actual = aporte_detalle(detalle)
+    if actual is None or anterior == actual:
+        return
+    if anterior is not None:
+        descontar_detalle(anterior)
+    claves, unidades, ingresos = actual
+    _sumar(ResumenProductoDiario, claves, {'unidades': unidades, 'ingresos': ingresos})
+
+
+def descontar_detalle(aporte):
+    claves, unidades, ingresos = aporte
+    _restar(ResumenProductoDiario, claves, {'unidades': unidades, 'ingresos': ingresos})
+
+
+def registrar_detalles(pedido, detalles):
+    """Suma al resumen por producto los detalles nuevos de un pedido (p. ej. tras bulk_create)."""
+    fecha = fecha_local(pedido.fecha_pedido)
+    for detalle in detalles:
+        claves, unidades, ingresos = _aporte_detalle(
+            pedido.negocio_id, fecha, detalle.producto_id, detalle.cantidad, detalle.subtotal
+        )
+        _sumar(ResumenProductoDiario, claves, {'unidades': unidades, 'ingresos': ingresos})
+
+
+# ============================================================
+# RECONSTRUCCIÓN
+# ============================================================
+
+def _rango(desde, hasta):
+    """Límites [inicio, fin) en hora local para filtrar fecha_pedido por índice"""
+    inicio = timezone.make_aware(datetime.combine(desde, time.min)) if desde else None
+    fin = timezone.make_aware(datetime.combine(hasta + timedelta(days=1), time.min)) if hasta else None
+    return inicio, fin
+
+
+def reconstruir(negocio_id=None, desde=None, hasta=None, tamano_lote=TAMANO_LOTE):
+    """
+    Borra y recalcula los resúmenes (opcionalmente de un negocio y/o un rango
+    de fechas) con dos GROUP BY. Retorna (filas de ventas, filas de productos).
+    """
+    inicio, fin = _rango(desde, hasta)
+
+    pedidos = Pedido.objects.all()
+    detalles = DetallePedido.objects.all()
+    ventas = ResumenVentasDiario.objects.all()
+    productos = ResumenProductoDiario.objects.all()
+    if negocio_id is not None:
+        pedidos = pedidos.filter(negocio_id=negocio_id)
+        detalles = detalles.filter(pedido__negocio_id=negocio_id)
+        ventas = ventas.filter(negocio_id=negocio_id)
+        productos = productos.filter(negocio_id=negocio_id)
+    if inicio:
+        pedidos = pedidos.filter(fecha_pedido__gte=inicio)
+        detalles = detalles.filter(pedido__fecha_pedido__gte=inicio)
+        ventas = ventas.filter(fecha__gte=desde)
+        productos = productos.filter(fecha__gte=desde)
+    if fin:
+        pedidos = pedidos.filter(fecha_pedido__lt=fin)
+        detalles = detalles.filter(pedido__fecha_pedido__lt=fin)
+        ventas = ventas.filter(fecha__lte=hasta)
+        productos = productos.filter(fecha__lte=hasta)
+
+    filas_ventas = (
+        pedidos.annotate(fecha=TruncDate('fecha_pedido'))
+        .values('negocio_id', 'fecha', 'estado', 'metodo_entrega')
+        .annotate(total_pedidos=Count('id'), total_ingresos=Sum('total'))
+        .order_by()
+    )
+    filas_productos = (
+        detalles.annotate(fecha=TruncDate('pedido__fecha_pedido'))
+        .values('pedido__negocio_id', 'fecha', 'producto_id')
+        .annotate(total_unidades=Sum('cantidad'), total_ingresos=Sum('subtotal'))
+        .order_by()
+    )
+
+    with transaction.atomic():
+        ventas.delete()
+        productos.delete()
+        ResumenVentasDiario.objects.bulk_create(
+            (
+                ResumenVentasDiario(
+                    negocio_id=fila['negocio_id'], fecha=fila['fecha'],
+                    estado=fila['estado'], metodo_entrega=fila['metodo_entrega'],
+                    pedidos=fila['total_pedidos'], ingresos=fila['total_ingresos'] or 0,
+                )
+                for fila in filas_ventas.iterator()
+            ),
+            batch_size=tamano_lote,
+        )
+        ResumenProductoDiario.objects.bulk_create(
+            (
+                ResumenProductoDiario(
+                    negocio_id=fila['pedido__negocio_id'], fecha=fila['fecha'],
+                    producto_id=fila['producto_id'],
+                    unidades=fila['total_unidades'], ingresos=fila['total_ingresos'] or 0,
+                )
+                for fila in filas_productos.iterator()
+            ),
+            batch_size=tamano_lote,
+        )
+
+    return ventas.count(), productos.count()
+
+
+# ============================================================
+# LECTURA
+# ============================================================
+
+def reporte(negocio, dias=30, top_productos=10):
+    """
+    Reporte de los últimos `dias` días (incluido hoy) leído solo desde los
+    resúmenes: totales, desglose por estado y método de entrega, serie diaria
+    y productos más vendidos.
+    """
+    hasta = timezone.localdate()
+    desde = hasta - timedelta(days=dias - 1)
+
+    ventas = ResumenVentasDiario.objects.filter(negocio=negocio, fecha__gte=desde, fecha__lte=hasta)
+    productos = ResumenProductoDiario.objects.filter(negocio=negocio, fecha__gte=desde, fecha__lte=hasta)
+
+    totales = ventas.aggregate(total_pedidos=Sum('pedidos'), total_ingresos=Sum('ingresos'))
+    unidades = productos.aggregate(total=Sum('unidades'))['total']
+
+    etiquetas_estado = dict(Pedido.ESTADO_CHOICES)
+    etiquetas_metodo = dict(Pedido.METODO_ENTREGA)
+
+    return {
+        'desde': desde,
+        'hasta': hasta,
+        'dias': dias,
+        'ventas': totales['total_ingresos'] or 0,
+        'pedidos': totales['total_pedidos'] or 0,
+        'productos_vendidos': unidades or 0,
+        'por_estado': [
+            {'estado': fila['estado'], 'nombre': etiquetas_estado.get(fila['estado'], fila['estado']),
+             'pedidos': fila['total_pedidos'], 'ingresos': fila['total_ingresos']}
+            for fila in ventas.values('estado').annotate(
+                total_pedidos=Sum('pedidos'), total_ingresos=Sum('ingresos')
+            ).filter(total_pedidos__gt=0).order_by('-total_pedidos')
+        ],
+        'por_metodo_entrega': [
+            {'metodo_entrega': fila['metodo_entrega'],
+             'nombre': etiquetas_metodo.get(fila['metodo_entrega'], fila['metodo_entrega']),
+             'pedidos': fila['total_pedidos'], 'ingresos': fila['total_ingresos']}
+            for fila in ventas.values('metodo_entrega').annotate(
+                total_pedidos=Sum('pedidos'), total_ingresos=Sum('ingresos')
+            ).filter(total_pedidos__gt=0).order_by('-total_pedidos')
+        ],
+        'por_dia': list(
+            ventas.values('fecha').annotate(
+                total_pedidos=Sum('pedidos'), total_ingresos=Sum('ingresos')
+            ).order_by('fecha')
+        ),
+        'top_productos': list(
+            productos.values('producto_id', 'producto__nombre').annotate(
+                total_unidades=Sum('unidades'), total_ingresos=Sum('ingresos')
+            ).filter(total_unidades__gt=0).order_by('-total_unidades')[:top_productos]
+        ),
+    }
@@ -0,0 +1,84 @@
+from datetime import datetime, time, timedelta
+
+from django.core.cache import cache
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from productos.models import Producto
+from .models import Pedido
+
+
+class EstadisticasPedidos:
+    """Contadores de pedidos y productos de un negocio para los paneles del comerciante.
+
+    Todo se calcula con agregación condicional: una query sobre Pedido y otra
+    sobre Producto, en vez de un COUNT por estado. El resultado queda en caché
+    por negocio y se invalida desde pedidos/signals.py al guardar o borrar un
+    Pedido o un Producto del negocio.
+    """
+
+    ESTADOS_EN_CURSO = ['pendiente', 'confirmado', 'preparando']
+    ESTADOS_VENTA = ['completado', 'listo', 'en_camino']
+    UMBRAL_STOCK_BAJO = 10
+    DURACION_CACHE = 60 * 10
+
+    @staticmethod
+    def clave(negocio_id):
+        # La fecha es parte de la clave: `pedidos_hoy` y `ventas_mes` se
+        # renuevan solos al cambiar el día
+        return f'estadisticas_pedidos:{negocio_id}:{timezone.localdate().isoformat()}'
+
+    @classmethod
+    def de_negocio(cls, negocio):
+        """Estadísticas del negocio, desde caché si están vigentes"""
+        negocio_id = getattr(negocio, 'pk', negocio)
+        clave = cls.clave(negocio_id)
+        stats = cache.get(clave)
+        if stats is None:
+            stats = cls.calcular(negocio_id)
+            cache.set(clave, stats, cls.DURACION_CACHE)
+        return stats
+
+    @classmethod
+    def invalidar(cls, negocio_id):
+        cache.delete(cls.clave(negocio_id))
+
+    @classmethod
+    def calcular(cls, negocio_id):
+        """
+        Retorna un dict con:
+        - por_estado: {'all': n, 'pendiente': n, ...} (todos los estados)
+        - total_pedidos, pedidos_pendientes (en curso), pedidos_hoy, ventas_mes
+        - total_productos (activos), productos_stock_bajo
+        """
+        hoy = timezone.localdate()
+        inicio_dia = timezone.make_aware(datetime.combine(hoy, time.min))
+        fin_dia = inicio_dia + timedelta(days=1)
+        inicio_mes = inicio_dia.replace(day=1)
+
+        conteos = {
+            estado: Count('id', filter=Q(estado=estado))
+            for estado, _ in Pedido.ESTADO_CHOICES
+        }
+        pedidos = Pedido.objects.filter(negocio_id=negocio_id).aggregate(
+            todos=Count('id'),
+            en_curso=Count('id', filter=Q(estado__in=cls.ESTADOS_EN_CURSO)),
+            hoy=Count('id', filter=Q(fecha_pedido__gte=inicio_dia, fecha_pedido__lt=fin_dia)),
+            ventas_mes=Sum('total', filter=Q(fecha_pedido__gte=inicio_mes, estado__in=cls.ESTADOS_VENTA)),
+            **conteos
+        )
+
+        productos = Producto.objects.filter(negocio_id=negocio_id).aggregate(
+            activos=Count('id', filter=Q(activo=True)),
+            stock_bajo=Count('id', filter=Q(stock__lte=cls.UMBRAL_STOCK_BAJO, stock__gt=0)),
+        )
+
+        return {
+            'por_estado': {'all': pedidos['todos'], **{estado: pedidos[estado] for estado in conteos}},
+            'total_pedidos': pedidos['todos'],
+            'pedidos_pendientes': pedidos['en_curso'],
+            'pedidos_hoy': pedidos['hoy'],
+            'ventas_mes': pedidos['ventas_mes'] or 0,
+            'total_productos': productos['activos'],
+            'productos_stock_bajo': productos['stock_bajo'],
+        }
@@ -0,0 +1,77 @@
+# pedidos/signals.py
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from productos.models import Producto
+from .models import Pedido, DetallePedido
+from .services import EstadisticasPedidos
+from . import prioridad, resumenes
+
+
+@receiver(post_save, sender=Pedido)
+@receiver(post_delete, sender=Pedido)
+@receiver(post_save, sender=Producto)
+@receiver(post_delete, sender=Producto)
+def invalidar_estadisticas(sender, instance, **kwargs):
+    """Invalidar las estadísticas en caché del negocio (al confirmar la transacción)"""
+    negocio_id = instance.negocio_id
+    transaction.on_commit(lambda: EstadisticasPedidos.invalidar(negocio_id))
+
+
+# ============================================================
+# RESÚMENES DIARIOS
+# ============================================================
+
+CAMPOS_RESUMEN_PEDIDO = ('negocio', 'negocio_id', 'estado', 'metodo_entrega', 'total')
+
+
+def _toca(update_fields, campos):
+    return update_fields is None or bool(set(update_fields) & set(campos))
+
+
+@receiver(pre_save, sender=Pedido)
+def guardar_aporte_pedido(sender, instance, update_fields=None, **kwargs):
+    instance._aporte_anterior = None
+    if not instance._state.adding and _toca(update_fields, CAMPOS_RESUMEN_PEDIDO):
+        instance._aporte_anterior = resumenes.aporte_pedido(instance, guardado=True)
+
+
+@receiver(post_save, sender=Pedido)
+def actualizar_resumen_pedido(sender, instance, created, update_fields=None, **kwargs):
+    if created or _toca(update_fields, CAMPOS_RESUMEN_PEDIDO):
+        resumenes.registrar_pedido(instance, getattr(instance, '_aporte_anterior', None))
+        instance._guardado = tuple(getattr(instance, campo) for campo in resumenes.CAMPOS_PEDIDO)
+
+
+@receiver(pre_delete, sender=Pedido)
+def descontar_resumen_pedido(sender, instance, **kwargs):
+    # Dentro de la transacción del delete: si este falla, el descuento se revierte
+    aporte = resumenes.aporte_pedido(instance, guardado=True)
+    if aporte is not None:
+        resumenes.descontar_pedido(aporte)
+
+
+@receiver(pre_save, sender=DetallePedido)
+def guardar_aporte_detalle(sender, instance, **kwargs):
+    instance._aporte_anterior = None
+    if not instance._state.adding:
+        instance._aporte_anterior = resumenes.aporte_detalle(instance, guardado=True)
+
+
+@receiver(post_save, sender=DetallePedido)
+def actualizar_resumen_detalle(sender, instance, **kwargs):
+    resumenes.registrar_detalle(instance, getattr(instance, '_aporte_anterior', None))
+    instance._guardado = tuple(getattr(instance, campo) for campo in resumenes.CAMPOS_DETALLE)
+
+
+@receiver(post_save, sender=DetallePedido)
+def actualizar_prioridad(sender, instance, created, **kwargs):
+    if created:
+        prioridad.registrar_detalle(instance)
+
+
+@receiver(pre_delete, sender=DetallePedido)
+def descontar_resumen_detalle(sender, instance, **kwargs):
+    aporte = resumenes.aporte_detalle(instance, guardado=True)
+    if aporte is not None:
+        resumenes.descontar_detalle(aporte)
@@ -1,3 +1,259 @@
-from django.test import TestCase
+import threading
+from datetime import timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+
+from administracion import contadores
+
+from carrito.models import Carrito, ItemCarrito
+from pedidos import resumenes
+from pedidos.models import Pedido, DetallePedido, ResumenVentasDiario, ResumenProductoDiario
+from productos.models import Producto
+from tareas.models import Tarea
+from usuarios.models import Usuario, Negocio
+
+
+def crear_negocio():
+    comerciante = Usuario.objects.create(username='comerciante', tipo_usuario='comerciante')
+    return Negocio.objects.create(
+        propietario=comerciante,
+        nombre='Almacén Test',
+        direccion='Camino Rural Km 5',
+        telefono='+56912345678',
+        email='almacen@test.cl',
+        horario_apertura='08:00',
+        horario_cierre='20:00',
+        dias_atencion='Lunes a Sábado',
+    )
+
+
+def crear_carrito(usuario, negocio, producto, cantidad):
+    carrito = Carrito.objects.create(usuario=usuario, negocio=negocio)
+    ItemCarrito.objects.create(
+        carrito=carrito, producto=producto, cantidad=cantidad, precio_unitario=producto.precio_actual
+    )
+    return carrito
+
+
+class ConvertirAPedidoTest(TestCase):
+    def setUp(self):
+        self.negocio = crear_negocio()
+        self.cliente = Usuario.objects.create(username='cliente', telefono='+56987654321')
+        self.leche = Producto.objects.create(
+            negocio=self.negocio, codigo='LEC-1', nombre='Leche',
+            precio=Decimal('1000'), stock=10, tipo_almacenamiento='refrigerado',
+        )
+        self.arroz = Producto.objects.create(
+            negocio=self.negocio, codigo='ARR-1', nombre='Arroz', precio=Decimal('1500'), stock=3,
+        )
+
+    def test_crea_pedido_con_totales_y_descuenta_stock(self):
+        carrito = crear_carrito(self.cliente, self.negocio, self.leche, 2)
+        ItemCarrito.objects.create(carrito=carrito, producto=self.arroz, cantidad=3, precio_unitario=Decimal('1500'))
+
+        pedido = carrito.convertir_a_pedido(metodo_entrega='pickup')
+
+        self.assertEqual(pedido.total, Decimal('6500'))
+        self.assertEqual(pedido.subtotal, Decimal('6500'))
+        self.assertEqual(pedido.telefono_contacto, '+56987654321')
+        self.assertIn('Leche', pedido.notas_internas)
+        self.assertEqual(
+            sorted(DetallePedido.objects.filter(pedido=pedido).values_list('subtotal', flat=True)),
+            [Decimal('2000'), Decimal('4500')],
+        )
+        self.leche.refresh_from_db()
+        self.arroz.refresh_from_db()
+        self.assertEqual((self.leche.stock, self.arroz.stock), (8, 0))
+        carrito.refresh_from_db()
+        self.assertFalse(carrito.activo)
+        self.assertFalse(carrito.items.exists())
+
+    def test_calcula_clase_y_limite_de_preparacion(self):
+        lechuga = Producto.objects.create(
+            negocio=self.negocio, codigo='LCH-1', nombre='Lechuga', precio=Decimal('800'), stock=5,
+            tipo_almacenamiento='fresco', vida_util_horas=1,
+        )
+        carrito = crear_carrito(self.cliente, self.negocio, self.leche, 1)
+        ItemCarrito.objects.create(carrito=carrito, producto=lechuga, cantidad=1, precio_unitario=Decimal('800'))
+
+        pedido = Pedido.objects.get(pk=carrito.convertir_a_pedido(metodo_entrega='pickup').pk)
+
+        self.assertEqual(pedido.clase_perecedero, 'fresco')
+        self.assertAlmostEqual(
+            pedido.limite_preparacion, pedido.fecha_pedido + timedelta(hours=1), delta=timedelta(seconds=5)
+        )
+
+        # Un detalle agregado después solo adelanta el límite si es más urgente
+        DetallePedido.objects.create(pedido=pedido, producto=self.leche, cantidad=1, precio_unitario=Decimal('1000'))
+        pedido.refresh_from_db()
+        self.assertEqual(pedido.clase_perecedero, 'fresco')
+
+        sin_perecederos = crear_carrito(self.cliente, self.negocio, self.arroz, 1).convertir_a_pedido(metodo_entrega='pickup')
+        self.assertIsNone(sin_perecederos.limite_preparacion)
+
+    def test_indice_de_la_cola_existe_en_la_bd(self):
+        with connection.cursor() as cursor:
+            restricciones = connection.introspection.get_constraints(cursor, Pedido._meta.db_table)
+
+        self.assertEqual(
+            restricciones['pedido_cola_perecederos_idx']['columns'],
+            ['negocio_id', 'estado', 'limite_preparacion'],
+        )
+
+    def test_stock_insuficiente_no_deja_cambios(self):
+        carrito = crear_carrito(self.cliente, self.negocio, self.leche, 2)
+        ItemCarrito.objects.create(carrito=carrito, producto=self.arroz, cantidad=4, precio_unitario=Decimal('1500'))
+
+        with self.assertRaisesMessage(ValueError, 'Stock insuficiente para Arroz'):
+            carrito.convertir_a_pedido(metodo_entrega='pickup')
+
+        self.leche.refresh_from_db()
+        self.assertEqual(self.leche.stock, 10)
+        self.assertFalse(Pedido.objects.exists())
+        self.assertTrue(Carrito.objects.get(pk=carrito.pk).activo)
+
+    def test_carrito_ya_procesado(self):
+        carrito = crear_carrito(self.cliente, self.negocio, self.leche, 1)
+        carrito.convertir_a_pedido(metodo_entrega='pickup')
+
+        with self.assertRaisesMessage(ValueError, 'El carrito ya fue procesado'):
+            carrito.convertir_a_pedido(metodo_entrega='pickup')
+        self.assertEqual(Pedido.objects.count(), 1)
+
+
+class ResumenesDiariosTest(TestCase):
+    def setUp(self):
+        self.negocio = crear_negocio()
+        self.cliente = Usuario.objects.create(username='cliente')
+        self.pan = Producto.objects.create(
+            negocio=self.negocio, codigo='PAN-1', nombre='Pan', precio=Decimal('500'), stock=100,
+        )
+
+    def resumen_ventas(self):
+        return {
+            (fila.estado, fila.metodo_entrega): (fila.pedidos, fila.ingresos)
+            for fila in ResumenVentasDiario.objects.filter(negocio=self.negocio).exclude(pedidos=0)
+        }
+
+    def resumen_productos(self):
+        return dict(
+            ResumenProductoDiario.objects.filter(negocio=self.negocio).exclude(unidades=0)
+            .values_list('producto_id', 'unidades')
+        )
+
+    def test_se_mantienen_al_crear_cambiar_y_borrar(self):
+        carrito = crear_carrito(self.cliente, self.negocio, self.pan, 3)
+        pedido = carrito.convertir_a_pedido(metodo_entrega='pickup')
+        self.assertEqual(self.resumen_ventas(), {('pendiente', 'pickup'): (1, Decimal('1500'))})
+        self.assertEqual(self.resumen_productos(), {self.pan.pk: 3})
+
+        pedido = Pedido.objects.get(pk=pedido.pk)
+        pedido.estado = 'confirmado'
+        pedido.save()
+        self.assertEqual(self.resumen_ventas(), {('confirmado', 'pickup'): (1, Decimal('1500'))})
+
+        detalle = pedido.items.get()
+        detalle.cantidad = 5
+        detalle.save()
+        self.assertEqual(self.resumen_productos(), {self.pan.pk: 5})
+
+        pedido.delete()
+        self.assertEqual(self.resumen_ventas(), {})
+        self.assertEqual(self.resumen_productos(), {})
+
+    def test_reconstruir_coincide_con_incremental(self):
+        for metodo in ('pickup', 'delivery', 'pickup'):
+            crear_carrito(self.cliente, self.negocio, self.pan, 2).convertir_a_pedido(metodo_entrega=metodo)
+        Pedido.objects.filter(metodo_entrega='delivery').get().delete()
+        incremental = (self.resumen_ventas(), self.resumen_productos())
+
+        resumenes.reconstruir()
+
+        self.assertEqual((self.resumen_ventas(), self.resumen_productos()), incremental)
+        self.assertEqual(incremental[0], {('pendiente', 'pickup'): (2, Decimal('2000'))})
+
+    def test_reporte_solo_lee_resumenes(self):
+        crear_carrito(self.cliente, self.negocio, self.pan, 4).convertir_a_pedido(metodo_entrega='pickup')
+
+        with self.assertNumQueries(6):
+            reporte = resumenes.reporte(self.negocio, dias=365)
+
+        self.assertEqual(reporte['pedidos'], 1)
+        self.assertEqual(reporte['ventas'], Decimal('2000'))
+        self.assertEqual(reporte['productos_vendidos'], 4)
+        self.assertEqual(reporte['top_productos'][0]['producto__nombre'], 'Pan')
+
+
+    @override_settings(TAREAS_MODO='externo')
+    def test_acciones_del_admin_mantienen_resumenes(self):
+        cache.clear()
+        pedidos = [
+            crear_carrito(self.cliente, self.negocio, self.pan, 2).convertir_a_pedido(metodo_entrega='pickup')
+            for _ in range(2)
+        ]
+        admin = Usuario.objects.create_superuser(username='admin', password='x')
+        self.client.force_login(admin)
+        self.assertEqual(contadores.obtener()['pedidos_completados'], 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            respuesta = self.client.post('/admin/pedidos/pedido/', {
+                'action': 'marcar_completado', '_selected_action': [p.pk for p in pedidos],
+            })
+
+        self.assertEqual(respuesta.status_code, 302)
+        por_estado = {fila['estado']: fila['pedidos'] for fila in resumenes.reporte(self.negocio)['por_estado']}
+        self.assertEqual(por_estado, {'completado': 2})
+        self.assertEqual(contadores.obtener()['pedidos_completados'], 2)
+        self.assertEqual(Tarea.objects.filter(nombre='fidelizacion.acumular_puntos').count(), 2)
+        self.assertTrue(all(p.fecha_completado for p in Pedido.objects.filter(pk__in=[p.pk for p in pedidos])))
+
+
+@skipUnlessDBFeature('test_db_allows_multiple_connections')
+class ConvertirAPedidoConcurrenteTest(TransactionTestCase):
+    """50 checkouts en paralelo sobre un producto con 10 unidades."""
+
+    CHECKOUTS = 50
+    STOCK = 10
+
+    def test_no_sobrevende(self):
+        negocio = crear_negocio()
+        producto = Producto.objects.create(
+            negocio=negocio, codigo='PAN-1', nombre='Pan amasado', precio=Decimal('500'), stock=self.STOCK,
+        )
+        carritos = [
+            crear_carrito(Usuario.objects.create(username=f'cliente{i}'), negocio, producto, 1)
+            for i in range(self.CHECKOUTS)
+        ]
+
+        barrera = threading.Barrier(self.CHECKOUTS)
+        exitos, rechazos, errores = [], [], []
+
+        def checkout(carrito):
+            try:
+                barrera.wait()
+                exitos.append(carrito.convertir_a_pedido(metodo_entrega='pickup'))
+            except ValueError as e:
+                rechazos.append(str(e))
+            except Exception as e:
+                errores.append(e)
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=checkout, args=(c,)) for c in carritos]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        self.assertEqual(errores, [])
+        self.assertEqual(len(exitos), self.STOCK)
+        self.assertEqual(len(rechazos), self.CHECKOUTS - self.STOCK)
+        producto.refresh_from_db()
+        self.assertEqual(producto.stock, 0)
+        self.assertEqual(
+            sum(DetallePedido.objects.filter(producto=producto).values_list('cantidad', flat=True)),
+            self.STOCK,
+        )
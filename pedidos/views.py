@@ -2,6 +2,8 @@ from django.shortcuts import render, get_object_or_404
 from django.http import JsonResponse
 from django.views.decorators.http import require_http_methods
 from django.contrib.auth.decorators import login_required
+from django.db import transaction
+from notificaciones.services import NotificacionesPedido
 from .models import Pedido
 
 @require_http_methods(["GET"])
@@ -65,24 +67,30 @@ def actualizar_estado_pedido(request, pk):
         if nuevo_estado not in estados_validos:
             return JsonResponse({'error': 'Estado inválido'}, status=400)
         
-        # Guardar estado anterior para el historial
-        from pedidos.models import HistorialEstadoPedido
-        HistorialEstadoPedido.objects.create(
-            pedido=pedido,
-            estado_anterior=pedido.estado,
-            estado_nuevo=nuevo_estado,
-            usuario=request.user
-        )
-        
-        # Actualizar estado
-        pedido.estado = nuevo_estado
-        
-        # Si el pedido se completa, actualizar fecha
-        if nuevo_estado == 'completado':
-            from django.utils import timezone
-            pedido.fecha_completado = timezone.now()
-        
-        pedido.save()
+        with transaction.atomic():
+            # Guardar estado anterior para el historial
+            from pedidos.models import HistorialEstadoPedido
+            estado_anterior = pedido.estado
+            HistorialEstadoPedido.objects.create(
+                pedido=pedido,
+                estado_anterior=estado_anterior,
+                estado_nuevo=nuevo_estado,
+                usuario=request.user
+            )
+            
+            # Actualizar estado
+            pedido.estado = nuevo_estado
+            
+            # Si el pedido se completa, actualizar fecha
+            if nuevo_estado == 'completado':
+                from django.utils import timezone
+                pedido.fecha_completado = timezone.now()
+            
+            pedido.save()
+            
+            # Notificar al cliente (el envío por email/push queda en la cola de tareas)
+            if nuevo_estado != estado_anterior:
+                NotificacionesPedido.notificar_cambio_estado(pedido)
         
         return JsonResponse({
             'success': True,
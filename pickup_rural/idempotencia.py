@@ -0,0 +1,186 @@
+# pickup_rural/idempotencia.py
+"""
+Reintentos seguros para POST de checkout y pagos.
+
+El cliente envía un header `Idempotency-Key` (p. ej. un UUID por intento
+de compra). La primera petición con esa clave se ejecuta y su respuesta
+queda en caché por IDEMPOTENCIA_TTL_SEGUNDOS; las repeticiones (mismo
+usuario, ruta y clave) reciben esa respuesta sin volver a ejecutar la
+vista, con el header `Idempotent-Replayed: true`. Si la original aún está
+en curso, la repetición espera hasta IDEMPOTENCIA_ESPERA_SEGUNDOS a que
+termine; si no alcanza, responde 409.
+
+- Solo aplica a POST en las rutas de IDEMPOTENCIA_RUTAS (prefijos).
+- Reusar la clave con otros datos responde 422. Los datos se comparan por
+  una huella canónica (ver `huella()`), no por los bytes del cuerpo: un
+  reintento multipart trae otro boundary aunque los campos sean iguales.
+- Las respuestas 5xx (y las excepciones) no se guardan: el reintento
+  vuelve a ejecutar la vista. Tampoco las 401/403 ni los 4xx de peticiones
+  que no llegaron a la vista (p. ej. el 403 de CSRF en process_view): al
+  corregir el token o la sesión, el reintento con la misma clave se ejecuta.
+
+La caché debe ser compartida entre procesos (CACHE_TIPO 'redis' en
+producción); con 'locmem' la protección es por proceso.
+"""
+import hashlib
+import json
+import time
+
+from asgiref.sync import async_to_sync, iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, JsonResponse
+
+HEADER = 'Idempotency-Key'
+LARGO_MAXIMO = 255
+CABECERAS_GUARDADAS = ('Content-Type', 'Location')
+
+
+def _ajuste(nombre, por_defecto):
+    return getattr(settings, nombre, por_defecto)
+
+
+class IdempotenciaMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.aplica(request):
+            return self.get_response(request)
+        return self.procesar(request, self.get_response)
+
+    async def __acall__(self, request):
+        if not self.aplica(request):
+            return await self.get_response(request)
+        # Las rutas protegidas son vistas sync: se procesan en un hilo
+        return await sync_to_async(self.procesar)(request, async_to_sync(self.get_response))
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        # Solo corre si ningún process_view anterior (CSRF) cortó la petición
+        request._idempotencia_en_vista = True
+
+    @staticmethod
+    def aplica(request):
+        return (
+            request.method == 'POST'
+            and HEADER in request.headers
+            and any(request.path.startswith(ruta) for ruta in _ajuste('IDEMPOTENCIA_RUTAS', []))
+        )
+
+    # ============================================================
+    # PROCESAMIENTO (sync)
+    # ============================================================
+
+    def procesar(self, request, get_response):
+        clave_cliente = request.headers[HEADER]
+        if not clave_cliente or len(clave_cliente) > LARGO_MAXIMO:
+            return JsonResponse({'error': f'{HEADER} inválida'}, status=400)
+
+        clave = self.clave(request, clave_cliente)
+        huella = self.huella(request)
+
+        respuesta = self.esperar_turno(clave, huella)
+        if respuesta is not None:
+            return respuesta
+
+        # Turno tomado: ejecutar la vista y guardar su respuesta
+        try:
+            respuesta = get_response(request)
+            if self.guardable(request, respuesta):
+                ttl = _ajuste('IDEMPOTENCIA_TTL_SEGUNDOS', 60 * 60 * 24)
+                cache.set(clave + ':respuesta', self.serializar(respuesta, huella), ttl)
+        finally:
+            cache.delete(clave + ':en_curso')
+        return respuesta
+
+    @staticmethod
+    def guardable(request, respuesta):
+        """Si la respuesta es el resultado de ejecutar la operación (y se repite)"""
+        estado = respuesta.status_code
+        if respuesta.streaming or estado >= 500 or estado in (401, 403):
+            return False
+        return estado < 400 or getattr(request, '_idempotencia_en_vista', False)
+
+    @staticmethod
+    def clave(request, clave_cliente):
+        usuario = request.user.pk if request.user.is_authenticated else 'anonimo'
+        digest = hashlib.sha256(f'{usuario}:{request.path}:{clave_cliente}'.encode()).hexdigest()
+        return f'idempotencia:{digest}'
+
+    @staticmethod
+    def huella(request):
+        """
+        SHA-256 de los datos del POST en forma canónica: formularios (también
+        multipart) por sus campos ordenados más el SHA-256 de cada archivo;
+        JSON por el documento con claves ordenadas; otro cuerpo, tal cual.
+        """
+        if request.content_type in ('multipart/form-data', 'application/x-www-form-urlencoded'):
+            archivos = []
+            for nombre, lista in sorted(request.FILES.lists()):
+                for archivo in lista:
+                    digest = hashlib.sha256()
+                    for bloque in archivo.chunks():
+                        digest.update(bloque)
+                    archivo.seek(0)
+                    archivos.append([nombre, archivo.name, digest.hexdigest()])
+            canonico = json.dumps([sorted(request.POST.lists()), archivos]).encode()
+        else:
+            try:
+                canonico = json.dumps(json.loads(request.body), sort_keys=True).encode()
+            except ValueError:
+                canonico = request.body
+        return hashlib.sha256(canonico).hexdigest()
+
+    def esperar_turno(self, clave, huella):
+        """
+        None si esta petición debe ejecutar la vista (tomó el turno); si no,
+        la respuesta a entregar (la guardada, o un error).
+        """
+        limite = time.monotonic() + _ajuste('IDEMPOTENCIA_ESPERA_SEGUNDOS', 10)
+        pausa = 0.05
+        while True:
+            guardada = cache.get(clave + ':respuesta')
+            if guardada is not None:
+                return self.repetir(guardada, huella)
+            # cache.add es atómico: una sola petición toma el turno
+            if cache.add(clave + ':en_curso', huella, _ajuste('IDEMPOTENCIA_BLOQUEO_SEGUNDOS', 60)):
+                return None
+            en_curso = cache.get(clave + ':en_curso')
+            if en_curso is not None and en_curso != huella:
+                return self.clave_reusada()
+            if time.monotonic() >= limite:
+                return JsonResponse(
+                    {'error': 'Hay una solicitud en curso con la misma Idempotency-Key'}, status=409
+                )
+            time.sleep(pausa)
+            pausa = min(pausa * 2, 0.5)
+
+    @staticmethod
+    def clave_reusada():
+        return JsonResponse({'error': 'La Idempotency-Key ya se usó con otros datos'}, status=422)
+
+    @staticmethod
+    def serializar(respuesta, huella):
+        return {
+            'huella': huella,
+            'status': respuesta.status_code,
+            'contenido': respuesta.content,
+            'cabeceras': {c: respuesta[c] for c in CABECERAS_GUARDADAS if respuesta.has_header(c)},
+        }
+
+    @staticmethod
+    def repetir(guardada, huella):
+        if guardada['huella'] != huella:
+            return IdempotenciaMiddleware.clave_reusada()
+        respuesta = HttpResponse(guardada['contenido'], status=guardada['status'])
+        for nombre, valor in guardada['cabeceras'].items():
+            respuesta[nombre] = valor
+        respuesta['Idempotent-Replayed'] = 'true'
+        return respuesta
@@ -0,0 +1,213 @@
+# pickup_rural/pubsub.py
+"""
+Publicación/suscripción para empujar eventos a conexiones abiertas (SSE).
+
+`publicar(canal, datos)` es síncrono y se puede llamar desde cualquier hilo
+(vistas, señales, on_commit). `suscribir(canal)` es un context manager
+asíncrono para vistas ASGI que entrega una Suscripcion con una cola acotada:
+si el cliente no consume y la cola se llena, la suscripción se marca como
+desbordada y recibir() retorna None, así la vista cierra el stream y el
+cliente se reconecta recuperando lo pendiente desde la BD (backpressure sin
+crecer la memoria).
+
+Cada broker lleva un registro de las conexiones abiertas por canal; con
+`suscribir(canal, maximo=N)` al abrir la conexión N+1 se corta la más
+antigua (p. ej. un límite de pestañas por usuario).
+
+Backends (settings.PUBSUB_BACKEND):
+- 'memoria': en el proceso. Basta con un solo proceso ASGI.
+- 'redis': canales de Redis en PUBSUB_REDIS_URL, para varios procesos
+  (requiere el paquete `redis`).
+
+Bajo WSGI cada conexión abierta ocupa un hilo del servidor: las vistas de
+streaming comprueban `sirve_asgi(request)` y, si no, responden
+`sin_streaming()` (503) para que el cliente pase al polling de inmediato.
+"""
+import asyncio
+import json
+import threading
+from contextlib import asynccontextmanager
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse
+
+CAPACIDAD_POR_DEFECTO = 100
+
+
+class Suscripcion:
+    """Cola de eventos de una conexión, ligada al event loop que la creó."""
+
+    def __init__(self, capacidad):
+        self.loop = asyncio.get_running_loop()
+        self.cola = asyncio.Queue(capacidad)
+        self.desbordada = False
+
+    def entregar(self, datos):
+        """Thread-safe: encola `datos` en el loop de la suscripción."""
+        try:
+            self.loop.call_soon_threadsafe(self._poner, datos)
+        except RuntimeError:
+            # El loop ya se cerró (conexión terminada)
+            pass
+
+    def cerrar(self):
+        """Thread-safe: corta la suscripción (recibir() retornará None)."""
+        try:
+            self.loop.call_soon_threadsafe(self._cortar)
+        except RuntimeError:
+            pass
+
+    def _poner(self, datos):
+        if self.desbordada:
+            return
+        try:
+            self.cola.put_nowait(datos)
+        except asyncio.QueueFull:
+            self._cortar()
+
+    def _cortar(self):
+        if self.desbordada:
+            return
+        self.desbordada = True
+        while not self.cola.empty():
+            self.cola.get_nowait()
+        self.cola.put_nowait(None)
+
+    async def recibir(self, timeout):
+        """Siguiente evento; None si se desbordó. Lanza TimeoutError si no llega nada."""
+        return await asyncio.wait_for(self.cola.get(), timeout)
+
+
+class Registro:
+    """Conexiones abiertas en este proceso por canal (en orden de llegada)"""
+
+    def __init__(self, capacidad=CAPACIDAD_POR_DEFECTO):
+        self.capacidad = capacidad
+        self._lock = threading.Lock()
+        self._suscripciones = {}
+
+    def suscriptores(self, canal):
+        with self._lock:
+            return len(self._suscripciones.get(canal, ()))
+
+    def _locales(self, canal):
+        with self._lock:
+            return list(self._suscripciones.get(canal, ()))
+
+    def _registrar(self, canal, maximo=None):
+        suscripcion = Suscripcion(self.capacidad)
+        with self._lock:
+            abiertas = self._suscripciones.setdefault(canal, {})
+            exceso = len(abiertas) + 1 - maximo if maximo else 0
+            sobrantes = list(abiertas)[:exceso] if exceso > 0 else []
+            abiertas[suscripcion] = None
+        for vieja in sobrantes:
+            vieja.cerrar()
+        return suscripcion
+
+    def _quitar(self, canal, suscripcion):
+        with self._lock:
+            restantes = self._suscripciones.get(canal)
+            if restantes is not None:
+                restantes.pop(suscripcion, None)
+                if not restantes:
+                    del self._suscripciones[canal]
+
+
+class BrokerMemoria(Registro):
+    def publicar(self, canal, datos):
+        for suscripcion in self._locales(canal):
+            suscripcion.entregar(datos)
+
+    @asynccontextmanager
+    async def suscribir(self, canal, maximo=None):
+        suscripcion = self._registrar(canal, maximo)
+        try:
+            yield suscripcion
+        finally:
+            self._quitar(canal, suscripcion)
+
+
+class BrokerRedis(Registro):
+    PREFIJO = 'pubsub:'
+
+    def __init__(self, url, capacidad=CAPACIDAD_POR_DEFECTO):
+        import redis  # dependencia opcional, solo con PUBSUB_BACKEND = 'redis'
+        super().__init__(capacidad)
+        self.url = url
+        self._cliente = redis.Redis.from_url(url)
+
+    def publicar(self, canal, datos):
+        self._cliente.publish(self.PREFIJO + canal, json.dumps(datos))
+
+    @asynccontextmanager
+    async def suscribir(self, canal, maximo=None):
+        import redis.asyncio as aioredis
+
+        # El límite `maximo` se aplica por proceso
+        suscripcion = self._registrar(canal, maximo)
+        cliente = aioredis.Redis.from_url(self.url)
+        pubsub = cliente.pubsub(ignore_subscribe_messages=True)
+        await pubsub.subscribe(self.PREFIJO + canal)
+
+        async def leer():
+            async for mensaje in pubsub.listen():
+                suscripcion._poner(json.loads(mensaje['data']))
+
+        tarea = asyncio.create_task(leer())
+        try:
+            yield suscripcion
+        finally:
+            self._quitar(canal, suscripcion)
+            tarea.cancel()
+            await pubsub.unsubscribe()
+            await pubsub.aclose()
+            await cliente.aclose()
+
+
+def sirve_asgi(request):
+    """True si la petición llegó por el handler ASGI (conexiones largas baratas)"""
+    return isinstance(request, ASGIRequest)
+
+
+def sin_streaming():
+    """Respuesta para un stream pedido a un servidor WSGI: el cliente no reintenta"""
+    return JsonResponse({'error': 'Streaming no disponible (servidor WSGI)'}, status=503)
+
+
+def evento_sse(datos, evento=None, id=None):
+    """Serializa un evento en formato text/event-stream"""
+    lineas = []
+    if id is not None:
+        lineas.append(f'id: {id}')
+    if evento:
+        lineas.append(f'event: {evento}')
+    lineas.append(f'data: {json.dumps(datos)}')
+    return '\n'.join(lineas) + '\n\n'
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def broker():
+    """Broker configurado en settings (uno por proceso)."""
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                capacidad = getattr(settings, 'PUBSUB_CAPACIDAD', CAPACIDAD_POR_DEFECTO)
+                if getattr(settings, 'PUBSUB_BACKEND', 'memoria') == 'redis':
+                    _broker = BrokerRedis(settings.PUBSUB_REDIS_URL, capacidad)
+                else:
+                    _broker = BrokerMemoria(capacidad)
+    return _broker
+
+
+def publicar(canal, datos):
+    broker().publicar(canal, datos)
+
+
+def suscribir(canal, maximo=None):
+    return broker().suscribir(canal, maximo)
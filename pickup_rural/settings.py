@@ -39,6 +39,7 @@ INSTALLED_APPS = [
     
     'chat',           # 
     'fidelizacion',   # 
+    'tareas',         # cola de tareas en segundo plano
 
     # Third party apps
     'rest_framework',
@@ -52,6 +53,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'pickup_rural.idempotencia.IdempotenciaMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'usuarios.middleware.RoleBasedRedirectMiddleware', 
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
@@ -152,4 +154,75 @@ REST_FRAMEWORK = {
         'rest_framework.authentication.SessionAuthentication',
         'rest_framework.authentication.BasicAuthentication',
     ],
-}
\ No newline at end of file
+}
+
+# Reservas de stock: minutos que un carrito retiene las unidades agregadas
+RESERVA_STOCK_MINUTOS = 15
+
+# Caché (contadores de la página de inicio, estadísticas de comerciantes).
+# 'locmem': memoria de cada proceso (desarrollo)
+# 'file': archivos en CACHE_DIRECTORIO, compartida entre procesos del servidor
+# 'redis': servidor Redis en CACHE_REDIS_URL (requiere el paquete `redis`)
+CACHE_TIPO = 'locmem'
+CACHE_DIRECTORIO = BASE_DIR / 'cache'
+CACHE_REDIS_URL = 'redis://127.0.0.1:6379/1'
+
+_CACHES_DISPONIBLES = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'pickup-rural',
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': CACHE_DIRECTORIO,
+    },
+    'redis': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': CACHE_REDIS_URL,
+    },
+}
+CACHES = {'default': _CACHES_DISPONIBLES[CACHE_TIPO]}
+
+# Publicación/suscripción para eventos en tiempo real (pickup_rural/pubsub.py).
+# Los streams SSE necesitan servirse por ASGI (p. ej. `uvicorn pickup_rural.asgi:application`).
+# 'memoria' sirve con un solo proceso; con varios procesos usar 'redis'.
+PUBSUB_BACKEND = 'memoria'
+PUBSUB_REDIS_URL = CACHE_REDIS_URL
+PUBSUB_CAPACIDAD = 100          # eventos en cola por conexión antes de cortarla
+SSE_KEEPALIVE_SEGUNDOS = 15
+NOTIFICACIONES_MAX_CONEXIONES = 5   # streams de notificaciones abiertos por usuario (pestañas)
+LONG_POLL_MAX_SEGUNDOS = 25
+
+# Cola de tareas en segundo plano (tareas/cola.py):
+# 'hilo' = un hilo por proceso web; 'inmediato' = al confirmar, en la misma
+# petición (tests); 'externo' = solo `manage.py procesar_tareas` (en ese caso
+# los avisos push necesitan PUBSUB_BACKEND = 'redis' para llegar a los procesos web)
+TAREAS_MODO = 'hilo'
+TAREAS_REINTENTO_SEGUNDOS = 30      # espera base entre reintentos (se duplica en cada intento)
+TAREAS_TIMEOUT_SEGUNDOS = 300       # una tarea 'en_proceso' más antigua se vuelve a reclamar
+
+# Retención de notificaciones (`manage.py purgar_notificaciones`): días que se
+# guardan las notificaciones LEÍDAS según su tipo ('default' para el resto).
+# Las no leídas no se purgan. Con NOTIFICACIONES_ARCHIVO_DIRECTORIO se guardan
+# antes en archivos .jsonl.gz (None = solo borrar).
+NOTIFICACIONES_RETENCION_DIAS = {
+    'default': 90,
+    'stock_bajo': 30,
+    'pedido_nuevo': 30,
+}
+NOTIFICACIONES_ARCHIVO_DIRECTORIO = None
+
+# WebPay Plus (pagos/pasarela.py). Por defecto el ambiente de integración de
+# Transbank con su comercio público de pruebas; para desarrollo sin red usar
+# `manage.py webpay_local` y WEBPAY_URL = 'http://127.0.0.1:8765'.
+WEBPAY_URL = 'https://webpay3gint.transbank.cl'
+WEBPAY_COMERCIO = '597055555532'
+WEBPAY_API_KEY = '579B532A7440BB0C9079DED94D31EA1615BACEB56610332264630D42D0A36B1C'
+WEBPAY_TIMEOUT_SEGUNDOS = 10
+
+# Idempotency-Key en POST de checkout y pagos (pickup_rural/idempotencia.py).
+# Usa la caché: con varios procesos, CACHE_TIPO debe ser 'redis'.
+IDEMPOTENCIA_RUTAS = ['/api/carrito/finalizar/', '/api/pagos/']
+IDEMPOTENCIA_TTL_SEGUNDOS = 60 * 60 * 24    # cuánto se guarda la respuesta para repetirla
+IDEMPOTENCIA_BLOQUEO_SEGUNDOS = 60          # máximo que se considera "en curso" una petición
+IDEMPOTENCIA_ESPERA_SEGUNDOS = 10           # cuánto espera un duplicado a que termine la original
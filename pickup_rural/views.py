@@ -2,28 +2,18 @@ from django.shortcuts import render, get_object_or_404
 from django.http import JsonResponse
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import csrf_exempt
-from django.db.models import Q
-from usuarios.models import Usuario, Negocio
+from usuarios.models import Negocio
 from productos.models import Producto, Categoria
+from productos import busqueda, catalogo, reservas
 from pedidos.models import Pedido
-from pagos.models import Pago
+from administracion import contadores
 import json
 
 def home(request):
     """Página de inicio con estadísticas del sistema"""
     
-    # Obtener estadísticas
-    stats = {
-        'usuarios': Usuario.objects.count(),
-        'negocios': Negocio.objects.filter(activo=True).count(),
-        'productos': Producto.objects.filter(activo=True).count(),
-        'categorias': Categoria.objects.filter(activo=True).count(),
-        'pedidos_totales': Pedido.objects.count(),
-        'pedidos_pendientes': Pedido.objects.filter(estado='pendiente').count(),
-        'pedidos_confirmados': Pedido.objects.filter(estado='confirmado').count(),
-        'pedidos_completados': Pedido.objects.filter(estado='completado').count(),
-        'pagos_aprobados': Pago.objects.filter(estado='aprobado').count(),
-    }
+    # Estadísticas: contadores en caché mantenidos por señales (sin COUNT por visita)
+    stats = contadores.obtener()
     
     # Últimos pedidos
     ultimos_pedidos = Pedido.objects.select_related('cliente', 'negocio').order_by('-fecha_pedido')[:5]
@@ -58,19 +48,20 @@ def api_status(request):
 
 @require_http_methods(["GET"])
 def lista_productos(request):
-    """Listar todos los productos activos.
-    - Si la ruta empieza con /api/ o el Accept incluye application/json => devuelve JSON.
+    """Listar los productos activos.
+    - Si la ruta empieza con /api/ o el Accept incluye application/json => devuelve JSON
+      paginado por cursor (?cursor=, ?limit=, ?fields=, ?negocio=, ?categoria=, ?count=;
+      ver productos/catalogo.py).
     - Si no, renderiza el catálogo HTML.
     """
     accept = request.headers.get('Accept', '')
     is_api = request.path.startswith('/api/') or ('application/json' in accept)
 
     if is_api:
-        productos = Producto.objects.filter(activo=True).select_related('categoria', 'negocio').values(
-            'id', 'codigo', 'nombre', 'descripcion', 'precio', 'precio_oferta',
-            'stock', 'categoria__nombre', 'negocio__nombre'
-        )
-        return JsonResponse({'productos': list(productos)})
+        try:
+            return JsonResponse(catalogo.pagina_productos(request.GET))
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
 
     # Render catálogo (template)
     return render(request, 'catalogo_productos.html')
@@ -79,25 +70,23 @@ def lista_productos(request):
 def buscar_productos(request):
     """
     Buscar productos activos por texto libre (q) en nombre, descripcion, codigo,
-    categoría o negocio. Devuelve JSON.
+    categoría o negocio; ?categoria=<id> acota a una categoría. Devuelve JSON
+    ordenado por relevancia: hasta ?limit= resultados (50 por defecto, máximo
+    200) y `truncado: true` si había más.
+    Usa el índice invertido de productos/busqueda.py (sin tildes, por prefijo).
     """
-    q = (request.GET.get('q') or '').strip()
-
-    qs = Producto.objects.filter(activo=True).select_related('categoria', 'negocio')
-    if q:
-        qs = qs.filter(
-            Q(nombre__icontains=q) |
-            Q(descripcion__icontains=q) |
-            Q(codigo__icontains=q) |
-            Q(categoria__nombre__icontains=q) |
-            Q(negocio__nombre__icontains=q)
-        )
-
-    productos = qs.values(
+    categoria_id = request.GET.get('categoria')
+    if categoria_id and not categoria_id.isdigit():
+        return JsonResponse({'error': 'categoria debe ser un ID numérico'}, status=400)
+    try:
+        limite = busqueda.leer_limite(request.GET.get('limit'))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    productos, truncado = busqueda.buscar_productos(request.GET.get('q'), (
         'id', 'codigo', 'nombre', 'descripcion', 'precio', 'precio_oferta',
         'stock', 'categoria__nombre', 'negocio__nombre'
-    )
-    return JsonResponse({'productos': list(productos)})
+    ), limite, categoria_id=int(categoria_id) if categoria_id else None)
+    return JsonResponse({'productos': productos, 'truncado': truncado})
 
 @require_http_methods(["GET"])
 def detalle_producto(request, pk):
@@ -110,7 +99,7 @@ def detalle_producto(request, pk):
         'descripcion': producto.descripcion,
         'precio': float(producto.precio),
         'precio_oferta': float(producto.precio_oferta) if producto.precio_oferta else None,
-        'stock': producto.stock,
+        'stock': reservas.disponible(producto),
         'categoria': producto.categoria.nombre if producto.categoria else None,
         'negocio': producto.negocio.nombre,
     }
@@ -128,8 +117,10 @@ def productos_por_categoria(request, categoria_id):
     productos = Producto.objects.filter(
         categoria_id=categoria_id,
         activo=True
-    ).values('id', 'codigo', 'nombre', 'precio', 'stock')
-    return JsonResponse({'productos': list(productos)})
+    )
+    return JsonResponse({
+        'productos': reservas.valores_con_disponible(productos, ('id', 'codigo', 'nombre', 'precio', 'stock'))
+    })
 
 @require_http_methods(["GET"])
 def formulario_agregar_producto(request):
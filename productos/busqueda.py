@@ -0,0 +1,231 @@
+# productos/busqueda.py
+"""
+Índice invertido para la búsqueda del catálogo.
+
+Cada producto activo se descompone en tokens normalizados (minúsculas y sin
+tildes, así "plátano" y "platano" son el mismo término) que se guardan en
+TerminoBusqueda con un peso según el campo de origen. Buscar es un rango por
+prefijo sobre el índice (token, producto) en vez de cinco LIKE '%q%' con joins.
+
+A diferencia del icontains anterior, se busca por inicio de palabra: "choco"
+encuentra "Chocolate", pero "late" no (ni texto que cruce dos palabras).
+"""
+import re
+import unicodedata
+
+from django.db import transaction
+from django.db.models import Case, IntegerField, Max, Q, Sum, Value, When
+
+from .models import Producto, TerminoBusqueda
+from . import reservas
+
+# Peso de cada campo al rankear resultados
+PESOS = {
+    'nombre': 10,
+    'codigo': 8,
+    'categoria': 4,
+    'negocio': 3,
+    'descripcion': 1,
+}
+
+# Campos de Producto que alimentan el índice (para saltar saves que no los tocan)
+CAMPOS_INDEXADOS = {'nombre', 'codigo', 'descripcion', 'categoria', 'negocio', 'activo'}
+
+# Resultados por búsqueda (?limit=); la respuesta indica `truncado` si había más
+LIMITE_RESULTADOS = 50
+LIMITE_MAXIMO = 200
+TAMANO_LOTE = 1000
+
+# Si el token más raro de una consulta aparece en menos productos que esto,
+# sus IDs acotan la agregación del resto de tokens
+MAX_CANDIDATOS = 1000
+
+_SEPARADOR = re.compile(r'[^0-9a-z]+')
+_LARGO_TOKEN = TerminoBusqueda._meta.get_field('token').max_length
+
+
+def normalizar(texto):
+    """Minúsculas y sin diacríticos: 'Jamón Ñuble' → 'jamon nuble'."""
+    descompuesto = unicodedata.normalize('NFKD', texto or '')
+    sin_tildes = ''.join(c for c in descompuesto if not unicodedata.combining(c))
+    return sin_tildes.lower()
+
+
+def tokenizar(texto):
+    """Tokens únicos (en orden de aparición) de un texto normalizado."""
+    tokens = []
+    for token in _SEPARADOR.split(normalizar(texto)):
+        token = token[:_LARGO_TOKEN]
+        if token and token not in tokens:
+            tokens.append(token)
+    return tokens
+
+
+def terminos_para(campos):
+    """
+    Genera (campo, token, peso) a partir de un dict campo → texto.
+    (productos/migrations/0003 tiene una copia congelada para el índice inicial.)
+    """
+    terminos = []
+    for campo, peso in PESOS.items():
+        for token in tokenizar(campos.get(campo)):
+            terminos.append((campo, token, peso))
+    return terminos
+
+
+def _textos_producto(producto):
+    return {
+        'nombre': producto.nombre,
+        'codigo': producto.codigo,
+        'descripcion': producto.descripcion,
+        'categoria': producto.categoria.nombre if producto.categoria else '',
+        'negocio': producto.negocio.nombre,
+    }
+
+
+def _construir_terminos(producto, campos=None):
+    return [
+        TerminoBusqueda(producto_id=producto.pk, campo=campo, token=token, peso=peso)
+        for campo, token, peso in terminos_para(_textos_producto(producto))
+        if campos is None or campo in campos
+    ]
+
+
+def indexar_producto(producto):
+    """Reemplaza los términos de un producto (o los elimina si está inactivo)."""
+    with transaction.atomic():
+        TerminoBusqueda.objects.filter(producto_id=producto.pk).delete()
+        if producto.activo:
+            TerminoBusqueda.objects.bulk_create(_construir_terminos(producto))
+
+
+def reindexar_productos(productos, campos=None, tamano_lote=TAMANO_LOTE):
+    """
+    Reconstruye el índice para un queryset de productos, por lotes.
+    Con `campos` solo se reescriben esos campos (p. ej. ['categoria'] al
+    renombrar una categoría). Retorna la cantidad de productos procesados.
+    """
+    ids = list(productos.order_by().values_list('id', flat=True))
+    for inicio in range(0, len(ids), tamano_lote):
+        lote = ids[inicio:inicio + tamano_lote]
+        activos = Producto.objects.filter(id__in=lote, activo=True).select_related('categoria', 'negocio')
+
+        nuevos = []
+        for producto in activos:
+            nuevos.extend(_construir_terminos(producto, campos))
+
+        with transaction.atomic():
+            existentes = TerminoBusqueda.objects.filter(producto_id__in=lote)
+            if campos is not None:
+                existentes = existentes.filter(campo__in=campos)
+            existentes.delete()
+            TerminoBusqueda.objects.bulk_create(nuevos, batch_size=tamano_lote)
+
+    return len(ids)
+
+
+def rango_prefijo(token):
+    """
+    (desde, hasta) que cubre todos los tokens que empiezan con `token`.
+    Los tokens solo usan [0-9a-z], así que completar con 'z' da la cota
+    superior; a diferencia de LIKE 'x%' un rango usa el índice en cualquier
+    motor y collation.
+    """
+    return token, token + 'z' * (_LARGO_TOKEN - len(token))
+
+
+def buscar(texto, limite=LIMITE_RESULTADOS, categoria_id=None):
+    """
+    IDs de productos que contienen todos los tokens de `texto` (por prefijo),
+    ordenados por relevancia. Una coincidencia exacta del token suma doble.
+    Con `categoria_id` solo cuenta productos de esa categoría.
+    """
+    tokens = tokenizar(texto)
+    if not tokens:
+        return []
+
+    filtro = Q()
+    coincidencias = []
+    for token in tokens:
+        prefijo = Q(token__range=rango_prefijo(token))
+        filtro |= prefijo
+        coincidencias.append(Max(Case(
+            When(prefijo, then=Value(1)),
+            default=Value(0),
+            output_field=IntegerField(),
+        )))
+
+    total_coincidencias = coincidencias[0]
+    for expresion in coincidencias[1:]:
+        total_coincidencias = total_coincidencias + expresion
+
+    # Con varios tokens, partir desde el más raro evita agrupar las listas
+    # enteras de tokens frecuentes (p. ej. el nombre del negocio)
+    if len(tokens) > 1:
+        candidatos = None
+        for token in tokens:
+            ids = list(
+                TerminoBusqueda.objects.filter(token__range=rango_prefijo(token))
+                .values_list('producto_id', flat=True)[:MAX_CANDIDATOS + 1]
+            )
+            if candidatos is None or len(ids) < len(candidatos):
+                candidatos = ids
+        if len(candidatos) <= MAX_CANDIDATOS:
+            filtro &= Q(producto_id__in=set(candidatos))
+
+    if categoria_id is not None:
+        filtro &= Q(producto__categoria_id=categoria_id)
+
+    bonus_exacto = Sum(Case(
+        When(token__in=tokens, then='peso'),
+        default=Value(0),
+        output_field=IntegerField(),
+    ))
+
+    filas = (
+        TerminoBusqueda.objects.filter(filtro)
+        .values('producto_id')
+        .annotate(
+            coincidencias=total_coincidencias,
+            puntaje=Sum('peso') + bonus_exacto,
+        )
+        .filter(coincidencias=len(tokens))
+        .order_by('-puntaje', 'producto_id')[:limite]
+    )
+    return [fila['producto_id'] for fila in filas]
+
+
+def leer_limite(valor):
+    """Valor de ?limit= acotado a LIMITE_MAXIMO; lanza ValueError si no es válido"""
+    if not valor:
+        return LIMITE_RESULTADOS
+    try:
+        limite = int(valor)
+    except ValueError:
+        raise ValueError('limit debe ser un número')
+    if limite < 1:
+        raise ValueError('limit debe ser al menos 1')
+    return min(limite, LIMITE_MAXIMO)
+
+
+def buscar_productos(texto, campos, limite=LIMITE_RESULTADOS, categoria_id=None):
+    """
+    (resultados, truncado): resultados listos para JSON (`campos` se pasa a
+    .values()) en el orden del ranking, con 'stock' disponible; truncado es
+    True si había más de `limite` coincidencias. Sin texto retorna todos los
+    productos activos (de la categoría, si se indica), sin límite.
+    """
+    productos = Producto.objects.filter(activo=True).select_related('categoria', 'negocio')
+    if categoria_id is not None:
+        productos = productos.filter(categoria_id=categoria_id)
+    if not (texto or '').strip():
+        return reservas.valores_con_disponible(productos, campos), False
+
+    # Uno extra para saber si quedaron coincidencias fuera
+    ids = buscar(texto, limite + 1, categoria_id)
+    truncado = len(ids) > limite
+    ids = ids[:limite]
+    posicion = {producto_id: i for i, producto_id in enumerate(ids)}
+    resultados = reservas.valores_con_disponible(productos.filter(id__in=ids), campos)
+    resultados.sort(key=lambda p: posicion[p['id']])
+    return resultados, truncado
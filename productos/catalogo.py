@@ -0,0 +1,125 @@
+# productos/catalogo.py
+"""
+Listado del catálogo paginado por cursor (keyset) sobre (nombre, id).
+
+En vez de OFFSET, cada página continúa desde el último (nombre, id) visto,
+así el costo de una página no depende de cuántos productos haya antes.
+Lo usan productos.views.lista_productos y su copia en pickup_rural/views.py.
+"""
+import base64
+import binascii
+import json
+
+from django.db.models import Q
+
+from .models import Producto
+from . import reservas
+
+CAMPOS_DISPONIBLES = (
+    'id', 'codigo', 'nombre', 'descripcion', 'precio', 'precio_oferta',
+    'stock', 'categoria__nombre', 'negocio__nombre',
+)
+# Siempre se incluyen: forman el cursor
+CAMPOS_CURSOR = ('id', 'nombre')
+
+LIMITE_POR_DEFECTO = 50
+LIMITE_MAXIMO = 200
+
+
+def codificar_cursor(nombre, producto_id):
+    crudo = json.dumps([nombre, producto_id], ensure_ascii=False).encode('utf-8')
+    return base64.urlsafe_b64encode(crudo).decode('ascii').rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    """Retorna (nombre, id) o lanza ValueError si el cursor no es válido"""
+    try:
+        relleno = '=' * (-len(cursor) % 4)
+        nombre, producto_id = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+        return str(nombre), int(producto_id)
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError):
+        raise ValueError('Cursor inválido')
+
+
+def _campos_solicitados(fields):
+    if not fields:
+        return CAMPOS_DISPONIBLES
+
+    solicitados = [f.strip() for f in fields.split(',') if f.strip()]
+    desconocidos = [f for f in solicitados if f not in CAMPOS_DISPONIBLES]
+    if desconocidos:
+        raise ValueError(f"Campos no disponibles: {', '.join(desconocidos)}")
+
+    # Respetar el orden de CAMPOS_DISPONIBLES para una respuesta estable
+    incluidos = set(solicitados) | set(CAMPOS_CURSOR)
+    return tuple(f for f in CAMPOS_DISPONIBLES if f in incluidos)
+
+
+def _limite(valor):
+    if not valor:
+        return LIMITE_POR_DEFECTO
+    try:
+        limite = int(valor)
+    except ValueError:
+        raise ValueError('limit debe ser un número')
+    if limite < 1:
+        raise ValueError('limit debe ser al menos 1')
+    return min(limite, LIMITE_MAXIMO)
+
+
+def pagina_productos(params):
+    """
+    Una página del catálogo de productos activos.
+
+    Parámetros (query string):
+    - cursor: valor `next` de la página anterior
+    - limit: productos por página (por defecto 50, máximo 200)
+    - fields: lista separada por comas de CAMPOS_DISPONIBLES
+    - negocio: ID de negocio para filtrar
+    - categoria: ID de categoría para filtrar
+    - count: con '1' agrega `total`, la cantidad de productos del listado
+      completo (un COUNT; pedirlo solo con la primera página)
+
+    `stock` es el stock disponible (descontando reservas de carritos).
+
+    Lanza ValueError ante parámetros inválidos.
+    """
+    campos = _campos_solicitados(params.get('fields'))
+    limite = _limite(params.get('limit'))
+
+    productos = Producto.objects.filter(activo=True)
+
+    negocio_id = params.get('negocio')
+    if negocio_id:
+        if not negocio_id.isdigit():
+            raise ValueError('negocio debe ser un ID numérico')
+        productos = productos.filter(negocio_id=negocio_id)
+
+    categoria_id = params.get('categoria')
+    if categoria_id:
+        if not categoria_id.isdigit():
+            raise ValueError('categoria debe ser un ID numérico')
+        productos = productos.filter(categoria_id=categoria_id)
+
+    total = productos.count() if params.get('count') == '1' else None
+
+    cursor = params.get('cursor')
+    if cursor:
+        nombre, producto_id = decodificar_cursor(cursor)
+        productos = productos.filter(Q(nombre__gt=nombre) | Q(nombre=nombre, id__gt=producto_id))
+
+    # Se pide uno extra para saber si hay página siguiente sin hacer COUNT
+    filas = reservas.valores_con_disponible(productos.order_by('nombre', 'id'), campos, limite + 1)
+
+    siguiente = None
+    if len(filas) > limite:
+        filas = filas[:limite]
+        siguiente = codificar_cursor(filas[-1]['nombre'], filas[-1]['id'])
+
+    respuesta = {
+        'productos': filas,
+        'next': siguiente,
+    }
+    if total is not None:
+        respuesta['total'] = total
+    return respuesta
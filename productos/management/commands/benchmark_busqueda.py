@@ -0,0 +1,101 @@
+# productos/management/commands/benchmark_busqueda.py
+import random
+import time
+from statistics import median
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from productos.models import Producto, Categoria
+from productos import busqueda
+from usuarios.models import Usuario, Negocio
+
+PALABRAS = [
+    'plátano', 'jamón', 'leche', 'queso', 'pan', 'manzana', 'tomate', 'lechuga',
+    'harina', 'azúcar', 'arroz', 'aceite', 'yogurt', 'mantequilla', 'café', 'té',
+    'miel', 'huevo', 'pollo', 'cecina', 'longaniza', 'mermelada', 'kuchen', 'murta',
+]
+CONSULTAS = ['platano', 'jamón', 'leche queso', 'que', 'miel murta', 'bench-00042', 'zzz']
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara la búsqueda con icontains contra el índice invertido sobre un '
+        'catálogo sintético. Todo corre dentro de una transacción que se revierte.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--productos', type=int, default=100_000)
+        parser.add_argument('--repeticiones', type=int, default=5)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._poblar(options['productos'])
+                self._medir(options['repeticiones'])
+                raise _Revertir()
+        except _Revertir:
+            pass
+
+    def _poblar(self, cantidad):
+        self.stdout.write(f'🛠️  Generando {cantidad} productos sintéticos...')
+        propietario = Usuario.objects.create(username='benchmark_busqueda', tipo_usuario='comerciante')
+        negocio = Negocio.objects.create(
+            propietario=propietario, nombre='Almacén Benchmark', direccion='-',
+            telefono='-', email='bench@example.com', horario_apertura='08:00',
+            horario_cierre='20:00', dias_atencion='Lunes a Domingo',
+        )
+        categorias = [Categoria.objects.create(nombre=n) for n in ('Lácteos', 'Frutas', 'Abarrotes', 'Carnes')]
+
+        aleatorio = random.Random(42)
+        productos = [
+            Producto(
+                negocio=negocio,
+                categoria=aleatorio.choice(categorias),
+                codigo=f'BENCH-{i:07d}',
+                nombre=' '.join(aleatorio.sample(PALABRAS, 3)),
+                descripcion=' '.join(aleatorio.sample(PALABRAS, 6)),
+                precio=1000,
+                stock=10,
+            )
+            for i in range(cantidad)
+        ]
+        # bulk_create no dispara señales: el índice se construye explícitamente
+        Producto.objects.bulk_create(productos, batch_size=busqueda.TAMANO_LOTE)
+        busqueda.reindexar_productos(Producto.objects.filter(negocio=negocio))
+
+    def _medir(self, repeticiones):
+        campos = ('id', 'codigo', 'nombre', 'precio', 'stock', 'categoria__nombre', 'negocio__nombre')
+
+        def icontains(q):
+            return list(
+                Producto.objects.filter(activo=True).select_related('categoria', 'negocio').filter(
+                    Q(nombre__icontains=q) |
+                    Q(descripcion__icontains=q) |
+                    Q(codigo__icontains=q) |
+                    Q(categoria__nombre__icontains=q) |
+                    Q(negocio__nombre__icontains=q)
+                ).values(*campos)
+            )
+
+        def indice(q):
+            return busqueda.buscar_productos(q, campos)[0]
+
+        self.stdout.write(f"{'consulta':<16}{'icontains (ms)':>16}{'índice (ms)':>14}{'filas idx':>11}")
+        for consulta in CONSULTAS:
+            tiempos = {}
+            for nombre, funcion in (('icontains', icontains), ('indice', indice)):
+                muestras = []
+                for _ in range(repeticiones):
+                    inicio = time.perf_counter()
+                    filas = funcion(consulta)
+                    muestras.append((time.perf_counter() - inicio) * 1000)
+                tiempos[nombre] = (median(muestras), len(filas))
+            self.stdout.write(
+                f"{consulta:<16}{tiempos['icontains'][0]:>16.1f}{tiempos['indice'][0]:>14.1f}{tiempos['indice'][1]:>11}"
+            )
+
+
+class _Revertir(Exception):
+    """Fuerza el rollback de los datos sintéticos"""
@@ -0,0 +1,18 @@
+# productos/management/commands/liberar_reservas.py
+from django.core.management.base import BaseCommand
+from productos import reservas
+
+
+class Command(BaseCommand):
+    help = (
+        'Borra las reservas de stock vencidas de carritos abandonados. '
+        'Pensado para cron (p. ej. cada 5 minutos); las reservas vencidas '
+        'ya no cuentan para el stock disponible aunque no se hayan borrado.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=reservas.TAMANO_LOTE, help='Reservas por DELETE')
+
+    def handle(self, *args, **options):
+        total = reservas.liberar_vencidas(tamano_lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(f'✅ {total} reservas vencidas liberadas'))
@@ -0,0 +1,20 @@
+# productos/management/commands/reindexar_busqueda.py
+from django.core.management.base import BaseCommand
+from productos.models import Producto
+from productos import busqueda
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye el índice de búsqueda de productos (TerminoBusqueda)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--negocio', type=int, help='Reindexar solo los productos de este negocio')
+        parser.add_argument('--lote', type=int, default=busqueda.TAMANO_LOTE, help='Productos por lote')
+
+    def handle(self, *args, **options):
+        productos = Producto.objects.all()
+        if options['negocio']:
+            productos = productos.filter(negocio_id=options['negocio'])
+
+        total = busqueda.reindexar_productos(productos, tamano_lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(f'✅ {total} productos reindexados'))
@@ -0,0 +1,72 @@
+# Generated by Django 5.2.7 on 2026-10-18 10:05
+
+import re
+import unicodedata
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Copia del tokenizador de productos.busqueda al momento de la migración: el
+# índice inicial no debe cambiar si luego cambia el código de la app
+PESOS = {'nombre': 10, 'codigo': 8, 'categoria': 4, 'negocio': 3, 'descripcion': 1}
+SEPARADOR = re.compile(r'[^0-9a-z]+')
+LARGO_TOKEN = 50
+
+
+def tokenizar(texto):
+    descompuesto = unicodedata.normalize('NFKD', texto or '')
+    normalizado = ''.join(c for c in descompuesto if not unicodedata.combining(c)).lower()
+    tokens = []
+    for token in SEPARADOR.split(normalizado):
+        token = token[:LARGO_TOKEN]
+        if token and token not in tokens:
+            tokens.append(token)
+    return tokens
+
+
+def construir_indice(apps, schema_editor):
+    Producto = apps.get_model('productos', 'Producto')
+    TerminoBusqueda = apps.get_model('productos', 'TerminoBusqueda')
+
+    terminos = []
+    for producto in Producto.objects.filter(activo=True).select_related('categoria', 'negocio').iterator():
+        textos = {
+            'nombre': producto.nombre,
+            'codigo': producto.codigo,
+            'descripcion': producto.descripcion,
+            'categoria': producto.categoria.nombre if producto.categoria else '',
+            'negocio': producto.negocio.nombre,
+        }
+        for campo, peso in PESOS.items():
+            for token in tokenizar(textos[campo]):
+                terminos.append(TerminoBusqueda(producto_id=producto.pk, campo=campo, token=token, peso=peso))
+        if len(terminos) >= 5000:
+            TerminoBusqueda.objects.bulk_create(terminos)
+            terminos = []
+    TerminoBusqueda.objects.bulk_create(terminos)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0002_producto_requiere_embalaje_especial_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TerminoBusqueda',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=50)),
+                ('campo', models.CharField(choices=[('nombre', 'Nombre'), ('codigo', 'Código'), ('categoria', 'Categoría'), ('negocio', 'Negocio'), ('descripcion', 'Descripción')], max_length=20)),
+                ('peso', models.PositiveSmallIntegerField(default=1)),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='terminos_busqueda', to='productos.producto')),
+            ],
+            options={
+                'verbose_name': 'Término de Búsqueda',
+                'verbose_name_plural': 'Términos de Búsqueda',
+                'indexes': [models.Index(fields=['token', 'producto', 'peso'], name='productos_t_token_a8923a_idx'), models.Index(fields=['producto', 'campo'], name='productos_t_product_024e91_idx')],
+            },
+        ),
+        migrations.RunPython(construir_indice, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.7 on 2026-10-18 10:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0003_terminobusqueda'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['activo', 'nombre', 'id'], name='productos_p_activo_926507_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.7 on 2026-10-18 10:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('carrito', '0004_remove_carrito_unique_carrito_activo_por_usuario_negocio_and_more'),
+        ('productos', '0004_producto_indice_catalogo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReservaStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cantidad', models.PositiveIntegerField()),
+                ('expira', models.DateTimeField()),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('carrito', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservas', to='carrito.carrito')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservas', to='productos.producto')),
+            ],
+            options={
+                'verbose_name': 'Reserva de Stock',
+                'verbose_name_plural': 'Reservas de Stock',
+                'indexes': [models.Index(fields=['producto', 'expira'], name='productos_r_product_e66856_idx'), models.Index(fields=['expira'], name='productos_r_expira_47ba16_idx')],
+                'unique_together': {('carrito', 'producto')},
+            },
+        ),
+    ]
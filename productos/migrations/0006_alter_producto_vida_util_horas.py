@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 11:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('productos', '0005_reservastock'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='producto',
+            name='vida_util_horas',
+            field=models.IntegerField(blank=True, help_text='Vida útil en horas desde la preparación', null=True),
+        ),
+    ]
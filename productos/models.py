@@ -15,6 +15,13 @@ class Categoria(models.Model):
         verbose_name = 'Categoría'
         verbose_name_plural = 'Categorías'
         ordering = ['nombre']
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Valor leído de `activo`, para que los contadores del sitio no consulten la BD al guardar
+        instance._activo_guardado = instance.__dict__.get('activo')
+        return instance
     
     def __str__(self):
         return self.nombre
@@ -94,7 +101,15 @@ class Producto(models.Model):
             models.Index(fields=['codigo']),
             models.Index(fields=['negocio', 'activo']),
             models.Index(fields=['tipo_almacenamiento']),  # índice útil para reportes
+            models.Index(fields=['activo', 'nombre', 'id']),  # paginación por cursor del catálogo
         ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Valor leído de `activo`, para que los contadores del sitio no consulten la BD al guardar
+        instance._activo_guardado = instance.__dict__.get('activo')
+        return instance
     
     def __str__(self):
         return f"{self.codigo} - {self.nombre}"
@@ -150,3 +165,66 @@ class ImagenProducto(models.Model):
     
     def __str__(self):
         return f"Imagen {self.orden} de {self.producto.nombre}"
+
+
+# ============================================================
+# ÍNDICE INVERTIDO DE BÚSQUEDA
+# ============================================================
+class TerminoBusqueda(models.Model):
+    """Token normalizado (sin tildes, minúsculas) → producto que lo contiene.
+
+    Se mantiene desde productos/signals.py; no editar a mano.
+    """
+
+    CAMPO_CHOICES = [
+        ('nombre', 'Nombre'),
+        ('codigo', 'Código'),
+        ('categoria', 'Categoría'),
+        ('negocio', 'Negocio'),
+        ('descripcion', 'Descripción'),
+    ]
+
+    token = models.CharField(max_length=50)
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='terminos_busqueda')
+    campo = models.CharField(max_length=20, choices=CAMPO_CHOICES)
+    peso = models.PositiveSmallIntegerField(default=1)
+
+    class Meta:
+        verbose_name = 'Término de Búsqueda'
+        verbose_name_plural = 'Términos de Búsqueda'
+        indexes = [
+            models.Index(fields=['token', 'producto', 'peso']),
+            models.Index(fields=['producto', 'campo']),
+        ]
+
+    def __str__(self):
+        return f"{self.token} → {self.producto_id} ({self.campo})"
+
+
+# ============================================================
+# RESERVAS DE STOCK (CARRITOS ACTIVOS)
+# ============================================================
+class ReservaStock(models.Model):
+    """Unidades retenidas por un carrito hasta `expira`.
+
+    Stock disponible = stock - reservas vigentes de otros carritos.
+    Ver productos/reservas.py.
+    """
+
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='reservas')
+    carrito = models.ForeignKey('carrito.Carrito', on_delete=models.CASCADE, related_name='reservas')
+    cantidad = models.PositiveIntegerField()
+    expira = models.DateTimeField()
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Reserva de Stock'
+        verbose_name_plural = 'Reservas de Stock'
+        unique_together = ['carrito', 'producto']
+        indexes = [
+            models.Index(fields=['producto', 'expira']),
+            models.Index(fields=['expira']),
+        ]
+
+    def __str__(self):
+        return f"{self.cantidad}x {self.producto_id} hasta {self.expira:%H:%M}"
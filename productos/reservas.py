@@ -0,0 +1,120 @@
+# productos/reservas.py
+"""
+Reservas de stock con vencimiento para carritos activos.
+
+Agregar un producto al carrito retiene esas unidades por
+RESERVA_STOCK_MINUTOS. El stock disponible es `stock` menos las reservas
+vigentes de otros carritos; las vencidas simplemente dejan de contar y el
+comando `liberar_reservas` las borra periódicamente. El Producto solo se
+bloquea durante el instante en que se crea o cambia una reserva.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from .models import Producto, ReservaStock
+
+TAMANO_LOTE = 1000
+
+
+def duracion():
+    return timedelta(minutes=getattr(settings, 'RESERVA_STOCK_MINUTOS', 15))
+
+
+def reservado_vigente(excluir_carrito=None, ahora=None):
+    """
+    Expresión con las unidades reservadas vigentes del producto OuterRef('pk'),
+    para usar en annotate() o filter() sobre Producto.
+    """
+    reservas = ReservaStock.objects.filter(producto=OuterRef('pk'), expira__gt=ahora or timezone.now())
+    if excluir_carrito is not None:
+        reservas = reservas.exclude(carrito=excluir_carrito)
+    total = reservas.order_by().values('producto').annotate(total=Sum('cantidad')).values('total')
+    return Coalesce(Subquery(total), Value(0))
+
+
+def con_disponible(productos, excluir_carrito=None):
+    """
+    Anota `stock_disponible` en un queryset de Producto. Nunca es negativo:
+    si el stock bajó por debajo de lo reservado (ajuste manual, venta en
+    tienda) el producto queda en 0 hasta que venzan las reservas.
+    """
+    return productos.annotate(
+        stock_disponible=Greatest(F('stock') - reservado_vigente(excluir_carrito), Value(0))
+    )
+
+
+def valores_con_disponible(productos, campos, limite=None):
+    """
+    Como productos.values(*campos)[:limite] pero con 'stock' = stock disponible.
+    Mantiene la clave 'stock' para no romper a los clientes de la API.
+    """
+    if 'stock' not in campos:
+        return list(productos.values(*campos)[:limite])
+
+    consulta = ['stock_disponible' if c == 'stock' else c for c in campos]
+    filas = con_disponible(productos).values(*consulta)[:limite]
+    return [
+        {campo: fila[origen] for campo, origen in zip(campos, consulta)}
+        for fila in filas
+    ]
+
+
+def disponible(producto, excluir_carrito=None):
+    """Stock disponible de un producto (una query)."""
+    return con_disponible(
+        Producto.objects.filter(pk=producto.pk), excluir_carrito
+    ).values_list('stock_disponible', flat=True).get()
+
+
+def reservar(carrito, producto, cantidad):
+    """
+    Fija la reserva del carrito sobre `producto` en `cantidad` unidades
+    (cantidad total del item, no incremento) y renueva su vencimiento.
+    Lanza ValueError si no hay stock disponible suficiente.
+    """
+    with transaction.atomic():
+        # Bloqueo corto de la fila: serializa reservas concurrentes del mismo producto
+        Producto.objects.select_for_update().filter(pk=producto.pk).values_list('pk', flat=True).get()
+        libre = disponible(producto, excluir_carrito=carrito)
+
+        if libre < cantidad:
+            raise ValueError(f'Stock insuficiente. Solo hay {libre} disponibles')
+
+        reserva, _ = ReservaStock.objects.update_or_create(
+            carrito=carrito,
+            producto=producto,
+            defaults={'cantidad': cantidad, 'expira': timezone.now() + duracion()},
+        )
+        return reserva
+
+
+def renovar(carrito):
+    """Extiende las reservas aún vigentes del carrito (actividad del cliente)."""
+    ahora = timezone.now()
+    return ReservaStock.objects.filter(carrito=carrito, expira__gt=ahora).update(expira=ahora + duracion())
+
+
+def liberar(carrito, producto=None):
+    """Libera las reservas del carrito (o solo la de un producto)."""
+    reservas = ReservaStock.objects.filter(carrito=carrito)
+    if producto is not None:
+        reservas = reservas.filter(producto=producto)
+    return reservas.delete()[0]
+
+
+def liberar_vencidas(tamano_lote=TAMANO_LOTE):
+    """Borra reservas vencidas por lotes para no bloquear la tabla. Retorna cuántas."""
+    ahora = timezone.now()
+    total = 0
+    while True:
+        ids = list(
+            ReservaStock.objects.filter(expira__lte=ahora).values_list('id', flat=True)[:tamano_lote]
+        )
+        if not ids:
+            return total
+        total += ReservaStock.objects.filter(id__in=ids).delete()[0]
@@ -3,31 +3,33 @@ from django.utils import timezone
 from django.db.models import Q
 from .models import Producto
 from pedidos.models import Pedido
+from pedidos import prioridad
 
 class ServicioPerecederos:
     """Servicio para gestionar productos perecederos"""
     
     @staticmethod
     def obtener_pedidos_prioritarios(negocio=None):
-        """Obtiene pedidos que contienen productos perecederos"""
-        # CORREGIDO: Usar el campo real en lugar de la propiedad
-        queryset = Pedido.objects.filter(
-            estado__in=['pendiente', 'confirmado', 'preparando'],
-            items__producto__tipo_almacenamiento__in=['refrigerado', 'congelado', 'fresco']
-        ).distinct()
-        
-        if negocio:
-            queryset = queryset.filter(negocio=negocio)
-            
-        return queryset.order_by('-fecha_pedido')
+        """
+        Pedidos por preparar con productos perecederos, del límite de
+        preparación más próximo al más lejano (con `es_urgente` anotado).
+        Lee la cola persistida en el pedido, ver pedidos/prioridad.py.
+        """
+        return prioridad.cola(negocio)
     
     @staticmethod
     def verificar_condiciones_pedido(pedido):
         """Verifica si un pedido requiere manejo especial"""
+        return ServicioPerecederos.condiciones_de_productos(
+            item.producto for item in pedido.items.select_related('producto')
+        )
+    
+    @staticmethod
+    def condiciones_de_productos(productos):
+        """Igual que verificar_condiciones_pedido pero sobre productos ya cargados (sin queries)"""
         productos_especiales = []
         
-        for item in pedido.items.all():
-            producto = item.producto
+        for producto in productos:
             # CORREGIDO: Usar el campo real
             if producto.tipo_almacenamiento != 'ambiente':
                 productos_especiales.append({
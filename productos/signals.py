@@ -0,0 +1,58 @@
+# productos/signals.py
+from django.db.models.signals import post_save, pre_save, pre_delete
+from django.dispatch import receiver
+from carrito.models import Carrito, ItemCarrito
+from usuarios.models import Negocio
+from .models import Producto, Categoria, TerminoBusqueda
+from . import busqueda
+
+
+@receiver(post_save, sender=Producto)
+def indexar_producto(sender, instance, update_fields=None, **kwargs):
+    """Mantener el índice de búsqueda al crear/editar un producto"""
+    # Saves parciales que no tocan campos indexados (p. ej. solo stock) no reindexan
+    if update_fields is not None and not busqueda.CAMPOS_INDEXADOS.intersection(update_fields):
+        return
+    busqueda.indexar_producto(instance)
+
+
+@receiver(pre_save, sender=Categoria)
+@receiver(pre_save, sender=Negocio)
+def recordar_nombre_anterior(sender, instance, **kwargs):
+    """Guardar el nombre previo para reindexar solo si cambió"""
+    if instance.pk:
+        instance._nombre_anterior = sender.objects.filter(pk=instance.pk).values_list('nombre', flat=True).first()
+
+
+@receiver(post_save, sender=Categoria)
+def reindexar_categoria(sender, instance, created, **kwargs):
+    """Al renombrar una categoría, reescribir solo los términos de ese campo"""
+    if created or getattr(instance, '_nombre_anterior', None) == instance.nombre:
+        return
+    busqueda.reindexar_productos(instance.productos.all(), campos=['categoria'])
+
+
+@receiver(pre_delete, sender=Categoria)
+def limpiar_categoria(sender, instance, **kwargs):
+    """Los productos quedan con categoria=NULL (SET_NULL) sin pasar por save()"""
+    TerminoBusqueda.objects.filter(producto__categoria=instance, campo='categoria').delete()
+
+
+@receiver(post_save, sender=Negocio)
+def reindexar_negocio(sender, instance, created, **kwargs):
+    """Al renombrar un negocio, reescribir solo los términos de ese campo"""
+    if created or getattr(instance, '_nombre_anterior', None) == instance.nombre:
+        return
+    busqueda.reindexar_productos(instance.productos.all(), campos=['negocio'])
+
+
+@receiver(pre_delete, sender=Producto)
+def descontar_de_carritos(sender, instance, **kwargs):
+    """
+    Los items de carrito del producto se borran en cascada sin pasar por
+    ItemCarrito.delete(): descontarlos aquí de los totales de cada carrito
+    (dentro de la transacción del delete)
+    """
+    items = ItemCarrito.objects.filter(producto=instance).values_list('carrito_id', 'cantidad', 'precio_unitario')
+    for carrito_id, cantidad, precio_unitario in items:
+        Carrito.ajustar_totales(carrito_id, -cantidad, -cantidad * precio_unitario)
@@ -1,3 +1,249 @@
-from django.test import TestCase
+import io
+import threading
+from datetime import timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, skipUnlessDBFeature
+from django.utils import timezone
+
+from carrito.models import Carrito
+from productos import busqueda, catalogo, reservas
+from productos.models import Categoria, Producto, ReservaStock, TerminoBusqueda
+from usuarios.models import Usuario, Negocio
+
+
+def crear_negocio():
+    comerciante = Usuario.objects.create(username='comerciante', tipo_usuario='comerciante')
+    return Negocio.objects.create(
+        propietario=comerciante,
+        nombre='Almacén Test',
+        direccion='Camino Rural Km 5',
+        telefono='+56912345678',
+        email='almacen@test.cl',
+        horario_apertura='08:00',
+        horario_cierre='20:00',
+        dias_atencion='Lunes a Sábado',
+    )
+
+
+class BusquedaProductosTest(TestCase):
+    def setUp(self):
+        self.negocio = crear_negocio()
+        self.categoria = Categoria.objects.create(nombre='Lácteos')
+
+    def producto(self, codigo, nombre, **campos):
+        return Producto.objects.create(
+            negocio=self.negocio, codigo=codigo, nombre=nombre, precio=Decimal('1000'), stock=5, **campos
+        )
+
+    def test_sin_tildes_y_por_prefijo(self):
+        platano = self.producto('PLA-1', 'Plátano Ñuble')
+
+        self.assertEqual(busqueda.buscar('platano'), [platano.pk])
+        self.assertEqual(busqueda.buscar('PLÁT nuble'), [platano.pk])
+        # Solo inicio de palabra: no hay coincidencia por subcadena
+        self.assertEqual(busqueda.buscar('tano'), [])
+        self.assertEqual(busqueda.buscar('platano manzana'), [])
+
+    def test_ranking_por_campo_y_coincidencia_exacta(self):
+        en_descripcion = self.producto('DES-1', 'Queso', descripcion='Ideal con leche')
+        en_categoria = self.producto('CAT-1', 'Yogur', categoria=self.categoria)
+        prefijo = self.producto('NOM-1', 'Lechera condensada')
+        exacto = self.producto('NOM-2', 'Leche entera')
+
+        self.assertEqual(busqueda.buscar('leche'), [exacto.pk, prefijo.pk, en_descripcion.pk])
+        self.assertEqual(busqueda.buscar('lacteos'), [en_categoria.pk])
+
+    def test_senales_mantienen_el_indice(self):
+        producto = self.producto('LEC-1', 'Leche', categoria=self.categoria)
+
+        producto.nombre = 'Mantequilla'
+        producto.save()
+        self.assertEqual(busqueda.buscar('leche'), [])
+        self.assertEqual(busqueda.buscar('mantequilla'), [producto.pk])
+
+        self.categoria.nombre = 'Refrigerados'
+        self.categoria.save()
+        self.assertEqual(busqueda.buscar('refrigerados'), [producto.pk])
+        self.assertEqual(busqueda.buscar('lacteos'), [])
+
+        producto.activo = False
+        producto.save()
+        self.assertFalse(TerminoBusqueda.objects.filter(producto=producto).exists())
+
+    def test_indica_resultados_truncados(self):
+        for i in range(3):
+            self.producto(f'LEC-{i}', f'Leche {i}')
+
+        respuesta = self.client.get('/api/productos/buscar/', {'q': 'leche', 'limit': 2}).json()
+        self.assertEqual((len(respuesta['productos']), respuesta['truncado']), (2, True))
+        respuesta = self.client.get('/api/productos/buscar/', {'q': 'leche', 'limit': 3}).json()
+        self.assertEqual((len(respuesta['productos']), respuesta['truncado']), (3, False))
+        self.assertEqual(self.client.get('/api/productos/buscar/', {'q': 'leche', 'limit': '0'}).status_code, 400)
+        self.assertEqual(busqueda.leer_limite('1000'), busqueda.LIMITE_MAXIMO)
+
+    def test_filtra_por_categoria(self):
+        yogur = self.producto('LAC-1', 'Yogur natural', categoria=self.categoria)
+        self.producto('ABA-1', 'Arroz natural')
+
+        respuesta = self.client.get('/api/productos/buscar/', {'q': 'natural', 'categoria': self.categoria.pk})
+        self.assertEqual([p['id'] for p in respuesta.json()['productos']], [yogur.pk])
+        respuesta = self.client.get('/api/productos/buscar/', {'categoria': self.categoria.pk})
+        self.assertEqual([p['id'] for p in respuesta.json()['productos']], [yogur.pk])
+        self.assertEqual(self.client.get('/api/productos/buscar/', {'categoria': 'x'}).status_code, 400)
+
+
+class CatalogoPaginadoTest(TestCase):
+    def setUp(self):
+        self.negocio = crear_negocio()
+        for i, nombre in enumerate(['Arroz', 'Azúcar', 'Café', 'Café', 'Harina', 'Té']):
+            self.producto(f'P-{i}', nombre)
+
+    def producto(self, codigo, nombre, **campos):
+        return Producto.objects.create(
+            negocio=self.negocio, codigo=codigo, nombre=nombre, precio=Decimal('1000'), stock=5, **campos
+        )
+
+    def pagina(self, **params):
+        respuesta = self.client.get('/api/productos/', params)
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta.json()
+
+    def test_cursor_estable_ante_inserciones(self):
+        primera = self.pagina(limit=3, fields='nombre', count=1)
+        self.assertEqual([p['nombre'] for p in primera['productos']], ['Arroz', 'Azúcar', 'Café'])
+        self.assertEqual(primera['total'], 6)
+
+        # Un producto nuevo antes del cursor no desplaza la página siguiente
+        self.producto('P-NUEVO', 'Aceite')
+        vistos = [p['id'] for p in primera['productos']]
+        cursor = primera['next']
+        while cursor:
+            pagina = self.pagina(limit=3, fields='nombre', cursor=cursor)
+            self.assertNotIn('total', pagina)
+            vistos.extend(p['id'] for p in pagina['productos'])
+            cursor = pagina['next']
+
+        esperados = list(
+            Producto.objects.exclude(codigo='P-NUEVO').order_by('nombre', 'id').values_list('id', flat=True)
+        )
+        self.assertEqual(vistos, esperados)
+
+    def test_filtra_por_categoria(self):
+        categoria = Categoria.objects.create(nombre='Bebidas')
+        jugos = [self.producto(f'J-{i}', f'Jugo {i}', categoria=categoria) for i in range(3)]
+
+        primera = self.pagina(limit=2, fields='nombre', categoria=categoria.pk, count=1)
+        segunda = self.pagina(limit=2, fields='nombre', categoria=categoria.pk, cursor=primera['next'])
+
+        self.assertEqual(primera['total'], 3)
+        self.assertEqual([p['id'] for p in primera['productos'] + segunda['productos']], [j.pk for j in jugos])
+        self.assertIsNone(segunda['next'])
+        self.assertEqual(self.client.get('/api/productos/', {'categoria': 'x'}).status_code, 400)
+
+    def test_cursor_invalido(self):
+        for cursor in ('no-es-base64!', catalogo.codificar_cursor('Arroz', 1)[:-3], 'WyJ4Il0'):
+            respuesta = self.client.get('/api/productos/', {'cursor': cursor})
+            self.assertEqual(respuesta.status_code, 400, cursor)
+            self.assertIn('error', respuesta.json())
+
+    def test_limite(self):
+        self.assertEqual(catalogo._limite(None), catalogo.LIMITE_POR_DEFECTO)
+        self.assertEqual(catalogo._limite(str(catalogo.LIMITE_MAXIMO + 500)), catalogo.LIMITE_MAXIMO)
+        for limite in ('0', '-1', 'abc'):
+            self.assertEqual(self.client.get('/api/productos/', {'limit': limite}).status_code, 400)
+        self.assertEqual(len(self.pagina(limit=1000)['productos']), 6)
+
+
+class ReservasStockTest(TestCase):
+    def setUp(self):
+        self.negocio = crear_negocio()
+        self.producto = Producto.objects.create(
+            negocio=self.negocio, codigo='PAN-1', nombre='Pan', precio=Decimal('500'), stock=5,
+        )
+
+    def carrito(self, nombre):
+        return Carrito.objects.create(usuario=Usuario.objects.create(username=nombre), negocio=self.negocio)
+
+    def test_reserva_retiene_stock_hasta_vencer(self):
+        primero, segundo = self.carrito('uno'), self.carrito('dos')
+        reservas.reservar(primero, self.producto, 3)
+
+        self.assertEqual(reservas.disponible(self.producto), 2)
+        self.assertEqual(reservas.disponible(self.producto, excluir_carrito=primero), 5)
+        with self.assertRaisesMessage(ValueError, 'Solo hay 2 disponibles'):
+            reservas.reservar(segundo, self.producto, 3)
+
+        # Reservar de nuevo fija la cantidad total, no la suma
+        reservas.reservar(primero, self.producto, 1)
+        self.assertEqual(reservas.disponible(self.producto), 4)
+
+        ReservaStock.objects.update(expira=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(reservas.disponible(self.producto), 5)
+        reservas.reservar(segundo, self.producto, 5)
+
+    def test_disponible_no_es_negativo(self):
+        reservas.reservar(self.carrito('uno'), self.producto, 4)
+        Producto.objects.filter(pk=self.producto.pk).update(stock=2)
+
+        self.assertEqual(reservas.disponible(self.producto), 0)
+        filas = reservas.valores_con_disponible(Producto.objects.filter(pk=self.producto.pk), ('id', 'stock'))
+        self.assertEqual(filas, [{'id': self.producto.pk, 'stock': 0}])
+
+    def test_liberar_reservas_borra_solo_vencidas(self):
+        vencida = reservas.reservar(self.carrito('uno'), self.producto, 1)
+        vigente = reservas.reservar(self.carrito('dos'), self.producto, 1)
+        ReservaStock.objects.filter(pk=vencida.pk).update(expira=timezone.now() - timedelta(minutes=1))
+        otra = self.carrito('tres')
+        ReservaStock.objects.create(
+            carrito=otra, producto=self.producto, cantidad=1, expira=timezone.now() - timedelta(hours=1)
+        )
+
+        call_command('liberar_reservas', lote=1, stdout=io.StringIO())
+
+        self.assertEqual(list(ReservaStock.objects.values_list('pk', flat=True)), [vigente.pk])
+
+
+@skipUnlessDBFeature('test_db_allows_multiple_connections')
+class ReservasConcurrentesTest(TransactionTestCase):
+    """20 carritos reservan a la vez una unidad de un producto con 5."""
+
+    CARRITOS = 20
+    STOCK = 5
+
+    def test_no_sobrerreserva(self):
+        negocio = crear_negocio()
+        producto = Producto.objects.create(
+            negocio=negocio, codigo='PAN-1', nombre='Pan', precio=Decimal('500'), stock=self.STOCK,
+        )
+        carritos = [
+            Carrito.objects.create(usuario=Usuario.objects.create(username=f'cliente{i}'), negocio=negocio)
+            for i in range(self.CARRITOS)
+        ]
+
+        barrera = threading.Barrier(self.CARRITOS)
+        exitos, rechazos, errores = [], [], []
+
+        def reservar(carrito):
+            try:
+                barrera.wait()
+                exitos.append(reservas.reservar(carrito, producto, 1))
+            except ValueError as e:
+                rechazos.append(str(e))
+            except Exception as e:
+                errores.append(e)
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=reservar, args=(c,)) for c in carritos]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        self.assertEqual(errores, [])
+        self.assertEqual(len(exitos), self.STOCK)
+        self.assertEqual(len(rechazos), self.CARRITOS - self.STOCK)
+        self.assertEqual(reservas.disponible(producto), 0)
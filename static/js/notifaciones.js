@@ -6,17 +6,28 @@
 class NotificacionesManager {
     constructor() {
         this.pollingInterval = null;
-        this.pollingTime = 10000; // 10 segundos
+        this.pollingTime = 10000; // 10 segundos (solo si no hay stream)
+        this.eventSource = null;
+        this.erroresStream = 0;
+        this.ultimoId = 0;
+        this.contador = 0;
         this.notificacionesVistas = new Set();
         this.init();
     }
 
-    init() {
+    async init() {
         console.log('🔔 Sistema de notificaciones iniciado');
-        this.cargarNotificaciones();
+        this.cargarContador();
+        await this.cargarNotificaciones();
         this.cargarListaCompleta();
-        this.iniciarPolling();
         this.configurarEventListeners();
+
+        // Recibir las nuevas por push; polling solo como respaldo
+        if (window.EventSource) {
+            this.iniciarStream();
+        } else {
+            this.iniciarPolling();
+        }
     }
 
     // ============================================
@@ -36,14 +47,36 @@ class NotificacionesManager {
 
             if (response.ok) {
                 const data = await response.json();
-                this.actualizarBadge(data.count);
                 this.mostrarNotificacionesNuevas(data.notificaciones);
+                data.notificaciones.forEach(notif => {
+                    this.ultimoId = Math.max(this.ultimoId, notif.id);
+                });
             }
         } catch (error) {
             console.error('Error al cargar notificaciones:', error);
         }
     }
 
+    async cargarContador() {
+        // Contador en caché del servidor: no consulta la tabla de notificaciones
+        try {
+            const response = await fetch('/api/notificaciones/contador/', {
+                method: 'GET',
+                headers: {
+                    'X-Requested-With': 'XMLHttpRequest'
+                },
+                credentials: 'include'
+            });
+
+            if (response.ok) {
+                const data = await response.json();
+                this.actualizarBadge(data.no_leidas);
+            }
+        } catch (error) {
+            console.error('Error al cargar contador:', error);
+        }
+    }
+
     async cargarListaCompleta() {
         try {
             const response = await fetch('/api/notificaciones/', {
@@ -65,18 +98,67 @@ class NotificacionesManager {
     }
 
     // ============================================
-    // POLLING AUTOMÁTICO
+    // PUSH (SERVER-SENT EVENTS)
+    // ============================================
+
+    iniciarStream() {
+        // Al reconectar el navegador envía Last-Event-ID y recibe lo pendiente
+        this.eventSource = new EventSource(`/api/notificaciones/stream/?ultimo_id=${this.ultimoId}`);
+
+        this.eventSource.addEventListener('notificacion', (e) => {
+            const notif = JSON.parse(e.data);
+            this.erroresStream = 0;
+            this.ultimoId = Math.max(this.ultimoId, notif.id);
+            if (this.notificacionesVistas.has(notif.id)) return;
+
+            this.mostrarNotificacionesNuevas([notif]);
+            this.actualizarBadge(this.contador + 1);
+
+            const dropdown = document.getElementById('notificaciones-dropdown');
+            if (dropdown && dropdown.classList.contains('show')) {
+                this.cargarListaCompleta();
+            }
+        });
+
+        this.eventSource.onopen = () => {
+            this.erroresStream = 0;
+        };
+
+        this.eventSource.onerror = () => {
+            this.erroresStream++;
+            // CLOSED: el servidor rechazó el stream (503 bajo WSGI) y el
+            // navegador no reintenta; 3 errores: proxy que corta la conexión
+            if (this.eventSource.readyState === EventSource.CLOSED || this.erroresStream >= 3) {
+                this.detenerStream();
+                this.iniciarPolling();
+            }
+        };
+    }
+
+    detenerStream() {
+        if (this.eventSource) {
+            this.eventSource.close();
+            this.eventSource = null;
+        }
+    }
+
+    // ============================================
+    // POLLING (RESPALDO)
     // ============================================
 
     iniciarPolling() {
+        if (this.pollingInterval) return;
         this.pollingInterval = setInterval(() => {
+            this.cargarContador();
             this.cargarNotificaciones();
         }, this.pollingTime);
     }
 
     detenerPolling() {
+        this.detenerStream();
         if (this.pollingInterval) {
             clearInterval(this.pollingInterval);
+            this.pollingInterval = null;
         }
     }
 
@@ -85,6 +167,7 @@ class NotificacionesManager {
     // ============================================
 
     actualizarBadge(count) {
+        this.contador = count;
         const badge = document.getElementById('notificaciones-badge');
         if (badge) {
             if (count > 0) {
@@ -229,8 +312,8 @@ class NotificacionesManager {
             });
 
             if (response.ok) {
-                // Recargar notificaciones
-                this.cargarNotificaciones();
+                // Recargar contador y lista
+                this.cargarContador();
                 this.cargarListaCompleta();
             }
         } catch (error) {
@@ -250,7 +333,6 @@ class NotificacionesManager {
             });
 
             if (response.ok) {
-                this.cargarNotificaciones();
                 this.cargarListaCompleta();
                 this.actualizarBadge(0);
             }
@@ -368,7 +450,7 @@ document.addEventListener('DOMContentLoaded', () => {
     }
 });
 
-// Detener polling cuando se cierra la página
+// Cerrar el stream / detener polling cuando se cierra la página
 window.addEventListener('beforeunload', () => {
     if (window.notificacionesManager) {
         window.notificacionesManager.detenerPolling();
@@ -0,0 +1,19 @@
+# tareas/admin.py
+from django.contrib import admin
+from .models import Tarea
+
+
+@admin.register(Tarea)
+class TareaAdmin(admin.ModelAdmin):
+    list_display = ['id', 'nombre', 'estado', 'intentos', 'disponible_desde', 'fecha_creacion']
+    list_filter = ['estado', 'nombre']
+    readonly_fields = ['fecha_creacion', 'fecha_actualizacion']
+    actions = ['reintentar']
+
+    def reintentar(self, request, queryset):
+        from django.utils import timezone
+        cantidad = queryset.filter(estado='fallida').update(
+            estado='pendiente', intentos=0, disponible_desde=timezone.now()
+        )
+        self.message_user(request, f"{cantidad} tareas reprogramadas")
+    reintentar.short_description = "Reintentar tareas fallidas"
@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+from django.utils.module_loading import autodiscover_modules
+
+
+class TareasConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'tareas'
+
+    def ready(self):
+        # Registra los manejadores definidos en <app>/tareas.py
+        autodiscover_modules('tareas')
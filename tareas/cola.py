@@ -0,0 +1,198 @@
+# tareas/cola.py
+"""
+Cola de tareas en segundo plano respaldada por la tabla Tarea.
+
+    @tarea('notificaciones.entregar')
+    def entregar(ids):
+        ...
+
+    encolar('notificaciones.entregar', ids=[1, 2, 3])
+
+`encolar` inserta la fila dentro de la transacción en curso y, al
+confirmarse, avisa al worker según settings.TAREAS_MODO:
+
+- 'hilo': un hilo de fondo por proceso las ejecuta (la petición no espera).
+- 'inmediato': se ejecutan al confirmarse, en el mismo hilo (tests y
+  desarrollo).
+- 'externo': no se avisa a nadie; las procesa `manage.py procesar_tareas`
+  corriendo aparte (con varios workers a la vez, cada tarea se reclama con
+  SELECT ... FOR UPDATE SKIP LOCKED).
+
+Los manejadores se registran con @tarea en un módulo <app>/tareas.py
+(TareasConfig.ready los importa) y reciben los `datos` como kwargs, dentro
+de una transacción. Si fallan se reintentan con espera exponencial hasta
+max_intentos; al agotarlos la tarea queda 'fallida' y, si se registró con
+@tarea(nombre, al_agotar=funcion), se llama a `funcion(**datos)` (en su
+propia transacción) para que el dominio no quede esperando un resultado
+que no llegará. `manage.py procesar_tareas` también recoge lo que un
+proceso dejó a medias (tareas 'en_proceso' sin avance por
+TAREAS_TIMEOUT_SEGUNDOS).
+"""
+import logging
+import threading
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, connections, transaction
+from django.db.models import F, Min, Q
+from django.utils import timezone
+
+from .models import Tarea
+
+logger = logging.getLogger(__name__)
+
+TAMANO_LOTE = 50
+
+_manejadores = {}
+_al_agotar = {}
+
+
+def tarea(nombre, al_agotar=None):
+    """
+    Decorador: registra la función como manejador de las tareas `nombre`.
+    `al_agotar(**datos)` se ejecuta cuando una tarea falla su último intento.
+    """
+    def registrar(funcion):
+        _manejadores[nombre] = funcion
+        if al_agotar is not None:
+            _al_agotar[nombre] = al_agotar
+        return funcion
+    return registrar
+
+
+def encolar(nombre, max_intentos=5, **datos):
+    """Crea la tarea (en la transacción actual) y avisa al worker al confirmarse."""
+    if nombre not in _manejadores:
+        raise ValueError(f'Tarea no registrada: {nombre}')
+    nueva = Tarea.objects.create(nombre=nombre, datos=datos, max_intentos=max_intentos)
+    transaction.on_commit(despertar)
+    return nueva
+
+
+def despertar():
+    modo = getattr(settings, 'TAREAS_MODO', 'hilo')
+    if modo == 'inmediato':
+        procesar_pendientes()
+    elif modo == 'hilo':
+        if connection.in_atomic_block:
+            # on_commit ejecutado dentro de una transacción externa (p. ej.
+            # TestCase): otra conexión aún no ve las tareas, procesarlas aquí
+            procesar_pendientes()
+        else:
+            _trabajador().despertar()
+
+
+# ============================================================
+# PROCESAMIENTO
+# ============================================================
+
+def _reclamables(ahora):
+    vencidas = ahora - timedelta(seconds=getattr(settings, 'TAREAS_TIMEOUT_SEGUNDOS', 300))
+    return Tarea.objects.filter(
+        Q(estado='pendiente', disponible_desde__lte=ahora)
+        | Q(estado='en_proceso', fecha_actualizacion__lt=vencidas)
+    )
+
+
+def reclamar(limite=TAMANO_LOTE):
+    """Marca hasta `limite` tareas como en proceso y las retorna (otros workers las saltan)."""
+    ahora = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            _reclamables(ahora).select_for_update(skip_locked=True)
+            .order_by('id').values_list('id', flat=True)[:limite]
+        )
+        if not ids:
+            return []
+        Tarea.objects.filter(id__in=ids).update(
+            estado='en_proceso', intentos=F('intentos') + 1, fecha_actualizacion=ahora
+        )
+    return list(Tarea.objects.filter(id__in=ids))
+
+
+def ejecutar(pendiente):
+    """Ejecuta una tarea reclamada; la borra si termina bien o la reprograma si falla."""
+    try:
+        manejador = _manejadores[pendiente.nombre]
+        with transaction.atomic():
+            manejador(**pendiente.datos)
+    except Exception:
+        logger.exception('Falló la tarea %s #%s', pendiente.nombre, pendiente.pk)
+        base = getattr(settings, 'TAREAS_REINTENTO_SEGUNDOS', 30)
+        agotada = pendiente.intentos >= pendiente.max_intentos
+        Tarea.objects.filter(pk=pendiente.pk).update(
+            estado='fallida' if agotada else 'pendiente',
+            disponible_desde=timezone.now() + timedelta(seconds=base * 2 ** (pendiente.intentos - 1)),
+            error=traceback.format_exc(),
+        )
+        if agotada and pendiente.nombre in _al_agotar:
+            try:
+                with transaction.atomic():
+                    _al_agotar[pendiente.nombre](**pendiente.datos)
+            except Exception:
+                logger.exception('Falló al_agotar de la tarea %s #%s', pendiente.nombre, pendiente.pk)
+        return False
+    Tarea.objects.filter(pk=pendiente.pk).delete()
+    return True
+
+
+def procesar_pendientes(limite=TAMANO_LOTE):
+    """Procesa tareas disponibles hasta vaciar la cola. Retorna cuántas se ejecutaron."""
+    total = 0
+    while True:
+        lote = reclamar(limite)
+        if not lote:
+            return total
+        for pendiente in lote:
+            ejecutar(pendiente)
+        total += len(lote)
+
+
+def segundos_hasta_proxima():
+    """Segundos hasta la próxima tarea programada (reintentos), o None si no hay."""
+    proxima = Tarea.objects.filter(estado='pendiente').aggregate(proxima=Min('disponible_desde'))['proxima']
+    if proxima is None:
+        return None
+    return max((proxima - timezone.now()).total_seconds(), 0)
+
+
+# ============================================================
+# WORKER EN HILO (TAREAS_MODO = 'hilo')
+# ============================================================
+
+class _Trabajador(threading.Thread):
+    def __init__(self):
+        super().__init__(name='tareas', daemon=True)
+        self._evento = threading.Event()
+
+    def despertar(self):
+        self._evento.set()
+
+    def run(self):
+        espera = None
+        while True:
+            self._evento.wait(espera)
+            self._evento.clear()
+            try:
+                procesar_pendientes()
+                espera = segundos_hasta_proxima()
+            except Exception:
+                logger.exception('Error en el worker de tareas')
+                espera = getattr(settings, 'TAREAS_REINTENTO_SEGUNDOS', 30)
+            finally:
+                # No dejar conexiones abiertas mientras el hilo duerme
+                connections.close_all()
+
+
+_hilo = None
+_hilo_lock = threading.Lock()
+
+
+def _trabajador():
+    global _hilo
+    with _hilo_lock:
+        if _hilo is None or not _hilo.is_alive():
+            _hilo = _Trabajador()
+            _hilo.start()
+    return _hilo
@@ -0,0 +1,30 @@
+# tareas/management/commands/procesar_tareas.py
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from tareas import cola
+
+
+class Command(BaseCommand):
+    help = 'Worker de tareas en segundo plano (para TAREAS_MODO = "externo" o para recoger pendientes)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--una-vez', action='store_true', help='Procesar lo pendiente y salir')
+        parser.add_argument('--intervalo', type=float, default=2.0, help='Segundos entre consultas con la cola vacía')
+        parser.add_argument('--lote', type=int, default=cola.TAMANO_LOTE, help='Tareas reclamadas por consulta')
+
+    def handle(self, *args, **options):
+        if options['una_vez']:
+            total = cola.procesar_pendientes(options['lote'])
+            self.stdout.write(self.style.SUCCESS(f'✅ {total} tareas procesadas'))
+            return
+
+        self.stdout.write('🔄 Procesando tareas (Ctrl+C para salir)...')
+        try:
+            while True:
+                close_old_connections()
+                if not cola.procesar_pendientes(options['lote']):
+                    time.sleep(options['intervalo'])
+        except KeyboardInterrupt:
+            self.stdout.write('👋 Worker detenido')
@@ -0,0 +1,40 @@
+# tareas/models.py
+from django.db import models
+from django.utils import timezone
+
+
+class Tarea(models.Model):
+    """
+    Trabajo pendiente para el worker en segundo plano (tareas/cola.py).
+
+    Se inserta en la misma transacción que la escritura que lo origina
+    (outbox): si la transacción se revierte, la tarea tampoco existe. Las
+    tareas exitosas se borran; las que agotan sus intentos quedan como
+    'fallida' para revisarlas.
+    """
+    ESTADOS = [
+        ('pendiente', 'Pendiente'),
+        ('en_proceso', 'En proceso'),
+        ('fallida', 'Fallida'),
+    ]
+
+    nombre = models.CharField(max_length=100)
+    datos = models.JSONField(default=dict)
+    estado = models.CharField(max_length=20, choices=ESTADOS, default='pendiente')
+    intentos = models.PositiveIntegerField(default=0)
+    max_intentos = models.PositiveIntegerField(default=5)
+    disponible_desde = models.DateTimeField(default=timezone.now)
+    error = models.TextField(blank=True)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Tarea'
+        verbose_name_plural = 'Tareas'
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['estado', 'disponible_desde']),  # reclamar pendientes
+        ]
+
+    def __str__(self):
+        return f"{self.nombre} #{self.pk} ({self.estado})"
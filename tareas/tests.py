@@ -0,0 +1,69 @@
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from tareas import cola
+from tareas.models import Tarea
+
+ejecutadas = []
+
+
+@cola.tarea('tests.registrar')
+def registrar(valor):
+    ejecutadas.append(valor)
+
+
+@cola.tarea('tests.fallar', al_agotar=lambda: ejecutadas.append('agotada'))
+def fallar():
+    raise RuntimeError('gateway caído')
+
+
+@override_settings(TAREAS_MODO='externo')
+class ColaTareasTest(TestCase):
+    def setUp(self):
+        ejecutadas.clear()
+
+    @override_settings(TAREAS_MODO='inmediato')
+    def test_se_ejecuta_al_confirmar(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            cola.encolar('tests.registrar', valor=7)
+            self.assertEqual(ejecutadas, [])
+
+        self.assertEqual(ejecutadas, [7])
+        self.assertFalse(Tarea.objects.exists())
+
+    def test_reintentos_y_fallida(self):
+        cola.encolar('tests.fallar', max_intentos=2)
+
+        self.assertEqual(cola.procesar_pendientes(), 1)
+        tarea = Tarea.objects.get()
+        self.assertEqual((tarea.estado, tarea.intentos), ('pendiente', 1))
+        self.assertGreater(tarea.disponible_desde, timezone.now())
+        self.assertIn('gateway caído', tarea.error)
+
+        # No se reintenta antes de tiempo
+        self.assertEqual(cola.procesar_pendientes(), 0)
+        self.assertEqual(ejecutadas, [])
+
+        Tarea.objects.update(disponible_desde=timezone.now() - timedelta(seconds=1))
+        cola.procesar_pendientes()
+        tarea.refresh_from_db()
+        self.assertEqual((tarea.estado, tarea.intentos), ('fallida', 2))
+        self.assertEqual(ejecutadas, ['agotada'])
+
+    def test_recupera_tareas_abandonadas(self):
+        cola.encolar('tests.registrar', valor=1)
+        # Un worker la reclamó y murió sin terminarla
+        Tarea.objects.update(
+            estado='en_proceso', fecha_actualizacion=timezone.now() - timedelta(hours=1)
+        )
+
+        cola.procesar_pendientes()
+
+        self.assertEqual(ejecutadas, [1])
+        self.assertFalse(Tarea.objects.exists())
+
+    def test_tarea_desconocida(self):
+        with self.assertRaises(ValueError):
+            cola.encolar('tests.no_existe')
@@ -1,15 +1,40 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
 from django.shortcuts import redirect
 from django.urls import reverse
 
 class RoleBasedRedirectMiddleware:
     """
     Middleware para redirigir usuarios según su rol después del login
+    
+    Soporta sync y async: bajo ASGI las vistas async (streams del chat) no
+    se ejecutan en un hilo aparte por culpa de este middleware.
     """
+    sync_capable = True
+    async_capable = True
     
     def __init__(self, get_response):
         self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
     
     def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        
+        respuesta = self.redireccion(request, request.user)
+        if respuesta is not None:
+            return respuesta
+        
+        response = self.get_response(request)
+        return response
+    
+    async def __acall__(self, request):
+        respuesta = self.redireccion(request, await request.auser())
+        if respuesta is not None:
+            return respuesta
+        return await self.get_response(request)
+    
+    def redireccion(self, request, user):
         # URLs que no necesitan redirección
         exempt_urls = [
             '/login/', '/registro/', '/logout/', '/admin/', 
@@ -17,22 +42,21 @@ class RoleBasedRedirectMiddleware:
         ]
         
         # Si el usuario está autenticado y está en la página de inicio
-        if request.user.is_authenticated and request.path == '/':
+        if user.is_authenticated and request.path == '/':
             # Redirigir según el tipo de usuario
-            if request.user.tipo_usuario == 'cliente':
+            if user.tipo_usuario == 'cliente':
                 return redirect('/cliente/dashboard/')
-            elif request.user.tipo_usuario == 'comerciante':
+            elif user.tipo_usuario == 'comerciante':
                 return redirect('/comerciante/dashboard/')
         
         # Si es cliente intentando acceder a rutas de comerciante
-        if request.user.is_authenticated and request.user.tipo_usuario == 'cliente':
+        if user.is_authenticated and user.tipo_usuario == 'cliente':
             if request.path.startswith('/comerciante/'):
                 return redirect('/cliente/dashboard/')
         
         # Si es comerciante intentando acceder a rutas de cliente
-        if request.user.is_authenticated and request.user.tipo_usuario == 'comerciante':
+        if user.is_authenticated and user.tipo_usuario == 'comerciante':
             if request.path.startswith('/cliente/'):
                 return redirect('/comerciante/dashboard/')
         
-        response = self.get_response(request)
-        return response
\ No newline at end of file
+        return None
@@ -46,6 +46,13 @@ class Negocio(models.Model):
     class Meta:
         verbose_name = 'Negocio'
         verbose_name_plural = 'Negocios'
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Valor leído de `activo`, para que los contadores del sitio no consulten la BD al guardar
+        instance._activo_guardado = instance.__dict__.get('activo')
+        return instance
     
     def __str__(self):
         return self.nombre
\ No newline at end of file
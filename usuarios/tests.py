@@ -1,3 +1,235 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from chat.models import Conversacion, Mensaje
+from pedidos import prioridad
+from pedidos.models import Pedido, DetallePedido
+from pedidos.services import EstadisticasPedidos
+from productos.models import Producto
+from usuarios.models import Usuario, Negocio
+
+
+class DashboardComercianteTest(TestCase):
+    # Sesión, usuario, negocio, 2 de estadísticas, 3 de la cola de perecederos
+    # (total, pedidos y sus detalles), 3 de pedidos recientes y stock bajo
+    MAX_QUERIES = 12
+
+    def setUp(self):
+        cache.clear()
+        self.comerciante = Usuario.objects.create_user(
+            username='comerciante', password='x', tipo_usuario='comerciante'
+        )
+        self.negocio = Negocio.objects.create(
+            propietario=self.comerciante,
+            nombre='Almacén Test',
+            direccion='Camino Rural Km 5',
+            telefono='+56912345678',
+            email='almacen@test.cl',
+            horario_apertura='08:00',
+            horario_cierre='20:00',
+            dias_atencion='Lunes a Sábado',
+        )
+        self.cliente = Usuario.objects.create(username='cliente')
+        self.leche = Producto.objects.create(
+            negocio=self.negocio, codigo='LEC-1', nombre='Leche',
+            precio=Decimal('1000'), stock=5, tipo_almacenamiento='refrigerado',
+        )
+        self.client.force_login(self.comerciante)
+
+    def crear_pedidos(self, cantidad, estado='pendiente'):
+        for _ in range(cantidad):
+            pedido = Pedido.objects.create(
+                cliente=self.cliente, negocio=self.negocio, estado=estado,
+                metodo_entrega='pickup', telefono_contacto='+56987654321', total=Decimal('2000'),
+            )
+            DetallePedido.objects.create(
+                pedido=pedido, producto=self.leche, cantidad=2, precio_unitario=Decimal('1000')
+            )
+
+    def queries_dashboard(self):
+        with CaptureQueriesContext(connection) as contexto:
+            respuesta = self.client.get('/comerciante/dashboard/')
+        self.assertEqual(respuesta.status_code, 200)
+        return len(contexto)
+
+    def test_queries_acotadas(self):
+        self.crear_pedidos(2)
+        pocos = self.queries_dashboard()
+
+        self.crear_pedidos(10, estado='confirmado')
+        EstadisticasPedidos.invalidar(self.negocio.pk)
+        muchos = self.queries_dashboard()
+
+        self.assertEqual(pocos, muchos)
+        self.assertLessEqual(muchos, self.MAX_QUERIES)
+
+        # Con las estadísticas en caché no se agrega nada
+        self.assertEqual(self.queries_dashboard(), muchos - 2)
+
+    def test_cola_perecederos_por_limite(self):
+        lechuga = Producto.objects.create(
+            negocio=self.negocio, codigo='LCH-1', nombre='Lechuga',
+            precio=Decimal('800'), stock=5, tipo_almacenamiento='fresco',
+        )
+        self.crear_pedidos(1)
+        self.crear_pedidos(1, estado='listo')
+        urgente = Pedido.objects.create(
+            cliente=self.cliente, negocio=self.negocio, metodo_entrega='pickup',
+            telefono_contacto='+56987654321', total=Decimal('800'),
+        )
+        Pedido.objects.filter(pk=urgente.pk).update(fecha_pedido=timezone.now() - timedelta(hours=1, minutes=30))
+        DetallePedido.objects.create(pedido=urgente, producto=lechuga, cantidad=1, precio_unitario=Decimal('800'))
+        DetallePedido.objects.create(pedido=urgente, producto=self.leche, cantidad=1, precio_unitario=Decimal('1000'))
+
+        respuesta = self.client.get('/comerciante/dashboard/')
+
+        self.assertEqual(respuesta.context['total_prioritarios'], 2)
+        cola = list(respuesta.context['pedidos_prioritarios'])
+        self.assertEqual(cola[0].pk, urgente.pk)
+        self.assertEqual([p.es_urgente for p in cola], [True, False])
+
+    def test_urgente_por_tiempo_desde_el_pedido(self):
+        helado = Producto.objects.create(
+            negocio=self.negocio, codigo='HEL-1', nombre='Helado',
+            precio=Decimal('3000'), stock=5, tipo_almacenamiento='congelado',
+        )
+        pedidos = []
+        for horas in (0, 1.5):
+            pedido = Pedido.objects.create(
+                cliente=self.cliente, negocio=self.negocio, metodo_entrega='pickup',
+                telefono_contacto='+56987654321', total=Decimal('3000'),
+            )
+            Pedido.objects.filter(pk=pedido.pk).update(fecha_pedido=timezone.now() - timedelta(hours=horas))
+            DetallePedido.objects.create(pedido=pedido, producto=helado, cantidad=1, precio_unitario=Decimal('3000'))
+            pedidos.append(pedido)
+
+        # Congelado: límite de 6 h, pero pasada 1 h desde el pedido ya es urgente
+        urgentes = {p.pk: p.es_urgente for p in prioridad.cola(self.negocio)}
+        self.assertEqual(urgentes, {pedidos[0].pk: False, pedidos[1].pk: True})
+
+    def test_estadisticas(self):
+        self.crear_pedidos(2)
+        self.crear_pedidos(1, estado='listo')
+        self.crear_pedidos(1, estado='cancelado')
+
+        stats = EstadisticasPedidos.calcular(self.negocio.pk)
+
+        self.assertEqual(stats['total_pedidos'], 4)
+        self.assertEqual(stats['pedidos_pendientes'], 2)
+        self.assertEqual(stats['pedidos_hoy'], 4)
+        self.assertEqual(stats['ventas_mes'], Decimal('2000'))
+        self.assertEqual(stats['total_productos'], 1)
+        self.assertEqual(stats['productos_stock_bajo'], 1)
+        self.assertEqual(
+            stats['por_estado'],
+            {'all': 4, 'pendiente': 2, 'confirmado': 0, 'preparando': 0,
+             'listo': 1, 'en_camino': 0, 'completado': 0, 'cancelado': 1},
+        )
+
+    def test_cambio_de_estado_invalida_cache(self):
+        self.crear_pedidos(1)
+        self.assertEqual(EstadisticasPedidos.de_negocio(self.negocio)['pedidos_pendientes'], 1)
+
+        pedido = Pedido.objects.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/comerciante/pedidos/{pedido.pk}/actualizar/', {'estado': 'listo'})
+
+        stats = EstadisticasPedidos.de_negocio(self.negocio)
+        self.assertEqual(stats['pedidos_pendientes'], 0)
+        self.assertEqual(stats['por_estado']['listo'], 1)
+
+
+class ChatsTest(TestCase):
+    def setUp(self):
+        self.comerciante = Usuario.objects.create_user(
+            username='comerciante', password='x', tipo_usuario='comerciante'
+        )
+        self.negocio = Negocio.objects.create(
+            propietario=self.comerciante,
+            nombre='Almacén Test',
+            direccion='Camino Rural Km 5',
+            telefono='+56912345678',
+            email='almacen@test.cl',
+            horario_apertura='08:00',
+            horario_cierre='20:00',
+            dias_atencion='Lunes a Sábado',
+        )
+        self.cliente = Usuario.objects.create_user(username='cliente', password='x', tipo_usuario='cliente')
+
+    def crear_chat(self, mensajes_cliente, mensajes_comerciante):
+        pedido = Pedido.objects.create(
+            cliente=self.cliente, negocio=self.negocio, metodo_entrega='pickup',
+            telefono_contacto='+56987654321', total=Decimal('2000'),
+        )
+        conversacion = Conversacion.de_pedido(pedido)
+        for i in range(mensajes_cliente):
+            Mensaje.objects.create(conversacion=conversacion, usuario=self.cliente, mensaje=f'hola {i}')
+        for i in range(mensajes_comerciante):
+            Mensaje.objects.create(conversacion=conversacion, usuario=self.comerciante, mensaje=f'listo {i}')
+        return conversacion
+
+    def queries(self, usuario, url):
+        self.client.force_login(usuario)
+        with CaptureQueriesContext(connection) as contexto:
+            respuesta = self.client.get(url)
+        self.assertEqual(respuesta.status_code, 200)
+        return len(contexto), respuesta
+
+    def test_contadores(self):
+        conversacion = self.crear_chat(mensajes_cliente=3, mensajes_comerciante=2)
+        conversacion.refresh_from_db()
+
+        self.assertEqual(
+            (conversacion.total_mensajes, conversacion.no_leidos_comerciante, conversacion.no_leidos_cliente),
+            (5, 3, 2),
+        )
+        self.assertEqual(conversacion.ultimo_mensaje, Mensaje.objects.last())
+
+        # Abrir el chat marca como leído lo recibido por cada participante
+        self.client.force_login(self.comerciante)
+        self.client.get(f'/chat/pedido/{conversacion.pedido_id}/')
+        conversacion.refresh_from_db()
+        self.assertEqual((conversacion.no_leidos_comerciante, conversacion.no_leidos_cliente), (0, 2))
+        self.assertEqual(Mensaje.objects.filter(leido=False, usuario=self.comerciante).count(), 2)
+
+        conversacion.ultimo_mensaje.delete()
+        conversacion.refresh_from_db()
+        self.assertEqual((conversacion.total_mensajes, conversacion.no_leidos_cliente), (4, 1))
+
+    def test_listas_sin_consultas_por_chat(self):
+        self.crear_chat(mensajes_cliente=1, mensajes_comerciante=1)
+        comerciante_pocos, _ = self.queries(self.comerciante, '/chat/comerciante/lista/')
+        cliente_pocos, _ = self.queries(self.cliente, '/cliente/mis-pedidos/')
+
+        for _ in range(3):
+            self.crear_chat(mensajes_cliente=4, mensajes_comerciante=2)
+        comerciante_muchos, respuesta = self.queries(self.comerciante, '/chat/comerciante/lista/')
+        cliente_muchos, _ = self.queries(self.cliente, '/cliente/mis-pedidos/')
+
+        self.assertEqual(comerciante_pocos, comerciante_muchos)
+        self.assertEqual(cliente_pocos, cliente_muchos)
+        self.assertEqual([chat['mensajes_no_leidos'] for chat in respuesta.context['chats']], [4, 4, 4, 1])
+
+    def test_historial_paginado(self):
+        conversacion = self.crear_chat(mensajes_cliente=35, mensajes_comerciante=0)
+        ids = list(conversacion.mensajes.values_list('id', flat=True).order_by('id'))
+
+        _, respuesta = self.queries(self.comerciante, f'/chat/pedido/{conversacion.pedido_id}/')
+        self.assertEqual([m.id for m in respuesta.context['mensajes']], ids[-30:])
+        self.assertTrue(respuesta.context['hay_anteriores'])
+
+        datos = self.client.get(
+            f'/chat/api/{conversacion.pedido_id}/anteriores/', {'antes_de_id': ids[-30], 'limite': 3}
+        ).json()
+        self.assertEqual([m['id'] for m in datos['mensajes']], ids[-33:-30])
+        self.assertTrue(datos['hay_mas'])
 
-# Create your tests here.
+        datos = self.client.get(f'/chat/api/{conversacion.pedido_id}/anteriores/', {'antes_de_id': ids[-33]}).json()
+        self.assertEqual([m['id'] for m in datos['mensajes']], ids[:2])
+        self.assertFalse(datos['hay_mas'])
@@ -42,19 +42,15 @@ def mis_pedidos(request):
         return redirect('/comerciante/dashboard/')
     
     pedidos = Pedido.objects.filter(cliente=request.user).select_related(
-        'negocio'
+        'negocio', 'conversacion'
     ).prefetch_related(
-        'items__producto',
-        'conversacion__mensajes'
+        'items__producto'
     ).order_by('-fecha_pedido')
     
-    # Contar mensajes no leídos para cada pedido
+    # Mensajes no leídos para cada pedido (contador guardado en la conversación)
     for pedido in pedidos:
         if hasattr(pedido, 'conversacion'):
-            pedido.mensajes_no_leidos = pedido.conversacion.mensajes.filter(
-                leido=False,
-                usuario=pedido.negocio.propietario  # Mensajes del comerciante no leídos
-            ).count()
+            pedido.mensajes_no_leidos = pedido.conversacion.no_leidos_cliente
         else:
             pedido.mensajes_no_leidos = 0
     
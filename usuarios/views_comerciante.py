@@ -1,16 +1,22 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse
+from django.db import transaction
 from django.db.models import Count, Sum, Q
 from django.utils import timezone
-from datetime import timedelta
 
-from pedidos.models import Pedido, DetallePedido
+from pedidos.models import Pedido
 from productos.models import Producto
 from usuarios.models import Negocio, Usuario
 
 # Servicio para detectar productos perecederos
 from productos.services import ServicioPerecederos
+from pedidos.services import EstadisticasPedidos
+from pedidos import resumenes
+from notificaciones.services import NotificacionesPedido
+
+# Pedidos perecederos que se muestran en el dashboard (los más próximos a su límite)
+LIMITE_PRIORITARIOS = 20
 
 
 # ============================================================
@@ -27,32 +33,11 @@ def dashboard_comerciante(request):
     # Obtener negocio o enviar error
     negocio = get_object_or_404(Negocio, propietario=request.user)
     
-    hoy = timezone.now()
-    inicio_mes = hoy.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    
     # Query base de pedidos
     pedidos = Pedido.objects.filter(negocio=negocio)
 
-    # Estadísticas
-    stats = {
-        'total_pedidos': pedidos.count(),
-        'pedidos_pendientes': pedidos.filter(estado__in=[
-            'pendiente', 'confirmado', 'preparando'
-        ]).count(),
-        'pedidos_hoy': pedidos.filter(
-            fecha_pedido__date=hoy.date()
-        ).count(),
-        'ventas_mes': pedidos.filter(
-            fecha_pedido__gte=inicio_mes,
-            estado__in=['completado', 'listo', 'en_camino']
-        ).aggregate(total=Sum('total'))['total'] or 0,
-        'total_productos': Producto.objects.filter(
-            negocio=negocio, activo=True
-        ).count(),
-        'productos_stock_bajo': Producto.objects.filter(
-            negocio=negocio, stock__lte=10, stock__gt=0
-        ).count(),
-    }
+    # Estadísticas (dos queries agregadas, en caché por negocio)
+    stats = EstadisticasPedidos.de_negocio(negocio)
 
     # Últimos pedidos
     pedidos_recientes = pedidos.select_related('cliente')\
@@ -66,17 +51,11 @@ def dashboard_comerciante(request):
     # =======================================================
     # 🚨 PRIORIDAD PERECEDEROS
     # =======================================================
-    servicio_perecederos = ServicioPerecederos()
-    pedidos_prioritarios = servicio_perecederos.obtener_pedidos_prioritarios(negocio)
-
-    # Marcar propiedades adicionales para templates
-    for pedido in pedidos_prioritarios:
-        # ¿Es urgente (más de una hora desde creación)?
-        tiempo_transcurrido = timezone.now() - pedido.fecha_pedido
-        pedido.es_urgente = tiempo_transcurrido > timedelta(hours=1)
-
-        # Tiene productos perecederos
-        pedido.tiene_perecederos = True
+    # Cola persistida: ordenada por límite de preparación y con es_urgente
+    # calculado en la query (ver pedidos/prioridad.py)
+    cola_perecederos = ServicioPerecederos.obtener_pedidos_prioritarios(negocio)
+    total_prioritarios = cola_perecederos.count()
+    pedidos_prioritarios = cola_perecederos[:LIMITE_PRIORITARIOS]
 
     # =======================================================
     # CONTEXTO FINAL
@@ -87,6 +66,7 @@ def dashboard_comerciante(request):
         'pedidos_recientes': pedidos_recientes,
         'productos_stock_bajo': productos_stock_bajo,
         'pedidos_prioritarios': pedidos_prioritarios,  # 🔥 PARA EL DASHBOARD
+        'total_prioritarios': total_prioritarios,
     }
 
     return render(request, 'comerciante/dashboard.html', context)
@@ -122,16 +102,7 @@ def pedidos_comerciante(request):
     if fecha_hasta:
         pedidos = pedidos.filter(fecha_pedido__date__lte=fecha_hasta)
 
-    stats_estados = {
-        'all': Pedido.objects.filter(negocio=negocio).count(),
-        'pendiente': Pedido.objects.filter(negocio=negocio, estado='pendiente').count(),
-        'confirmado': Pedido.objects.filter(negocio=negocio, estado='confirmado').count(),
-        'preparando': Pedido.objects.filter(negocio=negocio, estado='preparando').count(),
-        'listo': Pedido.objects.filter(negocio=negocio, estado='listo').count(),
-        'en_camino': Pedido.objects.filter(negocio=negocio, estado='en_camino').count(),
-        'completado': Pedido.objects.filter(negocio=negocio, estado='completado').count(),
-        'cancelado': Pedido.objects.filter(negocio=negocio, estado='cancelado').count(),
-    }
+    stats_estados = EstadisticasPedidos.de_negocio(negocio)['por_estado']
 
     return render(request, 'comerciante/pedidos.html', {
         'negocio': negocio,
@@ -212,6 +183,8 @@ def clientes_comerciante(request):
 # ============================================================
 # REPORTES DEL COMERCIANTE
 # ============================================================
+PERIODOS_REPORTE = [7, 30, 90, 365]
+
 @login_required
 def reportes_comerciante(request):
     if request.user.tipo_usuario != 'comerciante':
@@ -219,26 +192,16 @@ def reportes_comerciante(request):
 
     negocio = get_object_or_404(Negocio, propietario=request.user)
 
-    hoy = timezone.now()
-    ultimos_30 = hoy - timedelta(days=30)
-
-    pedidos_30 = Pedido.objects.filter(
-        negocio=negocio,
-        fecha_pedido__gte=ultimos_30
-    )
+    # Solo lee los resúmenes diarios: 12 meses cuestan lo mismo que 30 días
+    dias = request.GET.get('dias', '30')
+    dias = int(dias) if dias.isdigit() and int(dias) in PERIODOS_REPORTE else 30
 
-    reportes = {
-        'ventas_30_dias': pedidos_30.aggregate(total=Sum('total'))['total'] or 0,
-        'pedidos_30_dias': pedidos_30.count(),
-        'productos_vendidos': DetallePedido.objects.filter(
-            pedido__negocio=negocio,
-            pedido__fecha_pedido__gte=ultimos_30
-        ).aggregate(total=Sum('cantidad'))['total'] or 0,
-    }
+    reportes = resumenes.reporte(negocio, dias=dias)
 
     return render(request, 'comerciante/reportes.html', {
         'negocio': negocio,
         'reportes': reportes,
+        'periodos': PERIODOS_REPORTE,
     })
 
 
@@ -300,16 +263,21 @@ def actualizar_estado_pedido(request, pedido_id):
     if nuevo_estado == 'completado':
         pedido.fecha_completado = timezone.now()
 
-    pedido.save()
-
-    from pedidos.models import HistorialEstadoPedido
-    HistorialEstadoPedido.objects.create(
-        pedido=pedido,
-        estado_anterior=estado_anterior,
-        estado_nuevo=nuevo_estado,
-        usuario=request.user,
-        comentario=f'Estado actualizado por {request.user.username}'
-    )
+    with transaction.atomic():
+        pedido.save()
+
+        from pedidos.models import HistorialEstadoPedido
+        HistorialEstadoPedido.objects.create(
+            pedido=pedido,
+            estado_anterior=estado_anterior,
+            estado_nuevo=nuevo_estado,
+            usuario=request.user,
+            comentario=f'Estado actualizado por {request.user.username}'
+        )
+
+        # Notificar al cliente (el envío por email/push queda en la cola de tareas)
+        if nuevo_estado != estado_anterior:
+            NotificacionesPedido.notificar_cambio_estado(pedido)
 
     return JsonResponse({
         'success': True,